@@ -2,21 +2,434 @@
 Flask Web服务
 提供API接口和前端页面
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, redirect, render_template, jsonify, request, stream_with_context
 from flask_cors import CORS
-from database import Database
+from database import Database, TIERS, normalize_metrics, parse_time_bound, rollup_detail_columns
+from downsample import MODES, MAX_POINTS_LIMIT, downsample_series, series_to_rows
+from rates import COUNTER_METRICS, MAX_WINDOW, RATE_UNITS, compute_rates, rate_columns, summarize_rates, to_json_list
+from stream import Broadcaster, SampleWatcher
+from cache import ResponseCache
+from export import EXPORT_FORMATS, iter_export, pa
+from jobs import JobRunner
+from migrate import LegacyMigrator
+from retention import RetentionPolicy
+from watchlist import Watchlist
+import gzip
+import hashlib
+import itertools
 import json
+import os
+import queue
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
 
-# 初始化数据库
-db = Database()
-
 # 加载配置
 with open('config.json', 'r', encoding='utf-8') as f:
     config = json.load(f)
 
+# 初始化数据库
+db = Database(options=config.get('database'))
+
+# 监控列表和可在设置页修改的配置保存在数据库中，monitor.list 为其镜像
+watchlist = Watchlist(db)
+
+# 保留策略：时间范围查询据此选择读取原始采样还是小时/天汇总（清理由监控程序负责）
+retention = RetentionPolicy.from_config(db, config)
+
+# 旧版 video_stats 表中的历史数据在后台分批迁移，线程在每个Web进程收到第一个请求时启动
+migrator = LegacyMigrator(db)
+
+# 删除数据在后台分批执行，接口立即返回任务 id；执行线程在第一次提交或查询任务时启动
+jobs = JobRunner.from_config(db, config)
+
+# 新数据推送：所有订阅者共享一个监视线程，在第一个订阅者连接时启动
+broadcaster = Broadcaster(queue_size=config.get('stream_queue_size', 100))
+watcher = SampleWatcher(db, broadcaster, interval=config.get('stream_poll_seconds', 0.5))
+STREAM_HEARTBEAT_SECONDS = config.get('stream_heartbeat_seconds', 15)
+
+# serve.py 启动了单独的推送通道进程时，/api/stream 重定向到该进程，长连接不占用工作线程
+STREAM_PORT = os.environ.get('BILIBILI_STREAM_PORT')
+
+# 小于该大小的响应不压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 导出时每次从数据库读取的行数
+EXPORT_CHUNK_ROWS = config.get('export_chunk_rows', 10000)
+
+# 读接口的响应缓存，数据版本变化时失效
+cache = ResponseCache(
+    max_bytes=int(config.get('cache_max_mb', 32) * 1024 * 1024),
+    ttl=config.get('cache_ttl_seconds', 600)
+)
+
+
+def parse_metrics():
+    """
+    解析查询参数中的 metrics（逗号分隔的指标列表）
+    
+    Returns:
+        tuple: 指标列表，未提供时为全部指标
+        
+    Raises:
+        ValueError: 包含未知指标时
+    """
+    value = request.args.get('metrics', '')
+    return normalize_metrics([m.strip() for m in value.split(',') if m.strip()])
+
+
+def parse_downsampling():
+    """
+    解析降采样参数
+    
+    Query params:
+        max_points: 最多返回的数据点数
+        resolution: 时间桶宽度（秒）
+        downsample: 降采样方式 lttb/avg/min/max/last，
+                    默认只提供 max_points 时为 lttb，提供 resolution 时为 avg
+    
+    Returns:
+        dict: downsample_series 的参数，未请求降采样时返回None
+        
+    Raises:
+        ValueError: 参数不合法时
+    """
+    max_points = request.args.get('max_points', type=int)
+    resolution = request.args.get('resolution', type=int)
+    if max_points is None and resolution is None:
+        return None
+    
+    mode = request.args.get('downsample', 'avg' if resolution else 'lttb')
+    if mode not in MODES:
+        raise ValueError(f"downsample 必须是 {'/'.join(MODES)} 之一")
+    if max_points is not None and not 3 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"max_points 必须在 3 到 {MAX_POINTS_LIMIT} 之间")
+    if resolution is not None and resolution <= 0:
+        raise ValueError("resolution 必须大于0")
+    if mode == 'lttb' and max_points is None:
+        raise ValueError("lttb 降采样需要提供 max_points")
+    
+    return {'max_points': max_points, 'resolution': resolution, 'mode': mode}
+
+
+def parse_format():
+    """
+    解析响应格式 format
+    
+    Returns:
+        bool: 是否使用列式格式（{'ts': [...], 'view': [...]}）
+        
+    Raises:
+        ValueError: 参数不合法时
+    """
+    value = request.args.get('format', 'rows')
+    if value not in ('rows', 'columnar'):
+        raise ValueError("format 必须是 rows 或 columnar")
+    return value == 'columnar'
+
+
+def parse_since():
+    """
+    解析增量查询游标 since（Unix秒），只返回晚于该时间的数据
+    
+    Returns:
+        int: 游标，未提供时为0
+        
+    Raises:
+        ValueError: 参数不合法时
+    """
+    value = request.args.get('since', '').strip()
+    if not value:
+        return 0
+    if not value.isdigit():
+        raise ValueError("since 必须是非负整数时间戳")
+    return int(value)
+
+
+def parse_time_arg(name, end=False):
+    """
+    解析时间范围参数，支持 Unix 秒级时间戳或 parse_time_bound 支持的格式
+    
+    Returns:
+        int: Unix 时间戳，未提供时为 None
+    """
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    return parse_time_bound(value, end=end)
+
+
+def parse_range():
+    """
+    解析时间范围查询参数
+    
+    Query params:
+        start / end: 时间范围，Unix秒或 YYYY-MM-DD[THH:MM]，仅有日期的 end 包含当天
+        tier: 读取的层级，auto（默认）按时间范围和 max_points 选择，或 raw/hourly/daily
+    
+    Returns:
+        dict: {'start_ts', 'end_ts', 'tier'}，三个参数都未提供时返回None（按 limit 返回最新数据）
+        
+    Raises:
+        ValueError: 参数不合法时
+    """
+    tier = request.args.get('tier', '').strip()
+    start_ts = parse_time_arg('start')
+    end_ts = parse_time_arg('end', end=True)
+    if start_ts is None and end_ts is None and not tier:
+        return None
+    
+    tier = tier or 'auto'
+    if tier != 'auto' and tier not in TIERS:
+        raise ValueError(f"tier 必须是 auto/{'/'.join(TIERS)} 之一")
+    return {
+        'start_ts': start_ts or 0,
+        'end_ts': 2 ** 62 if end_ts is None else end_ts,
+        'tier': tier
+    }
+
+
+def parse_rate_options():
+    """
+    解析增长速度参数
+    
+    Query params:
+        metrics: 逗号分隔的累计指标，默认 view,like,coin,favorite,share（online 是瞬时值，不支持）
+        unit: 速度的时间单位 minute/hour（默认）/day
+        window: 滑动平均的间隔数，默认6
+        resolution: 先按该宽度（秒）的时间桶取桶内最后一个采样，再计算
+    
+    Returns:
+        dict: {'metrics', 'unit', 'window', 'resolution'}
+        
+    Raises:
+        ValueError: 参数不合法时
+    """
+    metrics = parse_metrics() if request.args.get('metrics', '').strip() else COUNTER_METRICS
+    if 'online' in metrics:
+        raise ValueError("online 是瞬时值，不支持计算增长速度")
+    unit = request.args.get('unit', 'hour')
+    if unit not in RATE_UNITS:
+        raise ValueError(f"unit 必须是 {'/'.join(RATE_UNITS)} 之一")
+    window = request.args.get('window', 6, type=int)
+    if not 1 <= window <= MAX_WINDOW:
+        raise ValueError(f"window 必须在 1 到 {MAX_WINDOW} 之间")
+    resolution = request.args.get('resolution', type=int)
+    if resolution is not None and resolution <= 0:
+        raise ValueError("resolution 必须大于0")
+    return {'metrics': metrics, 'unit': unit, 'window': window, 'resolution': resolution}
+
+
+def data_etag(versions):
+    """
+    根据视频数据版本和完整查询参数生成 ETag
+    
+    Args:
+        versions: db.get_data_versions 的结果
+        
+    Returns:
+        str: ETag
+    """
+    key = json.dumps([request.full_path, negotiate_encoding(), sorted(versions.items())])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """客户端数据未变化时返回 304"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def dumps_json(data):
+    """序列化为 JSON 字节串，安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding():
+    """
+    根据 Accept-Encoding 选择压缩方式
+    
+    Returns:
+        str: 'br'（需要安装 brotli）、'gzip' 或 None
+    """
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """
+    按协商的方式压缩响应内容，内容较小时不压缩
+    
+    Returns:
+        tuple: (响应内容, 实际使用的压缩方式)
+    """
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=5), encoding
+    return gzip.compress(body, compresslevel=5), encoding
+
+
+def cached_json(version, build):
+    """
+    返回序列化并压缩后的 JSON 响应，数据版本未变化时直接使用缓存的响应内容
+    
+    Args:
+        version: 当前数据版本
+        build: 未命中时调用，返回响应数据
+        
+    Returns:
+        Response: JSON 响应
+    """
+    encoding = negotiate_encoding()
+    key = f'{request.full_path}|{encoding}'
+    cached = cache.get(key, version)
+    if cached is None:
+        cached = compress(dumps_json(build()), encoding)
+        cache.put(key, version, cached, len(cached[0]))
+    
+    body, content_encoding = cached
+    response = app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
+
+
+def latest_ts(data):
+    """返回行格式或列式数据中最新的采样时间，没有数据时返回 None"""
+    if isinstance(data, dict):
+        return data['ts'][-1] if data['ts'] else None
+    return data[-1]['ts'] if data else None
+
+
+def query_series(bv_ids, limit, metrics, downsampling=None, since=0, columnar=False):
+    """
+    以列式读取多个视频的数据，按需降采样
+    
+    Returns:
+        dict: {bv_id: 列式数据（columnar 为 True 时）或历史数据列表}
+    """
+    result = {}
+    for bv_id, series in db.get_many_video_series(bv_ids, limit, metrics, since).items():
+        if downsampling:
+            series = downsample_series(series, metrics, **downsampling)
+        result[bv_id] = series if columnar else series_to_rows(bv_id, series, metrics)
+    return result
+
+
+def query_range(bv_ids, time_range, metrics, downsampling=None, since=0, columnar=False):
+    """
+    读取时间范围内的数据，tier 为 auto 时选择能满足期望点数的最粗一层
+    
+    读取汇总层且不降采样时，每个点附带桶内第一个值、最小值、最大值和增量（如 view_min、view_delta）。
+    增量查询时汇总层会再次返回最近的桶（桶内有新采样时值和时间会变化）。
+    
+    Returns:
+        tuple: ({bv_id: 列式数据（columnar 为 True 时）或历史数据列表}, 读取的层级)
+    """
+    tier = time_range['tier']
+    if tier == 'auto':
+        points = downsampling['max_points'] if downsampling else None
+        tier = retention.choose_tier(time_range['start_ts'], time_range['end_ts'], points)
+    start_ts = max(time_range['start_ts'], since + 1) if since else time_range['start_ts']
+    columns = list(metrics)
+    if not downsampling and tier != 'raw':
+        columns += rollup_detail_columns(metrics)
+    
+    result = {}
+    series_map = db.get_range_series(bv_ids, start_ts, time_range['end_ts'], metrics, tier,
+                                     detail=not downsampling)
+    for bv_id, series in series_map.items():
+        if downsampling:
+            series = downsample_series(series, metrics, **downsampling)
+        result[bv_id] = series if columnar else series_to_rows(bv_id, series, columns)
+    return result, tier
+
+
+def query_rates(bv_ids, versions, time_range, limit, options, columnar=False):
+    """
+    计算多个视频的增长速度（见 rates.compute_rates）
+    
+    每个视频的计算结果按 (视频, 时间范围或 limit, 层级, 参数) 缓存在响应缓存中，记录该视频的数据版本，
+    版本变化即失效；单视频和多视频接口共用，对比页增减视频时其余视频不用重新计算。
+    
+    Returns:
+        tuple: ({bv_id: (列式数据（columnar 为 True 时）或每个间隔一行的列表, 汇总)}, 读取的层级)
+    """
+    metrics = options['metrics']
+    tier = None
+    if time_range:
+        tier = time_range['tier']
+        if tier == 'auto':
+            # 指定 resolution 时选择桶宽度不超过它的最粗一层
+            points = None
+            if options['resolution']:
+                span = min(time_range['end_ts'], time.time()) - time_range['start_ts']
+                points = max(1, span / options['resolution'])
+            tier = retention.choose_tier(time_range['start_ts'], time_range['end_ts'], points)
+    key = json.dumps([time_range and [time_range['start_ts'], time_range['end_ts']], tier,
+                      None if time_range else limit, options])
+    
+    computed = {}
+    missing = []
+    for bv_id in bv_ids:
+        entry = cache.get(f'rates|{bv_id}|{key}', versions.get(bv_id))
+        if entry is None:
+            missing.append(bv_id)
+        else:
+            computed[bv_id] = entry
+    
+    if missing:
+        if time_range:
+            series_map = db.get_range_series(missing, time_range['start_ts'], time_range['end_ts'], metrics, tier)
+        else:
+            series_map = db.get_many_video_series(missing, limit, metrics)
+        for bv_id, series in series_map.items():
+            rates = compute_rates(series, metrics, options['unit'], options['window'], options['resolution'])
+            entry = (series['title'], rates, summarize_rates(rates, metrics, options['unit']))
+            cache.put(f'rates|{bv_id}|{key}', versions.get(bv_id), entry,
+                      sum(values.nbytes for values in rates.values()))
+            computed[bv_id] = entry
+    
+    columns = rate_columns(metrics)
+    result = {}
+    for bv_id in bv_ids:
+        title, rates, summary = computed[bv_id]
+        series = {name: to_json_list(values) for name, values in rates.items()}
+        series['title'] = title
+        if columnar:
+            series['bv_id'] = bv_id
+            result[bv_id] = (series, summary)
+        else:
+            result[bv_id] = (series_to_rows(bv_id, series, columns), summary)
+    return result, tier
+
+
+@app.before_request
+def start_background_tasks():
+    """启动后台迁移线程（已启动或没有旧数据时直接返回）"""
+    migrator.start()
+
 
 @app.route('/')
 def index():
@@ -34,19 +447,62 @@ def get_video_stats(bv_id):
         
     Query params:
         limit: 返回的数据条数，默认100
+        start / end / tier: 按时间范围查询（忽略 limit），见 parse_range
+        metrics: 逗号分隔的指标列表，如 view,like，默认全部
+        max_points / resolution / downsample: 降采样参数，见 parse_downsampling
+        since: 增量查询游标（Unix秒），只返回更新的数据
+        format: rows（默认，每个数据点一个对象）或 columnar（每个指标一个数组）
         
     Returns:
-        JSON格式的统计数据
+        JSON格式的统计数据，cursor 为下次增量查询使用的游标，按时间范围查询时 tier 为读取的层级；
+        请求带有 If-None-Match 且数据没有变化时返回 304
     """
     try:
         limit = request.args.get('limit', 100, type=int)
-        stats = db.get_video_stats(bv_id, limit)
+        try:
+            metrics = parse_metrics()
+            downsampling = parse_downsampling()
+            since = parse_since()
+            columnar = parse_format()
+            time_range = parse_range()
+        except ValueError as e:
+            return jsonify({
+                'code': -1,
+                'message': str(e),
+                'data': None
+            }), 400
         
-        return jsonify({
-            'code': 0,
-            'message': 'success',
-            'data': stats
-        })
+        # 只查视频目录即可判断数据是否变化
+        versions = db.get_data_versions([bv_id])
+        etag = data_etag(versions)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        
+        def build():
+            tier = None
+            if time_range:
+                result, tier = query_range([bv_id], time_range, metrics, downsampling, since, columnar)
+                stats = result[bv_id]
+            elif downsampling or columnar:
+                stats = query_series([bv_id], limit, metrics, downsampling, since, columnar)[bv_id]
+            else:
+                stats = db.get_video_stats(bv_id, limit, metrics, since)
+            if columnar:
+                stats['bv_id'] = bv_id
+            cursor = latest_ts(stats)
+            payload = {
+                'code': 0,
+                'message': 'success',
+                'data': stats,
+                'cursor': since if cursor is None else cursor
+            }
+            if tier:
+                payload['tier'] = tier
+            return payload
+        
+        response = cached_json(versions, build)
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         return jsonify({
@@ -119,28 +575,23 @@ def get_all_videos():
 @app.route('/api/videos/info')
 def get_videos_info():
     """
-    获取所有有数据的视频信息（含标题）
+    获取所有有数据的视频信息（含标题、最新数据和采样数）
     
     Returns:
         JSON格式的视频信息列表
     """
     try:
-        bv_ids = db.get_all_bv_ids()
-        videos_info = []
-        
-        for bv_id in bv_ids:
-            latest = db.get_latest_data(bv_id)
-            if latest:
-                videos_info.append({
-                    'bv_id': bv_id,
-                    'title': latest.get('title', bv_id)
-                })
+        def build():
+            videos_info = db.get_videos_info()
+            for video in videos_info:
+                video['title'] = video['title'] or video['bv_id']
+            return {
+                'code': 0,
+                'message': 'success',
+                'data': videos_info
+            }
         
-        return jsonify({
-            'code': 0,
-            'message': 'success',
-            'data': videos_info
-        })
+        return cached_json(db.get_catalog_version(), build)
         
     except Exception as e:
         return jsonify({
@@ -153,7 +604,7 @@ def get_videos_info():
 @app.route('/api/data/delete', methods=['POST', 'DELETE'])
 def delete_data():
     """
-    删除指定视频或时间段的数据
+    提交删除指定视频或时间段数据的后台任务，立即返回任务，进度通过 /api/jobs/<job_id> 查询
     
     Query Parameters (for DELETE):
         bv_id: 视频BV号（可选）
@@ -168,7 +619,7 @@ def delete_data():
         }
     
     Returns:
-        JSON格式的操作结果
+        JSON格式的任务（HTTP 202），见 /api/jobs/<job_id>
     """
     try:
         # 支持DELETE方法的查询参数和POST方法的JSON body
@@ -182,13 +633,20 @@ def delete_data():
             start_date = data.get('start_date')
             end_date = data.get('end_date')
         
-        deleted_count = db.delete_video_data(bv_id, start_date, end_date)
+        try:
+            job = jobs.submit_delete(bv_id, start_date, end_date)
+        except ValueError as e:
+            return jsonify({
+                'code': -1,
+                'message': str(e),
+                'data': None
+            }), 400
         
         return jsonify({
             'code': 0,
-            'message': f'成功删除 {deleted_count} 条数据',
-            'data': {'deleted_count': deleted_count}
-        })
+            'message': '删除任务已提交',
+            'data': job
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -198,36 +656,126 @@ def delete_data():
         }), 500
 
 
-@app.route('/api/config')
-def get_config():
+@app.route('/api/jobs')
+def list_jobs():
     """
-    获取配置信息
+    最近的后台任务
+    
+    Query params:
+        limit: 返回的任务数，默认20
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': jobs.list(limit)
+    })
+
+
+@app.route('/api/jobs/<int:job_id>')
+def get_job(job_id):
+    """
+    后台任务的状态和进度
     
     Returns:
-        JSON格式的配置
+        JSON格式的任务：status 为 pending/running/done/cancelled/failed，
+        total 为开始时估计的行数，processed 为已删除的行数，progress 为 0~1 的进度，
+        vacuumed_pages 为删除后回收的空闲页数
     """
-    # 重新加载配置以获取最新值
-    with open('config.json', 'r', encoding='utf-8') as f:
-        current_config = json.load(f)
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'code': -1,
+            'message': '任务不存在',
+            'data': None
+        }), 404
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': job
+    })
+
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    取消后台任务：未开始的任务直接取消，运行中的任务在当前批之后停止，已删除的数据不会恢复
+    """
+    if jobs.get(job_id) is None:
+        return jsonify({
+            'code': -1,
+            'message': '任务不存在',
+            'data': None
+        }), 404
+    if not jobs.cancel(job_id):
+        return jsonify({
+            'code': -1,
+            'message': '任务已结束',
+            'data': jobs.get(job_id)
+        }), 409
+    return jsonify({
+        'code': 0,
+        'message': '已请求取消',
+        'data': jobs.get(job_id)
+    })
+
+
+@app.route('/api/alerts')
+def get_alerts():
+    """
+    异常检测的报警（播放增速明显高于该视频的基线），最新的在前
     
-    # 读取监控列表
-    monitor_list = []
+    Query params:
+        bv_id: 只返回该视频的报警（可选）
+        since: 只返回 id 大于该值的报警，轮询时传入上次返回的 cursor
+        limit: 返回的条数，默认100
+    
+    Returns:
+        JSON格式的报警列表：ts 为检测到异常的采样时间，rate 为该间隔的每小时播放增量，
+        baseline 为之前的基线，zscore 为偏离基线的标准差倍数；cursor 为最大的报警 id
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
     try:
-        with open('monitor.list', 'r', encoding='utf-8') as f:
-            for line in f:
-                bv = line.strip()
-                if bv and not bv.startswith('#'):
-                    monitor_list.append(bv)
-    except FileNotFoundError:
-        # 如果文件不存在，返回空列表
-        pass
+        alerts = db.get_alerts(request.args.get('bv_id') or None, since, limit)
+    except Exception as e:
+        return jsonify({
+            'code': -1,
+            'message': f'查询失败: {str(e)}',
+            'data': None
+        }), 500
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': alerts,
+        'cursor': alerts[0]['id'] if alerts else since
+    })
+
+
+def current_config():
+    """config.json 中的配置，加上数据库中的监控列表和运行时设置"""
+    with open('config.json', 'r', encoding='utf-8') as f:
+        result = json.load(f)
     
-    current_config['monitor_list'] = monitor_list
+    watchlist.refresh()
+    result.update(watchlist.settings)
+    result['monitor_list'] = list(watchlist.bv_ids)
+    result['settings_version'] = watchlist.version
+    return result
+
+
+@app.route('/api/config')
+def get_config():
+    """
+    获取配置信息
     
+    Returns:
+        JSON格式的配置
+    """
     return jsonify({
         'code': 0,
         'message': 'success',
-        'data': current_config
+        'data': current_config()
     })
 
 
@@ -247,10 +795,7 @@ def update_config():
     """
     try:
         data = request.get_json()
-        
-        # 加载当前配置
-        with open('config.json', 'r', encoding='utf-8') as f:
-            current_config = json.load(f)
+        settings = {}
         
         # 更新抓取间隔
         if 'fetch_interval_minutes' in data:
@@ -261,34 +806,24 @@ def update_config():
                     'message': '抓取间隔必须大于0',
                     'data': None
                 }), 400
-            current_config['fetch_interval_minutes'] = interval
-        
-        # 保存配置
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(current_config, f, indent=2, ensure_ascii=False)
+            settings['fetch_interval_minutes'] = interval
         
         # 更新监控列表
-        if 'monitor_list' in data:
-            monitor_list = data['monitor_list']
-            if not isinstance(monitor_list, list):
-                return jsonify({
-                    'code': -1,
-                    'message': '监控列表必须是数组',
-                    'data': None
-                }), 400
-            
-            # 写入 monitor.list
-            with open('monitor.list', 'w', encoding='utf-8') as f:
-                f.write('# Bilibili视频监控列表\n')
-                f.write('# 每行一个BV号，# 开头的行为注释\n\n')
-                for bv in monitor_list:
-                    if bv and bv.strip():
-                        f.write(bv.strip() + '\n')
+        monitor_list = data.get('monitor_list')
+        if monitor_list is not None and not isinstance(monitor_list, list):
+            return jsonify({
+                'code': -1,
+                'message': '监控列表必须是数组',
+                'data': None
+            }), 400
+        
+        # 监控列表和设置在同一个事务中保存，监控程序通过版本号发现修改后立即生效
+        watchlist.update(monitor_list, settings)
         
         return jsonify({
             'code': 0,
             'message': '配置更新成功',
-            'data': current_config
+            'data': current_config()
         })
         
     except Exception as e:
@@ -299,6 +834,148 @@ def update_config():
         }), 500
 
 
+def redirect_to_stream_server():
+    """把请求重定向到同一主机上的推送通道进程（保留路径和查询参数）"""
+    host = request.host if request.host.endswith(']') else request.host.rsplit(':', 1)[0]
+    location = f"{request.scheme}://{host}:{STREAM_PORT}{request.path}"
+    if request.query_string:
+        location += '?' + request.query_string.decode('latin-1')
+    return redirect(location, code=307)
+
+
+@app.route('/api/stream')
+def stream_samples():
+    """
+    以 Server-Sent Events 推送新采样
+    
+    Query params:
+        bv_ids: 逗号分隔的BV号列表，只推送这些视频，默认全部
+    
+    Events:
+        sample: 一条新采样，字段与 /api/video/<bv_id>/stats 相同，
+                另有 prev_ts 表示该视频上一次采样时间，客户端据此判断是否漏掉了数据
+        reset: 视频数据被删除，客户端应重新加载
+    
+    由 serve.py 启动时返回 307，重定向到推送通道进程（stream_server.py）
+    """
+    if STREAM_PORT:
+        return redirect_to_stream_server()
+    
+    bv_ids = {bv.strip() for bv in request.args.get('bv_ids', '').split(',') if bv.strip()}
+    
+    watcher.start()
+    subscriber = broadcaster.subscribe()
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = subscriber.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # 心跳，防止代理断开空闲连接
+                    yield ': keepalive\n\n'
+                    continue
+                
+                # 读取过慢被断开，客户端会自动重连
+                if message is None:
+                    break
+                bv_id, event = message
+                if bv_ids and bv_id not in bv_ids:
+                    continue
+                yield event
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/stream/stats')
+def get_stream_stats():
+    """获取推送通道的状态（订阅者数、数据变化次数、发布和断开的消息数）"""
+    if STREAM_PORT:
+        return redirect_to_stream_server()
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': {
+            'subscribers': broadcaster.subscriber_count,
+            'changes': watcher.changes,
+            'published': broadcaster.published,
+            'dropped': broadcaster.dropped
+        }
+    })
+
+
+@app.route('/api/export')
+def export_data():
+    """
+    流式导出采样数据
+    
+    Query params:
+        bv_ids: 逗号分隔的BV号列表，默认所有视频
+        start / end: 时间范围，Unix秒或 YYYY-MM-DD[THH:MM]，仅有日期的 end 包含当天
+        metrics: 逗号分隔的指标列表，默认全部
+        format: csv（默认）、arrow（Arrow IPC 流）或 parquet，后两者需要安装 pyarrow
+    
+    Returns:
+        按视频、时间排序的数据文件，边读取边发送，服务端内存占用与导出行数无关
+    """
+    fmt = request.args.get('format', 'csv')
+    bv_ids = [bv.strip() for bv in request.args.get('bv_ids', '').split(',') if bv.strip()]
+    try:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format 必须是 {'/'.join(EXPORT_FORMATS)} 之一")
+        mimetype, extension, needs_pyarrow = EXPORT_FORMATS[fmt]
+        if needs_pyarrow and pa is None:
+            raise ValueError(f"导出 {fmt} 格式需要安装 pyarrow")
+        metrics = parse_metrics()
+        start_ts = parse_time_arg('start')
+        end_ts = parse_time_arg('end', end=True)
+    except ValueError as e:
+        return jsonify({
+            'code': -1,
+            'message': str(e),
+            'data': None
+        }), 400
+    
+    chunks = db.iter_samples(
+        bv_ids or None,
+        start_ts=start_ts or 0,
+        end_ts=2 ** 62 if end_ts is None else end_ts,
+        metrics=metrics,
+        chunk_size=EXPORT_CHUNK_ROWS,
+        timestamp=(fmt == 'csv')
+    )
+    body = iter_export(fmt, chunks, metrics)
+    try:
+        # 先读取并编码第一块数据，查询或编码出错时返回错误，而不是在200之后发送不完整的文件
+        first = next(body, b'')
+    except Exception as e:
+        return jsonify({
+            'code': -1,
+            'message': f'导出失败: {str(e)}',
+            'data': None
+        }), 500
+    return Response(stream_with_context(itertools.chain([first], body)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=bilibili_export.{extension}',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """获取响应缓存的命中率、失效和淘汰次数、占用大小"""
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': cache.stats()
+    })
+
+
 @app.route('/api/videos/compare')
 def compare_videos():
     """
@@ -306,10 +983,16 @@ def compare_videos():
     
     Query params:
         bv_ids: 逗号分隔的BV号列表，如 BV1,BV2,BV3
-        limit: 返回的数据条数，默认50
+        limit: 每个视频返回的数据条数，默认50
+        start / end / tier: 按时间范围查询（忽略 limit），见 parse_range
+        metrics: 逗号分隔的指标列表，如 view，默认全部
+        max_points / resolution / downsample: 降采样参数，见 parse_downsampling
+        since: 增量查询游标（Unix秒），只返回更新的数据
+        format: rows（默认）或 columnar，见 /api/video/<bv_id>/stats
     
     Returns:
-        JSON格式的对比数据
+        JSON格式的对比数据，cursor 为下次增量查询使用的游标，按时间范围查询时 tier 为读取的层级；
+        请求带有 If-None-Match 且数据没有变化时返回 304
     """
     try:
         bv_ids_str = request.args.get('bv_ids', '')
@@ -324,18 +1007,156 @@ def compare_videos():
         
         bv_ids = [bv.strip() for bv in bv_ids_str.split(',') if bv.strip()]
         
-        # 获取每个视频的数据
-        result = {}
-        for bv_id in bv_ids:
-            stats = db.get_video_stats(bv_id, limit)
-            result[bv_id] = stats
+        try:
+            metrics = parse_metrics()
+            downsampling = parse_downsampling()
+            since = parse_since()
+            columnar = parse_format()
+            time_range = parse_range()
+        except ValueError as e:
+            return jsonify({
+                'code': -1,
+                'message': str(e),
+                'data': None
+            }), 400
         
+        versions = db.get_data_versions(bv_ids)
+        etag = data_etag(versions)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        
+        def build():
+            # 一次查询获取所有视频的数据
+            tier = None
+            if time_range:
+                result, tier = query_range(bv_ids, time_range, metrics, downsampling, since, columnar)
+            elif downsampling or columnar:
+                result = query_series(bv_ids, limit, metrics, downsampling, since, columnar)
+            else:
+                result = db.get_many_video_stats(bv_ids, limit, metrics, since)
+            
+            # 并发抓取时各视频的采样写入顺序与采样时间不完全一致，
+            # 游标取各视频已返回的最新采样时间中最小的一个，避免跳过稍晚写入的数据；
+            # 客户端按 ts 去重
+            latest = []
+            for bv_id, (sample_count, _, _) in versions.items():
+                if sample_count > 0:
+                    ts = latest_ts(result[bv_id])
+                    latest.append(since if ts is None else ts)
+            payload = {
+                'code': 0,
+                'message': 'success',
+                'data': result,
+                'cursor': min(latest) if latest else since
+            }
+            if tier:
+                payload['tier'] = tier
+            return payload
+        
+        response = cached_json(versions, build)
+        response.set_etag(etag)
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'code': -1,
+            'message': str(e),
+            'data': None
+        }), 500
+
+
+def rates_response(bv_ids, single):
+    """增长速度接口的公共部分，single 为 True 时 data 只包含一个视频"""
+    limit = request.args.get('limit', 100, type=int)
+    try:
+        options = parse_rate_options()
+        columnar = parse_format()
+        time_range = parse_range()
+    except ValueError as e:
         return jsonify({
+            'code': -1,
+            'message': str(e),
+            'data': None
+        }), 400
+    
+    versions = db.get_data_versions(bv_ids)
+    etag = data_etag(versions)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    def build():
+        result, tier = query_rates(bv_ids, versions, time_range, limit, options, columnar)
+        if single:
+            data, summary = result[bv_ids[0]]
+        else:
+            data = {bv_id: series for bv_id, (series, _) in result.items()}
+            summary = {bv_id: summary for bv_id, (_, summary) in result.items()}
+        payload = {
             'code': 0,
             'message': 'success',
-            'data': result
-        })
+            'data': data,
+            'summary': summary,
+            'unit': options['unit']
+        }
+        if tier:
+            payload['tier'] = tier
+        return payload
+    
+    response = cached_json(versions, build)
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/api/video/<bv_id>/rates')
+def get_video_rates(bv_id):
+    """
+    获取视频每个采样间隔的增量、速度、滑动平均速度、加速度和互动比例
+    
+    Args:
+        bv_id: 视频BV号
+        
+    Query params:
+        limit: 按最新的多少个采样计算，默认100
+        start / end / tier: 按时间范围计算（忽略 limit），见 parse_range；汇总层按每个桶的最后一个采样计算
+        metrics / unit / window / resolution: 见 parse_rate_options
+        format: rows（默认，每个间隔一个对象）或 columnar（每列一个数组）
         
+    Returns:
+        JSON格式的增长数据（列见 rates.rate_columns，无法计算的值为 null），
+        summary 为整个范围的总增量、平均速度和峰值速度，unit 为速度单位；
+        请求带有 If-None-Match 且数据没有变化时返回 304
+    """
+    try:
+        return rates_response([bv_id], single=True)
+    except Exception as e:
+        return jsonify({
+            'code': -1,
+            'message': str(e),
+            'data': None
+        }), 500
+
+
+@app.route('/api/videos/rates')
+def compare_video_rates():
+    """
+    获取多个视频的增长数据
+    
+    Query params:
+        bv_ids: 逗号分隔的BV号列表
+        其余参数同 /api/video/<bv_id>/rates
+    
+    Returns:
+        JSON格式的增长数据 {bv_id: ...}，summary 为 {bv_id: 汇总}
+    """
+    try:
+        bv_ids = [bv.strip() for bv in request.args.get('bv_ids', '').split(',') if bv.strip()]
+        if not bv_ids:
+            return jsonify({
+                'code': -1,
+                'message': '请提供BV号列表',
+                'data': None
+            }), 400
+        return rates_response(list(dict.fromkeys(bv_ids)), single=False)
     except Exception as e:
         return jsonify({
             'code': -1,
@@ -348,4 +1169,5 @@ if __name__ == '__main__':
     port = config.get('api_port', 5000)
     print(f"Flask服务启动在端口 {port}")
     print(f"请访问: http://localhost:{port}")
+    print("当前为开发服务器，生产环境请使用: python serve.py")
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,110 @@
+"""
+批量抓取基准测试
+用模拟了批量视频信息接口的本地桩服务器，对比逐个请求视频信息接口与批量接口抓取一轮的请求数和耗时：
+- 逐个抓取：每个视频 1 次视频信息 + 1 次在线人数
+- 批量抓取：第一轮没有 aid 缓存，与逐个抓取相同；之后已缓存 aid 的视频按批请求，
+  在线人数仍需逐个请求（可关闭）
+- 批量接口有单次视频数上限时，批量大小自动收敛到上限以内
+
+用法:
+  python benchmarks/bench_batch.py
+  python benchmarks/bench_batch.py --videos 1000,5000 --rps 200 --batch-limit 40
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bilibili_api import BATCH_PATH
+from monitor import VideoMonitor
+from stub_server import start_stub_server
+
+
+PATHS = (('/x/web-interface/view', '视频信息'), (BATCH_PATH, '批量'), ('/x/player/online/total', '在线人数'))
+
+
+def run_sweeps(bv_ids, batch, faults, args):
+    """
+    在临时目录中连续抓取 args.sweeps 轮
+    
+    Returns:
+        tuple: ([(各接口请求数, 耗时, 保存数), ...], 最终批量大小, 批量上限)
+    """
+    server, base_url = start_stub_server(args.latency, faults=faults)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config_file = os.path.join(tmp, 'config.json')
+            list_file = os.path.join(tmp, 'monitor.list')
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'api_base_url': base_url,
+                    'fetch_concurrency': args.concurrency,
+                    'requests_per_second': args.rps,
+                    'batch': batch
+                }, f)
+            with open(list_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(bv_ids))
+            
+            sweeps = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                with VideoMonitor(config_file, list_file, os.path.join(tmp, 'data.db')) as monitor:
+                    for _ in range(args.sweeps):
+                        saved_before = monitor.db.get_catalog_version()[1] or 0
+                        start = time.perf_counter()
+                        monitor.fetch_and_save()
+                        elapsed = time.perf_counter() - start
+                        # 按桩服务器收到的请求统计（含重试）
+                        counts = dict(server.path_counts)
+                        server.path_counts.clear()
+                        saved = (monitor.db.get_catalog_version()[1] or 0) - saved_before
+                        sweeps.append((counts, elapsed, saved))
+                        # 同一秒内的重复采样会被忽略
+                        time.sleep(1)
+                    sizer = monitor.api.batch_sizer
+                    return sweeps, sizer.size if sizer.enabled else None, sizer.limit
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量抓取基准测试')
+    parser.add_argument('--videos', default='1000,3000', help='视频数量，逗号分隔')
+    parser.add_argument('--rps', type=float, default=200, help='客户端每秒请求数上限')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发数')
+    parser.add_argument('--latency', type=float, default=0.02, help='桩服务器单请求延迟（秒）')
+    parser.add_argument('--sweeps', type=int, default=3, help='每种方式抓取的轮数')
+    parser.add_argument('--batch-limit', type=int, default=40, help='“有上限”场景中批量接口一次最多查询的视频数')
+    args = parser.parse_args()
+    
+    modes = (
+        ('逐个抓取', {'enabled': False}, {}),
+        ('批量+在线人数', {}, {}),
+        ('批量，不取在线人数', {'fetch_online': False}, {}),
+        (f'批量，接口上限{args.batch_limit}', {'fetch_online': False}, {'batch_limit': args.batch_limit}),
+    )
+    print(f"客户端限速 {args.rps:g} 请求/秒，并发 {args.concurrency}，桩服务器延迟 {args.latency * 1000:.0f}ms，"
+          f"每种方式连续抓取 {args.sweeps} 轮（第1轮没有 aid 缓存）")
+    for count in [int(n) for n in args.videos.split(',') if n.strip()]:
+        bv_ids = [f'BV1batch{i:05d}' for i in range(count)]
+        print(f"\n== {count} 个视频 ==")
+        print(f"{'方式':<20} {'轮次':>4} {'保存':>6} {'请求数':>7} {'每视频':>6} {'耗时(s)':>8}  按接口  最终批量大小/上限")
+        for label, batch, faults in modes:
+            sweeps, size, limit = run_sweeps(bv_ids, batch, faults, args)
+            for i, (counts, elapsed, saved) in enumerate(sweeps, 1):
+                total = sum(counts.values())
+                detail = ', '.join(f"{name}={counts[path]}" for path, name in PATHS if counts.get(path))
+                tail = ''
+                if i == len(sweeps) and batch.get('enabled', True):
+                    tail = f"  {size}/{limit}" if size else '  已停用'
+                print(f"{label if i == 1 else '':<20} {i:>4} {saved:>6} {total:>7} {total / count:>6.2f} "
+                      f"{elapsed:>8.1f}  {detail}{tail}")
+
+
+if __name__ == '__main__':
+    main()
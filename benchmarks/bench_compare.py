@@ -0,0 +1,75 @@
+"""
+多视频对比查询基准测试
+对比逐个视频调用 get_video_stats（N次查询）与 get_many_video_stats（1次查询）的耗时
+
+用法:
+  python benchmarks/bench_compare.py
+  python benchmarks/bench_compare.py --sizes 1,10,50 --limit 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from bench_insert import make_rows
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多视频对比查询基准测试')
+    parser.add_argument('--sizes', default='1,10,50', help='对比的视频数量，逗号分隔')
+    parser.add_argument('--samples', type=int, default=2000, help='每个视频的采样数')
+    parser.add_argument('--limit', type=int, default=200, help='每个视频返回的数据条数')
+    parser.add_argument('--repeat', type=int, default=20, help='重复次数')
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    videos = max(sizes)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(os.path.join(tmp, 'compare.db'))
+        rows = make_rows(videos * args.samples, videos)
+        for i in range(0, len(rows), 10000):
+            db.insert_many(rows[i:i + 10000])
+        
+        # 统计执行的SQL语句数
+        statements = []
+        with db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        
+        print(f"每个视频 {args.samples} 条历史，返回最新 {args.limit} 条，指标: view")
+        print(f"{'视频数':>6} | {'逐个查询':>18} | {'单次查询':>18} | {'加速比':>6}")
+        print('-' * 62)
+        for size in sizes:
+            bv_ids = [f'BV1bench{i:05d}' for i in range(size)]
+            
+            statements.clear()
+            loop = timed(lambda: {bv: db.get_video_stats(bv, args.limit, ['view']) for bv in bv_ids},
+                         args.repeat)
+            loop_queries = len(statements) // args.repeat
+            
+            statements.clear()
+            many = timed(lambda: db.get_many_video_stats(bv_ids, args.limit, ['view']), args.repeat)
+            many_queries = len(statements) // args.repeat
+            
+            print(f"{size:>8} | {loop:>8.2f} ms ({loop_queries:>3}次) | "
+                  f"{many:>8.2f} ms ({many_queries:>3}次) | {loop / many:>5.1f}x")
+        
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+读写并发基准测试
+模拟监控进程持续写入时，看板查询（历史数据、最新数据）的延迟，
+对比默认回滚日志模式与WAL模式
+
+用法:
+  python benchmarks/bench_dashboard_rw.py
+  python benchmarks/bench_dashboard_rw.py --seconds 10 --readers 8
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from bench_insert import make_rows
+
+
+MODES = {
+    'rollback journal': {'journal_mode': 'delete', 'synchronous': 'full'},
+    'wal': {'journal_mode': 'wal', 'synchronous': 'normal'},
+}
+
+
+def writer_process(db_path, options, stop_event, batch_size, videos, interval):
+    """模拟监控进程：按固定间隔批量写入新数据"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(db_path, options)
+    rows = make_rows(batch_size, videos)
+    while not stop_event.wait(interval):
+        db.insert_many(rows)
+    db.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_mode(name, options, args, tmp):
+    db_path = os.path.join(tmp, name.replace(' ', '_') + '.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(db_path, options)
+    
+    # 预先写入历史数据
+    rows = make_rows(args.history, args.videos)
+    for i in range(0, len(rows), 5000):
+        db.insert_many(rows[i:i + 5000])
+    
+    stop_event = multiprocessing.Event()
+    writer = multiprocessing.Process(
+        target=writer_process,
+        args=(db_path, options, stop_event, args.batch_size, args.videos, args.write_interval)
+    )
+    writer.start()
+    time.sleep(0.5)
+    
+    latencies = []
+    errors = io.StringIO()
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    
+    def reader(n):
+        bv_id = f'BV1bench{n % args.videos:05d}'
+        local = []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            db.get_video_stats(bv_id, 200)
+            db.get_latest_data(bv_id)
+            local.append((time.perf_counter() - start) * 1000)
+            time.sleep(args.read_interval)
+        with lock:
+            latencies.extend(local)
+    
+    with contextlib.redirect_stdout(errors):
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    
+    stop_event.set()
+    writer.join()
+    db.close()
+    
+    failures = errors.getvalue().count('失败')
+    print(f"{name:<18} | {len(latencies):>8} | {percentile(latencies, 50):>8.2f} | "
+          f"{percentile(latencies, 99):>8.2f} | {max(latencies or [0]):>8.2f} | {failures:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='读写并发基准测试')
+    parser.add_argument('--seconds', type=float, default=5, help='每种模式的测试时长')
+    parser.add_argument('--readers', type=int, default=4, help='并发看板查询线程数')
+    parser.add_argument('--read-interval', type=float, default=0.02, help='每个查询线程两次查询之间的间隔（秒）')
+    parser.add_argument('--videos', type=int, default=50, help='视频数量')
+    parser.add_argument('--history', type=int, default=20000, help='预先写入的历史记录数')
+    parser.add_argument('--batch-size', type=int, default=200, help='写入进程每个事务的记录数')
+    parser.add_argument('--write-interval', type=float, default=0.05, help='写入进程每个事务之间的间隔（秒）')
+    args = parser.parse_args()
+    
+    print(f"{'模式':<16} | {'查询次数':>6} | {'p50 ms':>8} | {'p99 ms':>8} | {'max ms':>8} | {'失败':>4}")
+    print('-' * 72)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in MODES.items():
+            run_mode(name, options, args, tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+异常检测基准测试
+- 管道：每轮 N 个视频的采样经 BatchWriter 写入，对比不启用和启用异常检测时一轮写入完成的耗时，
+  以及检测本身（observe）每轮的耗时、状态写回与重启读取的耗时、每个视频占用的内存
+- 检测效果：增速带随机波动的模拟数据中，预热后给部分视频注入一次突增，统计检出数和误报数
+- 端到端：VideoMonitor 通过本地桩服务器的批量接口抓取 N 个视频，对比不启用和启用异常检测时每轮的耗时
+
+用法:
+  python benchmarks/bench_detector.py
+  python benchmarks/bench_detector.py --videos 10000,50000 --sweeps 10 --e2e-videos 10000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, BatchWriter
+from detector import AnomalyDetector, STATE_FIELDS
+from monitor import VideoMonitor
+from stub_server import start_stub_server
+
+
+def make_sweep(bv_ids, views, ts, rng, spikes=()):
+    """一轮采样：每个视频的增量在基础值上下随机波动，spikes 中的视频增量放大 20 倍"""
+    timestamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for i, bv_id in enumerate(bv_ids):
+        increment = int((50 + i % 500) * rng.uniform(0.8, 1.2))
+        if bv_id in spikes:
+            increment *= 20
+        views[i] += increment
+        rows.append({
+            'bv_id': bv_id, 'title': f'测试视频 {i}', 'view': views[i], 'like': 0, 'coin': 0,
+            'favorite': 0, 'share': 0, 'online': 0, 'timestamp': timestamp
+        })
+    return rows
+
+
+class TimedDetector(AnomalyDetector):
+    """记录每次 observe 的耗时"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.elapsed = 0.0
+    
+    def observe(self, rows):
+        start = time.perf_counter()
+        try:
+            return super().observe(rows)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+
+def run_pipeline(path, count, args, detector_options):
+    """
+    连续写入 args.sweeps 轮，每轮 count 条
+    
+    Returns:
+        tuple: (每轮写入耗时列表, 检测器或None, 注入突增的视频, 报警的视频)
+    """
+    rng = random.Random(1)
+    bv_ids = [f'BV1det{i:06d}' for i in range(count)]
+    views = [1000] * count
+    spiked = set(rng.sample(bv_ids, args.spikes))
+    spike_sweep = args.sweeps - 2
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(path)
+        detector = TimedDetector(db, detector_options) if detector_options else None
+        
+        ts = int(time.time()) - args.sweeps * 600
+        sweeps = []
+        for sweep in range(args.sweeps):
+            ts += 600
+            rows = make_sweep(bv_ids, views, ts, rng, spiked if sweep == spike_sweep else ())
+            writer = BatchWriter(db, batch_size=args.batch_size, flush_interval=None,
+                                 on_saved=detector.observe if detector else None)
+            start = time.perf_counter()
+            for row in rows:
+                writer.put(row)
+            writer.close()
+            sweeps.append(time.perf_counter() - start)
+        
+        alerted = set()
+        if detector:
+            alerted = {alert['bv_id'] for alert in db.get_alerts(limit=count)}
+            detector.state_elapsed = timed_state(db, detector)
+        db.close()
+    return sweeps, detector, spiked, alerted
+
+
+def timed_state(db, detector):
+    """全部状态写回数据库和重新读取的耗时"""
+    detector._dirty[:len(detector.bv_ids)] = True
+    start = time.perf_counter()
+    detector.save()
+    saved = time.perf_counter() - start
+    start = time.perf_counter()
+    AnomalyDetector(db).load()
+    return saved, time.perf_counter() - start
+
+
+def state_bytes(detector):
+    """每个视频的状态占用的内存：按列的数组（按实际视频数计）与 bv_id 索引"""
+    arrays = sum(dtype().itemsize for _, dtype in STATE_FIELDS) + 1
+    index = sys.getsizeof(detector.index) + sys.getsizeof(detector.bv_ids)
+    index += sum(sys.getsizeof(bv_id) for bv_id in detector.bv_ids)
+    return arrays, index / len(detector.bv_ids)
+
+
+def pipeline_benchmark(args):
+    # 预热期后的轮次才参与比较（前几轮建立视频目录，每轮都要插入新视频）
+    skip = 2
+    options = {'save_seconds': 3600}
+    print(f"== 写入管道（每轮所有视频各一条采样，间隔10分钟，共 {args.sweeps} 轮，"
+          f"统计第 {skip + 1} 轮起；批量 {args.batch_size}）==")
+    print(f"{'视频数':>8} {'不检测(ms)':>11} {'检测(ms)':>10} {'差值':>8} {'observe(ms)':>12} "
+          f"{'写回(ms)':>9} {'读取(ms)':>9} {'内存(B/视频)':>14} {'检出':>7} {'误报':>5}")
+    for count in [int(n) for n in args.videos.split(',') if n.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            plain, _, _, _ = run_pipeline(os.path.join(tmp, 'plain.db'), count, args, None)
+            timed, detector, spiked, alerted = run_pipeline(os.path.join(tmp, 'detect.db'), count, args, options)
+        plain_ms = sum(plain[skip:]) / len(plain[skip:]) * 1000
+        timed_ms = sum(timed[skip:]) / len(timed[skip:]) * 1000
+        observe_ms = detector.elapsed / args.sweeps * 1000
+        saved, loaded = detector.state_elapsed
+        arrays, index = state_bytes(detector)
+        print(f"{count:>8,} {plain_ms:>11.1f} {timed_ms:>10.1f} {(timed_ms / plain_ms - 1) * 100:>+7.1f}% "
+              f"{observe_ms:>12.1f} {saved * 1000:>9.1f} {loaded * 1000:>9.1f} "
+              f"{arrays:>5} + {index:>5.0f} {len(spiked & alerted):>3}/{len(spiked):<3} {len(alerted - spiked):>5}")
+    print("内存：按列数组（固定大小）+ bv_id 索引（字典和字符串）；检出：预热后注入 20 倍突增的视频中报警的数量")
+
+
+def run_monitor(bv_ids, server, base_url, args, enabled):
+    """用桩服务器的批量接口连续抓取，返回每轮耗时和 observe 的总耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = os.path.join(tmp, 'config.json')
+        list_file = os.path.join(tmp, 'monitor.list')
+        db_path = os.path.join(tmp, 'data.db')
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'api_base_url': base_url,
+                'fetch_concurrency': args.concurrency,
+                'requests_per_second': args.rps,
+                'batch': {'fetch_online': False, 'initial_size': 100},
+                'detector': {'enabled': enabled}
+            }, f)
+        with open(list_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(bv_ids))
+        
+        # 预先写入 aid/cid 缓存，第一轮即走批量接口（桩服务器的 aid 为 BV 号的 crc32）
+        meta = {}
+        for bv_id in bv_ids:
+            aid = zlib.crc32(bv_id.encode('utf-8'))
+            meta[bv_id] = (aid, aid + 1)
+            server.aids[aid] = bv_id
+        with contextlib.redirect_stdout(io.StringIO()):
+            Database(db_path).save_video_meta(meta)
+        
+        sweeps = []
+        observed = 0.0
+        with contextlib.redirect_stdout(io.StringIO()):
+            with VideoMonitor(config_file, list_file, db_path) as monitor:
+                if enabled:
+                    detector = monitor.detector
+                    observe = detector.observe
+                    
+                    def timed_observe(rows):
+                        nonlocal observed
+                        start = time.perf_counter()
+                        try:
+                            return observe(rows)
+                        finally:
+                            observed += time.perf_counter() - start
+                    detector.observe = timed_observe
+                
+                for _ in range(args.e2e_sweeps):
+                    start = time.perf_counter()
+                    monitor.fetch_and_save()
+                    sweeps.append(time.perf_counter() - start)
+                    # 同一秒内的重复采样会被忽略
+                    time.sleep(1)
+    return sweeps, observed
+
+
+def e2e_benchmark(args):
+    count = args.e2e_videos
+    bv_ids = [f'BV1det{i:06d}' for i in range(count)]
+    print(f"\n== 端到端：{count:,} 个视频，桩服务器批量接口（不取在线人数），"
+          f"客户端限速 {args.rps:g} 请求/秒，每种方式 {args.e2e_sweeps} 轮 ==")
+    server, base_url = start_stub_server(args.latency)
+    try:
+        results = {}
+        # 交替运行两次，减少机器负载波动的影响
+        for enabled in (False, True, False, True):
+            sweeps, observed = run_monitor(bv_ids, server, base_url, args, enabled)
+            total, spent = results.get(enabled, ([], 0.0))
+            results[enabled] = (total + sweeps[1:], spent + observed)
+    finally:
+        server.shutdown()
+    
+    for enabled, label in ((False, '不检测'), (True, '检测')):
+        sweeps, observed = results[enabled]
+        mean = sum(sweeps) / len(sweeps)
+        line = f"  {label:<6} 每轮 {mean:.2f}s（{min(sweeps):.2f}-{max(sweeps):.2f}s）"
+        if enabled:
+            line += f"，observe 合计每轮 {observed / (2 * args.e2e_sweeps) * 1000:.0f}ms（在写入线程中，与抓取重叠）"
+        print(line)
+    print("  第1轮建立视频目录，不计入")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='异常检测基准测试')
+    parser.add_argument('--videos', default='10000,50000', help='写入管道测试的视频数量，逗号分隔')
+    parser.add_argument('--sweeps', type=int, default=10, help='写入管道测试的轮数')
+    parser.add_argument('--spikes', type=int, default=20, help='注入突增的视频数')
+    parser.add_argument('--batch-size', type=int, default=1000, help='BatchWriter 每批写入的条数')
+    parser.add_argument('--e2e-videos', type=int, default=10000, help='端到端测试的视频数量，0 表示跳过')
+    parser.add_argument('--e2e-sweeps', type=int, default=4, help='端到端测试每次运行的轮数')
+    parser.add_argument('--rps', type=float, default=1000, help='端到端测试的客户端每秒请求数上限')
+    parser.add_argument('--concurrency', type=int, default=16, help='端到端测试的并发数')
+    parser.add_argument('--latency', type=float, default=0.02, help='桩服务器单请求延迟（秒）')
+    args = parser.parse_args()
+    
+    pipeline_benchmark(args)
+    if args.e2e_videos:
+        e2e_benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
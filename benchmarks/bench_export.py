@@ -0,0 +1,99 @@
+"""
+数据导出基准测试
+生成测试数据库，通过 /api/export 以 CSV、Arrow IPC、Parquet 格式导出不同规模的数据，
+报告每种格式的吞吐量（行/秒）、响应字节数和服务端 Python 峰值内存（tracemalloc），
+并与一次性返回全部数据的 JSON 接口（/api/video/<bv_id>/stats）对比内存占用。
+
+流式导出的峰值内存只与 export_chunk_rows 有关，不随导出行数增长。
+
+用法:
+  python benchmarks/bench_export.py
+  python benchmarks/bench_export.py --rows 100000,1000000 --videos 10
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_insert import make_rows
+
+
+def measure(client, url):
+    """
+    请求并逐块读取响应，不在客户端保留内容
+    
+    Returns:
+        tuple: (耗时秒数, 响应字节数, 峰值内存字节数)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据导出基准测试')
+    parser.add_argument('--rows', default='10000,100000,500000', help='导出行数，逗号分隔')
+    parser.add_argument('--videos', type=int, default=5, help='测试数据库中的视频数')
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.rows.split(',')]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # 在临时目录中导入 app，使其使用临时数据库
+        shutil.copy(os.path.join(ROOT, 'config.json'), tmp)
+        os.chdir(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as web
+        
+        total = max(sizes)
+        print(f"生成测试数据库: {args.videos} 个视频，共 {total} 条采样")
+        rows = make_rows(total, args.videos)
+        for i in range(0, len(rows), 10000):
+            web.db.insert_many(rows[i:i + 10000])
+        del rows
+        web.cache.max_bytes = 0
+        client = web.app.test_client()
+        
+        formats = ['csv']
+        if web.pa is not None:
+            formats += ['arrow', 'parquet']
+        else:
+            print("未安装 pyarrow，只测试 CSV（pip install pyarrow）")
+        
+        print(f"每块 {web.EXPORT_CHUNK_ROWS} 行")
+        print(f"{'方式':<28} {'行数':>9} {'行/秒':>11} {'响应字节':>12} {'峰值内存(MB)':>14}")
+        for n in sizes:
+            # 按时间范围截取前 n 行（make_rows 每分钟为每个视频写一条）
+            minutes = -(-n // args.videos)
+            end = int(datetime(2026, 1, 1).timestamp()) + (minutes - 1) * 60
+            for fmt in formats:
+                elapsed, size, peak = measure(client, f'/api/export?format={fmt}&end={end}')
+                print(f"{'流式导出 ' + fmt:<28} {n:>9} {n / elapsed:>11.0f} {size:>12} {peak / 1048576:>14.1f}")
+            
+            # 对比：单视频 JSON 接口在内存中构造完整响应
+            per_video = minutes
+            elapsed, size, peak = measure(client, f'/api/video/BV1bench00000/stats?limit={per_video}')
+            print(f"{'JSON stats（单视频）':<28} {per_video:>9} {per_video / elapsed:>11.0f} "
+                  f"{size:>12} {peak / 1048576:>14.1f}")
+        
+        os.chdir(ROOT)
+
+
+if __name__ == '__main__':
+    main()
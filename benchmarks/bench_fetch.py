@@ -0,0 +1,86 @@
+"""
+抓取引擎基准测试
+对比 sequential（逐个抓取+固定等待）与 concurrent（并发+全局限速）两种模式的单轮抓取耗时
+
+用法:
+  python benchmarks/bench_fetch.py
+  python benchmarks/bench_fetch.py --sizes 10,100,1000 --rps 50 --concurrency 16
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitor import VideoMonitor
+from stub_server import start_stub_server
+
+
+def run_sweep(base_url, size, mode, args):
+    """在临时目录中执行一轮抓取，返回耗时（秒）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = os.path.join(tmp, 'config.json')
+        list_file = os.path.join(tmp, 'monitor.list')
+        
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fetch_interval_minutes': 10,
+                'fetch_mode': mode,
+                'fetch_concurrency': args.concurrency,
+                'requests_per_second': args.rps,
+                'api_base_url': base_url
+            }, f)
+        
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for i in range(size):
+                f.write(f'BV1bench{i:05d}\n')
+        
+        # 屏蔽监控程序的逐条输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor = VideoMonitor(config_file, list_file, os.path.join(tmp, 'data.db'))
+            start = time.perf_counter()
+            monitor.fetch_and_save()
+            return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抓取引擎基准测试')
+    parser.add_argument('--sizes', default='10,100,1000', help='视频数量，逗号分隔')
+    parser.add_argument('--latency', type=float, default=0.05, help='桩服务器单请求延迟（秒）')
+    parser.add_argument('--rps', type=float, default=50, help='concurrent模式的全局每秒请求数')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent模式的并发数')
+    parser.add_argument('--max-sequential', type=int, default=100,
+                        help='sequential模式实测的最大视频数，更大的规模只给出估算值')
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    server, base_url = start_stub_server(args.latency)
+    
+    print(f"桩服务器: {base_url}  延迟: {args.latency * 1000:.0f}ms  "
+          f"限速: {args.rps:g} req/s  并发: {args.concurrency}")
+    print(f"{'视频数':>8} | {'sequential (s)':>16} | {'concurrent (s)':>16} | {'加速比':>8}")
+    print('-' * 58)
+    
+    try:
+        for size in sizes:
+            if size <= args.max_sequential:
+                seq = run_sweep(base_url, size, 'sequential', args)
+                seq_text = f'{seq:.2f}'
+            else:
+                # 每个视频2次请求 + 视频之间固定等待1秒
+                seq = size * (2 * args.latency + 1) - 1
+                seq_text = f'~{seq:.0f} (估算)'
+            
+            conc = run_sweep(base_url, size, 'concurrent', args)
+            print(f"{size:>8} | {seq_text:>16} | {conc:>16.2f} | {seq / conc:>7.1f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
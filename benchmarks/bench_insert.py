@@ -0,0 +1,73 @@
+"""
+数据库写入基准测试
+对比逐条插入（每条一个事务）与 insert_many（单事务批量插入）的吞吐量
+
+用法:
+  python benchmarks/bench_insert.py
+  python benchmarks/bench_insert.py --rows 50000 --single-rows 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+def make_rows(count, videos=100):
+    """生成测试数据"""
+    base = datetime(2026, 1, 1)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'bv_id': f'BV1bench{i % videos:05d}',
+            'title': f'测试视频 {i % videos}',
+            'view': 100000 + i,
+            'like': 5000 + i,
+            'coin': 3000,
+            'favorite': 2000,
+            'share': 1000,
+            'online': 12,
+            'timestamp': (base + timedelta(minutes=i // videos)).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库写入基准测试')
+    parser.add_argument('--rows', type=int, default=50000, help='批量插入的记录数')
+    parser.add_argument('--single-rows', type=int, default=1000, help='逐条插入的记录数')
+    parser.add_argument('--batch-size', type=int, default=1000, help='insert_many 每批记录数')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(os.path.join(tmp, 'single.db'))
+        rows = make_rows(args.single_rows)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row in rows:
+                db.insert_video_data(row)
+        single = len(rows) / (time.perf_counter() - start)
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(os.path.join(tmp, 'batch.db'))
+        rows = make_rows(args.rows)
+        start = time.perf_counter()
+        for i in range(0, len(rows), args.batch_size):
+            db.insert_many(rows[i:i + args.batch_size])
+        batch = len(rows) / (time.perf_counter() - start)
+    
+    print(f"逐条插入   ({args.single_rows:>6} 条): {single:>10,.0f} rows/s")
+    print(f"insert_many({args.rows:>6} 条): {batch:>10,.0f} rows/s  (每批 {args.batch_size} 条)")
+    print(f"提升: {batch / single:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
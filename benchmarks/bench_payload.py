@@ -0,0 +1,84 @@
+"""
+响应体积与序列化开销基准测试
+对比单视频数据接口在行格式/列式格式、标准库 json/orjson、不压缩/gzip/brotli 下
+返回 10000 个数据点的响应字节数和每个请求的服务端 CPU 时间（除最后一项外关闭响应缓存）
+
+用法:
+  python benchmarks/bench_payload.py
+  python benchmarks/bench_payload.py --points 20000 --repeat 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_insert import make_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应体积与序列化开销基准测试')
+    parser.add_argument('--points', type=int, default=10000, help='返回的数据点数')
+    parser.add_argument('--repeat', type=int, default=10, help='每种组合的请求次数')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # 在临时目录中导入 app，使其使用临时数据库
+        shutil.copy(os.path.join(ROOT, 'config.json'), tmp)
+        os.chdir(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as web
+        
+        web.db.insert_many(make_rows(args.points, 1))
+        cache_bytes = web.cache.max_bytes
+        client = web.app.test_client()
+        fast_json = web.orjson
+        
+        variants = [
+            ('行格式 + json，不压缩（原实现）', 'rows', None, None),
+            ('行格式 + orjson，不压缩', 'rows', fast_json, None),
+            ('行格式 + orjson + gzip', 'rows', fast_json, 'gzip'),
+            ('列式 + orjson，不压缩', 'columnar', fast_json, None),
+            ('列式 + orjson + gzip', 'columnar', fast_json, 'gzip'),
+        ]
+        if web.brotli is not None:
+            variants.append(('列式 + orjson + brotli', 'columnar', fast_json, 'br'))
+        # 数据未变化时重复请求，直接返回缓存中压缩好的响应
+        variants.append(('列式 + orjson + gzip，缓存命中', 'columnar', fast_json, 'gzip'))
+        if fast_json is None:
+            print("未安装 orjson，orjson 组合实际使用标准库 json（pip install orjson）")
+        if web.brotli is None:
+            print("未安装 brotli，跳过 brotli 组合（pip install brotli）")
+        
+        print(f"单视频 {args.points} 个数据点，全部指标，每种组合 {args.repeat} 次请求")
+        print(f"{'组合':<32} {'响应字节':>10} {'CPU(ms/请求)':>14}")
+        baseline = None
+        for name, fmt, encoder, encoding in variants:
+            web.orjson = encoder
+            web.cache.max_bytes = cache_bytes if '缓存命中' in name else 0
+            url = f'/api/video/BV1bench00000/stats?limit={args.points}&format={fmt}'
+            headers = {'Accept-Encoding': encoding} if encoding else {}
+            client.get(url, headers=headers)
+            
+            start = time.process_time()
+            for _ in range(args.repeat):
+                response = client.get(url, headers=headers)
+            cpu = (time.process_time() - start) / args.repeat * 1000
+            size = len(response.data)
+            
+            if baseline is None:
+                baseline = (size, cpu)
+            print(f"{name:<32} {size:>10} {cpu:>10.1f} "
+                  f"(体积 1/{baseline[0] / size:.0f}, CPU 1/{baseline[1] / cpu:.1f})")
+        
+        os.chdir(ROOT)
+
+
+if __name__ == '__main__':
+    main()
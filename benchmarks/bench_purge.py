@@ -0,0 +1,170 @@
+"""
+大批量删除基准测试
+删除一半历史数据期间，另一个线程模拟监控程序持续写入，对比写入延迟：
+- 单事务删除：所有视频的删除在一个事务中完成（改为后台任务之前的做法），写入要等整个删除结束
+- 分批删除：Database.delete_samples 按主键范围每批删除 delete_chunk_rows 行，批与批之间让出写锁，
+  之后用增量回收分批归还空闲页
+
+用法:
+  python benchmarks/bench_purge.py
+  python benchmarks/bench_purge.py --videos 100 --samples 20000 --chunk-rows 5000
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, SQL_REFRESH_CATALOG
+
+
+def build(db, videos, samples, end_ts, batch_size=5000):
+    """每个视频每分钟一次采样，共 samples 次"""
+    start_ts = end_ts - samples * 60
+    batch = []
+    for i in range(samples):
+        timestamp = datetime.fromtimestamp(start_ts + i * 60).strftime('%Y-%m-%d %H:%M:%S')
+        for v in range(videos):
+            batch.append({
+                'bv_id': f'BV1purge{v:05d}', 'title': f'测试视频 {v}',
+                'view': 1000 + i * 7, 'like': 100 + i, 'coin': i // 3,
+                'favorite': i // 4, 'share': i // 10, 'online': i % 500,
+                'timestamp': timestamp
+            })
+        if len(batch) >= batch_size:
+            db.insert_many(batch)
+            batch = []
+    if batch:
+        db.insert_many(batch)
+    return start_ts
+
+
+class Writer(threading.Thread):
+    """每隔 interval 秒写入一批新采样，记录每次 insert_many 的耗时"""
+    
+    def __init__(self, db, rows, interval):
+        super().__init__(daemon=True)
+        self.db = db
+        self.rows = rows
+        self.interval = interval
+        self.latencies = []
+        self.stop = threading.Event()
+        # 采样时间从未来开始，不与历史数据和删除范围重叠
+        self.ts = int(time.time()) + 86400
+    
+    def run(self):
+        while not self.stop.is_set():
+            self.ts += 1
+            timestamp = datetime.fromtimestamp(self.ts).strftime('%Y-%m-%d %H:%M:%S')
+            batch = [{
+                'bv_id': f'BV1live{v:05d}', 'title': '写入测试', 'view': self.ts, 'like': 0,
+                'coin': 0, 'favorite': 0, 'share': 0, 'online': 0, 'timestamp': timestamp
+            } for v in range(self.rows)]
+            start = time.perf_counter()
+            self.db.insert_many(batch)
+            self.latencies.append(time.perf_counter() - start)
+            self.stop.wait(self.interval)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+def delete_single_transaction(db, cutoff):
+    """改为后台任务之前的删除方式：所有视频在一个事务中删除"""
+    with db.connection() as conn:
+        video_ids = [(row['id'],) for row in conn.execute('SELECT id FROM videos')]
+        deleted = 0
+        for (video_id,) in video_ids:
+            deleted += conn.execute('DELETE FROM samples WHERE video_id = ? AND ts BETWEEN 0 AND ?',
+                                    (video_id, cutoff)).rowcount
+        conn.executemany(SQL_REFRESH_CATALOG, video_ids)
+    return deleted
+
+
+def db_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def run(path, options, label, delete, args):
+    """在写入线程运行期间执行 delete()，输出删除耗时和写入延迟"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(path, options)
+    writer = Writer(db, args.write_rows, args.write_interval)
+    writer.start()
+    time.sleep(1)
+    baseline = list(writer.latencies)
+    
+    start = time.perf_counter()
+    deleted = delete(db)
+    elapsed = time.perf_counter() - start
+    writer.stop.set()
+    writer.join()
+    # 包括删除期间开始、删除结束后才完成的写入
+    during = writer.latencies[len(baseline):]
+    
+    with db.connection() as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size = db_size(path)
+    db.close()
+    
+    ms = lambda seconds: f"{seconds * 1000:>8.1f}"
+    print(f"{label:<14} {deleted:>10,} {elapsed:>8.2f} {len(during):>6} "
+          f"{ms(percentile(during, 0.5))} {ms(percentile(during, 0.99))} {ms(max(during, default=0))}"
+          f"   {size / 1024 / 1024:>7.1f}")
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大批量删除基准测试')
+    parser.add_argument('--videos', type=int, default=40, help='视频数量')
+    parser.add_argument('--samples', type=int, default=15000, help='每个视频的采样数（每分钟一次）')
+    parser.add_argument('--chunk-rows', type=int, default=2000, help='分批删除时每批的行数')
+    parser.add_argument('--pause-ms', type=float, default=10, help='分批删除时每批之间的暂停')
+    parser.add_argument('--write-rows', type=int, default=50, help='写入线程每次写入的行数')
+    parser.add_argument('--write-interval', type=float, default=0.05, help='写入线程的写入间隔（秒）')
+    args = parser.parse_args()
+    
+    options = {'delete_chunk_rows': args.chunk_rows, 'delete_pause_ms': args.pause_ms}
+    end_ts = int(time.time())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'purge.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(path, options)
+        start = time.perf_counter()
+        start_ts = build(db, args.videos, args.samples, end_ts)
+        with db.connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.close()
+        print(f"{args.videos} 个视频 × {args.samples:,} 次采样 = {args.videos * args.samples:,} 条，"
+              f"生成耗时 {time.perf_counter() - start:.1f} 秒，数据库 {db_size(path) / 1024 / 1024:.1f} MB")
+        print(f"删除前一半数据；写入线程每 {args.write_interval * 1000:.0f}ms 写入 {args.write_rows} 条")
+        
+        copy = os.path.join(tmp, 'copy.db')
+        shutil.copy(path, copy)
+        cutoff = start_ts + args.samples * 30
+        
+        print(f"\n{'方式':<14} {'删除行数':>10} {'耗时(s)':>8} {'写入次数':>6} "
+              f"{'p50(ms)':>8} {'p99(ms)':>8} {'max(ms)':>8}   {'大小(MB)':>7}")
+        baseline = run(path, options, '单事务删除', lambda db: delete_single_transaction(db, cutoff), args)
+        
+        def chunked(db):
+            deleted, _ = db.delete_samples(None, 0, cutoff)
+            db.reclaim_space()
+            return deleted
+        run(copy, options, f'分批删除({args.chunk_rows})', chunked, args)
+        
+        print(f"\n删除前写入延迟: p50 {percentile(baseline, 0.5) * 1000:.1f}ms，"
+              f"max {max(baseline, default=0) * 1000:.1f}ms；分批删除的耗时包含增量回收")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+增长速度计算基准测试
+- 计算：同一序列用逐行 Python 循环（相当于原来在浏览器中逐点计算）与 rates.compute_rates 向量化计算的耗时
+- 接口：/api/videos/rates 首次请求（读库 + 计算）、数据不变时再次请求（响应缓存）、
+  只新增一个视频时（其余视频的计算结果命中缓存）的耗时，以及与下载全部原始采样相比的响应大小
+
+用法:
+  python benchmarks/bench_rates.py
+  python benchmarks/bench_rates.py --videos 20 --samples 50000
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rates import COUNTER_METRICS, compute_rates
+
+
+def make_rows(videos, samples, end_ts):
+    """间隔在 5~15 分钟之间变化的采样，播放量增长速度随时间起伏"""
+    rows = []
+    for v in range(videos):
+        ts = end_ts - samples * 600
+        view, like = 1000, 10
+        for i in range(samples):
+            ts += 300 + (i * 7919 + v) % 600
+            view += 50 + (i * 31 + v) % 200
+            like += (i * 13 + v) % 7
+            rows.append({
+                'bv_id': f'BV1rate{v:05d}', 'title': f'测试视频 {v}',
+                'view': view, 'like': like, 'coin': i // 3, 'favorite': i // 4,
+                'share': i // 10, 'online': i % 500,
+                'timestamp': datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+            })
+    return rows
+
+
+def python_rates(series, metrics, window=6):
+    """逐行计算增量、速度和滑动平均（对照）"""
+    result = {f'{metric}_{name}': [] for metric in metrics for name in ('delta', 'rate', 'rate_ma')}
+    ts = series['ts']
+    for metric in metrics:
+        values = series[metric]
+        deltas, elapsed = [], []
+        for i in range(1, len(ts)):
+            delta = values[i] - values[i - 1]
+            seconds = ts[i] - ts[i - 1]
+            deltas.append(delta)
+            elapsed.append(seconds)
+            result[f'{metric}_delta'].append(delta)
+            result[f'{metric}_rate'].append(delta * 3600 / seconds)
+            lo = max(0, len(deltas) - window)
+            result[f'{metric}_rate_ma'].append(sum(deltas[lo:]) * 3600 / sum(elapsed[lo:]))
+    return result
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = func()
+    return (time.perf_counter() - start) / repeat * 1000, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增长速度计算基准测试')
+    parser.add_argument('--videos', type=int, default=10, help='视频数量')
+    parser.add_argument('--samples', type=int, default=20000, help='每个视频的采样数')
+    parser.add_argument('--api-limit', type=int, default=5000, help='接口测试中每个视频参与计算的最新采样数')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # 在临时目录中导入 app，使其使用临时数据库
+        shutil.copy(os.path.join(ROOT, 'config.json'), tmp)
+        os.chdir(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as webapp
+        rows = make_rows(args.videos, args.samples, int(time.time()))
+        webapp.db.insert_many(rows)
+        bv_ids = [f'BV1rate{v:05d}' for v in range(args.videos)]
+        print(f"{args.videos} 个视频 × {args.samples:,} 次采样，采样间隔 5~15 分钟")
+        
+        series = webapp.db.get_range_series(bv_ids[:1], metrics=COUNTER_METRICS)[bv_ids[0]]
+        print(f"\n== 单个视频 {len(series['ts']):,} 个采样，{len(COUNTER_METRICS)} 个指标 ==")
+        loop_ms, _ = timed(lambda: python_rates(series, COUNTER_METRICS), args.repeat)
+        numpy_ms, _ = timed(lambda: compute_rates(series, COUNTER_METRICS), args.repeat)
+        print(f"  逐行计算（增量/速度/滑动平均）: {loop_ms:>8.1f} ms")
+        print(f"  向量化计算（另含加速度和比例）: {numpy_ms:>8.1f} ms  ({loop_ms / numpy_ms:.0f}x)")
+        
+        client = webapp.app.test_client()
+        query = f"limit={args.api_limit}&format=columnar&metrics=view,like"
+        print(f"\n== 接口（{args.videos - 1} 个视频 × 最新 {args.api_limit:,} 个采样，view/like，gzip）==")
+        
+        def request(ids, params=query, path='rates'):
+            response = client.get(f"/api/videos/{path}?bv_ids={','.join(ids)}&{params}",
+                                  headers={'Accept-Encoding': 'gzip'})
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return len(response.get_data())
+        
+        cold_ms, size = timed(lambda: request(bv_ids[:-1]), 1)
+        warm_ms, _ = timed(lambda: request(bv_ids[:-1]), args.repeat)
+        # 增加一个视频：响应缓存不命中，已计算过的视频直接使用缓存的计算结果
+        added_ms, _ = timed(lambda: request(bv_ids), 1)
+        print(f"  首次请求（读库 + 计算）:        {cold_ms:>8.1f} ms")
+        print(f"  再次请求（响应缓存）:           {warm_ms:>8.1f} ms")
+        print(f"  增加一个视频（其余命中计算缓存）: {added_ms:>8.1f} ms")
+        
+        hourly = request(bv_ids[:-1], query + '&resolution=3600&window=24')
+        raw = request(bv_ids[:-1], path='compare')
+        print(f"\n  响应大小（gzip）: 原始采样 {raw / 1024:,.0f} KB（需在浏览器中计算），增长数据 {size / 1024:,.0f} KB，"
+              f"按小时的增长数据 {hourly / 1024:,.0f} KB")
+        webapp.db.close()
+        os.chdir(ROOT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+抓取容错基准测试
+用注入故障的本地桩服务器模拟B站限流（412/-352）、随机错误和短时不可用，对比：
+- 原行为：任何错误都直接放弃该视频（不重试、不熔断）
+- 容错层：错误分类、带抖动的指数退避、限流时全局暂停、熔断、本轮末尾重新排队
+
+报告每个场景下保存的采样比例、发出的请求数、被拒绝的请求数（被限流时继续请求的次数）和耗时。
+
+用法:
+  python benchmarks/bench_resilience.py
+  python benchmarks/bench_resilience.py --videos 500 --scenarios throttle,outage
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bilibili_api import BilibiliAPI
+from monitor import VideoMonitor
+from stub_server import start_stub_server
+
+
+# 场景名 -> (说明, 注入的故障)
+SCENARIOS = {
+    'throttle': ('超速触发风控（每秒20个请求以上返回412，持续2秒）',
+                 {'rate_limit': 20, 'penalty_seconds': 2}),
+    'errors': ('随机错误（10% 503、5% 断开连接、5% code -352，2% 视频不存在）',
+               {'error_rate': 0.1, 'drop_rate': 0.05, 'throttle_code_rate': 0.05}),
+    'outage': ('接口在第1-4秒完全不可用（503）',
+               {'outage': (1, 4)}),
+}
+
+# 容错层参数：缩短等待时间以便快速完成测试
+RESILIENCE = {
+    'max_retries': 4,
+    'backoff_base_seconds': 0.2,
+    'backoff_max_seconds': 4,
+    'breaker_cooldown_seconds': 1,
+    'breaker_max_cooldown_seconds': 8
+}
+
+# 原行为：不重试、不熔断
+NO_RESILIENCE = {'max_retries': 0, 'breaker_error_rate': None}
+
+
+def make_bv_ids(count):
+    return [f'BV1bench{i:05d}' for i in range(count)]
+
+
+def run_baseline(faults, bv_ids, args):
+    """原行为：一轮并发抓取，失败的视频直接跳过"""
+    server, base_url = start_stub_server(args.latency, faults=faults)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with BilibiliAPI(base_url, concurrency=args.concurrency,
+                             requests_per_second=args.rps, resilience=NO_RESILIENCE) as api:
+                start = time.perf_counter()
+                saved = sum(1 for _, info, _ in api.iter_videos_info(bv_ids) if info)
+                elapsed = time.perf_counter() - start
+        return saved, server.request_count, server.fault_counts, elapsed
+    finally:
+        server.shutdown()
+
+
+def run_resilient(faults, bv_ids, args):
+    """容错层：通过 VideoMonitor.fetch_and_save 执行一轮抓取（含重新排队）"""
+    server, base_url = start_stub_server(args.latency, faults=faults)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config_file = os.path.join(tmp, 'config.json')
+            list_file = os.path.join(tmp, 'monitor.list')
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'api_base_url': base_url,
+                    'fetch_concurrency': args.concurrency,
+                    'requests_per_second': args.rps,
+                    'resilience': RESILIENCE
+                }, f)
+            with open(list_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(bv_ids))
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                with VideoMonitor(config_file, list_file, os.path.join(tmp, 'data.db')) as monitor:
+                    start = time.perf_counter()
+                    monitor.fetch_and_save()
+                    elapsed = time.perf_counter() - start
+                    saved = monitor.db.get_catalog_version()[1] or 0
+        return saved, server.request_count, server.fault_counts, elapsed
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抓取容错基准测试')
+    parser.add_argument('--videos', type=int, default=300, help='视频数量')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='测试场景，逗号分隔')
+    parser.add_argument('--rps', type=float, default=40, help='客户端每秒请求数上限')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发数')
+    parser.add_argument('--latency', type=float, default=0.01, help='桩服务器单请求延迟（秒）')
+    args = parser.parse_args()
+    
+    bv_ids = make_bv_ids(args.videos)
+    print(f"{args.videos} 个视频，客户端限速 {args.rps:g} 请求/秒，并发 {args.concurrency}")
+    for name in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+        description, faults = SCENARIOS[name]
+        faults = dict(faults)
+        expected = args.videos
+        if name == 'errors':
+            faults['missing'] = set(bv_ids[::50])
+            expected -= len(faults['missing'])
+        
+        print(f"\n== {name}: {description} ==")
+        print(f"{'方式':<10} {'保存/应保存':>12} {'请求数':>8} {'被拒绝':>8} {'耗时(s)':>8}  故障响应")
+        for label, run in (('原行为', run_baseline), ('容错层', run_resilient)):
+            saved, requests, fault_counts, elapsed = run(faults, bv_ids, args)
+            rejected = sum(v for k, v in fault_counts.items() if k != 'missing')
+            detail = ', '.join(f"{k}={v}" for k, v in sorted(fault_counts.items())) or '-'
+            print(f"{label:<10} {f'{saved}/{expected}':>12} {requests:>8} {rejected:>8} {elapsed:>8.1f}  {detail}")
+
+
+if __name__ == '__main__':
+    main()
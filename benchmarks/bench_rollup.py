@@ -0,0 +1,131 @@
+"""
+分层汇总基准测试
+- 写入：有无小时/天汇总触发器时 insert_many 的吞吐量
+- 查询：单个视频不同时间范围分别读取原始采样、小时汇总、天汇总的行数和耗时，以及自动选择的层级
+- 保留：按保留策略清理原始采样前后的数据库大小
+
+用法:
+  python benchmarks/bench_rollup.py
+  python benchmarks/bench_rollup.py --videos 50 --days 90 --interval-minutes 1
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, ROLLUP_TIERS, TIERS
+from retention import RetentionPolicy
+
+
+def make_rows(videos, days, interval_minutes, end_ts):
+    """生成按时间顺序的采样，每个视频的播放量持续增长"""
+    step = interval_minutes * 60
+    start_ts = end_ts - days * 86400
+    rows = []
+    for ts in range(start_ts, end_ts, step):
+        timestamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+        for v in range(videos):
+            n = (ts - start_ts) // step
+            rows.append({
+                'bv_id': f'BV1roll{v:05d}',
+                'title': f'测试视频 {v}',
+                'view': 1000 + n * (v + 1) * 7,
+                'like': 100 + n * (v + 1),
+                'coin': 50 + n // 3,
+                'favorite': 40 + n // 4,
+                'share': 10 + n // 10,
+                'online': (n * 37 + v) % 500,
+                'timestamp': timestamp
+            })
+    return rows
+
+
+def ingest(db, rows, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        db.insert_many(rows[i:i + batch_size])
+    return len(rows) / (time.perf_counter() - start)
+
+
+def db_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分层汇总基准测试')
+    parser.add_argument('--videos', type=int, default=20, help='视频数量')
+    parser.add_argument('--days', type=int, default=60, help='生成多少天的数据')
+    parser.add_argument('--interval-minutes', type=int, default=5, help='采样间隔（分钟）')
+    parser.add_argument('--batch-size', type=int, default=1000, help='insert_many 每批记录数')
+    parser.add_argument('--raw-days', type=int, default=30, help='原始采样保留天数')
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询重复次数')
+    args = parser.parse_args()
+    
+    end_ts = int(time.time())
+    rows = make_rows(args.videos, args.days, args.interval_minutes, end_ts)
+    print(f"{args.videos} 个视频 × {args.days} 天，每 {args.interval_minutes} 分钟一次采样，共 {len(rows):,} 条")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            plain = Database(os.path.join(tmp, 'plain.db'))
+            with plain.connection() as conn:
+                for tier in ROLLUP_TIERS:
+                    conn.execute(f'DROP TRIGGER trg_samples_{tier}')
+            path = os.path.join(tmp, 'rollup.db')
+            db = Database(path)
+        
+        without = ingest(plain, rows, args.batch_size)
+        with_rollup = ingest(db, rows, args.batch_size)
+        plain.close()
+        print(f"\n== 写入（每批 {args.batch_size} 条）==")
+        print(f"  无汇总表: {without:>10,.0f} rows/s")
+        print(f"  维护汇总: {with_rollup:>10,.0f} rows/s  ({with_rollup / without - 1:+.0%})")
+        
+        with db.connection() as conn:
+            counts = {tier: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                      for tier, (table, _) in ROLLUP_TIERS.items()}
+        print(f"  汇总表行数: " + '，'.join(f"{tier} {count:,}" for tier, count in counts.items()))
+        
+        # 原始采样覆盖全部时间范围时的读取代价；自动选择按保留策略（raw_days）进行
+        policy = RetentionPolicy(db, {'raw_days': args.raw_days})
+        bv_id = 'BV1roll00000'
+        print(f"\n== 查询单个视频（每次 {args.repeat} 次取平均）==")
+        print(f"{'范围':>6} " + ' '.join(f"{tier + ' 行数/ms':>18}" for tier in TIERS) + f"  {'自动选择':>8}")
+        for days in (1, 7, 30, args.days):
+            start_ts = end_ts - days * 86400
+            cells = []
+            for tier in TIERS:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    series = db.get_range_series([bv_id], start_ts, end_ts, tier=tier)[bv_id]
+                elapsed = (time.perf_counter() - start) / args.repeat * 1000
+                cells.append(f"{len(series['ts']):>10,} /{elapsed:>6.2f}")
+            print(f"{days:>5}天 " + ' '.join(f"{cell:>18}" for cell in cells)
+                  + f"  {policy.choose_tier(start_ts, end_ts):>8}")
+        
+        print(f"\n== 保留策略（原始采样保留 {args.raw_days} 天）==")
+        with db.connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        before = db_size(path)
+        start = time.perf_counter()
+        deleted = db.prune_tier('raw', end_ts - args.raw_days * 86400)
+        elapsed = time.perf_counter() - start
+        with db.connection() as conn:
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        after = db_size(path)
+        print(f"  删除原始采样 {deleted:,} 条，耗时 {elapsed:.2f} 秒")
+        print(f"  数据库大小: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB（VACUUM 后）")
+        print(f"  {args.days} 天范围仍可从汇总表读取: "
+              f"{len(db.get_range_series([bv_id], end_ts - args.days * 86400, end_ts, tier='hourly')[bv_id]['ts']):,} 个小时点")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+抓取调度基准测试
+用模拟时钟和合成的视频增长曲线（少数热门视频、部分增长较慢的视频、大量数据不变的旧视频，
+其中一个旧视频在中途突然走红），在相同请求预算下对比固定间隔与自适应调度：
+- 实际请求速率
+- 热门视频和旧视频的平均采样间隔，热门视频两次采样之间的平均播放量增长（越小曲线越细）
+- 走红视频从开始走红到被调度为最短间隔所需的时间
+
+用法:
+  python benchmarks/bench_scheduler.py
+  python benchmarks/bench_scheduler.py --videos 1000,10000 --budget 300 --hours 12
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+from statistics import mean
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import AdaptiveScheduler, REQUESTS_PER_FETCH
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def make_videos(count, hours, rng):
+    """
+    生成视频的播放量增长速度（次/秒）
+    
+    Returns:
+        tuple: (速度列表, 热门视频下标集合, 走红视频下标, 走红时间)
+    """
+    rates = []
+    hot = set()
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.02:
+            rates.append(rng.uniform(5, 50))
+            hot.add(i)
+        elif kind < 0.2:
+            rates.append(rng.uniform(0.01, 0.2))
+        else:
+            rates.append(rng.uniform(0, 0.002))
+    viral = next(i for i in range(count) if i not in hot)
+    return rates, hot, viral, hours * 3600 / 2
+
+
+def views_at(rates, viral, viral_at, i, t):
+    if i == viral and t > viral_at:
+        return rates[i] * t + 30 * (t - viral_at)
+    return rates[i] * t
+
+
+def simulate(mode, count, args):
+    """
+    模拟 args.hours 小时的抓取
+    
+    Returns:
+        dict: 统计结果
+    """
+    rng = random.Random(args.seed)
+    rates, hot, viral, viral_at = make_videos(count, args.hours, rng)
+    duration = args.hours * 3600
+    # 预算允许的两次抓取之间的最短时间
+    pace = REQUESTS_PER_FETCH * 60 / args.budget
+    samples = {i: [] for i in range(count)}
+    
+    if mode == 'fixed':
+        # 所有视频按同一间隔抓取，间隔不能短于预算允许的一轮耗时
+        interval = max(args.interval * 60, count * pace)
+        t = 0.0
+        while t < duration:
+            for i in range(count):
+                sample_t = t + i * pace
+                samples[i].append((sample_t, views_at(rates, viral, viral_at, i, sample_t)))
+            t += interval
+        detect = None
+    else:
+        clock = SimClock()
+        scheduler = AdaptiveScheduler(
+            min_interval=args.min_interval, max_interval=args.max_interval,
+            request_budget_per_minute=args.budget, initial_interval=args.interval * 60, clock=clock
+        )
+        bv_ids = [f'BV1sim{i:06d}' for i in range(count)]
+        index = {bv_id: i for i, bv_id in enumerate(bv_ids)}
+        scheduler.sync(bv_ids)
+        detect = None
+        while clock.now < duration:
+            due = scheduler.pop_due(limit=1)
+            if not due:
+                clock.now = max(clock.now, scheduler.next_due())
+                continue
+            i = index[due[0]]
+            views = views_at(rates, viral, viral_at, i, clock.now)
+            samples[i].append((clock.now, views))
+            state = scheduler.record(due[0], {'view': int(views), 'like': int(views / 20)})
+            if i == viral and clock.now > viral_at and detect is None \
+                    and state.interval <= args.min_interval * 1.5:
+                detect = clock.now - viral_at
+            # 请求按预算的速率发出
+            clock.now += pace
+    
+    fetches = sum(len(s) for s in samples.values())
+    
+    def gaps(indices):
+        values = [b[0] - a[0] for i in indices for a, b in zip(samples[i], samples[i][1:])]
+        return mean(values) if values else float('nan')
+    
+    def view_steps(indices):
+        values = [b[1] - a[1] for i in indices for a, b in zip(samples[i], samples[i][1:])]
+        return mean(values) if values else float('nan')
+    
+    cold = [i for i in range(count) if rates[i] < 0.002 and i != viral]
+    return {
+        'requests_per_minute': fetches * REQUESTS_PER_FETCH / (duration / 60),
+        'hot_gap': gaps(hot),
+        'hot_views': view_steps(hot),
+        'cold_gap': gaps(cold),
+        'detect': detect
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抓取调度基准测试')
+    parser.add_argument('--videos', default='100,1000,5000', help='视频数量，逗号分隔')
+    parser.add_argument('--budget', type=float, default=300, help='每分钟请求数预算')
+    parser.add_argument('--interval', type=float, default=10, help='固定间隔模式的间隔（分钟）')
+    parser.add_argument('--min-interval', type=float, default=60, help='自适应模式的最短间隔（秒）')
+    parser.add_argument('--max-interval', type=float, default=3600, help='自适应模式的最长间隔（秒）')
+    parser.add_argument('--hours', type=float, default=6, help='模拟时长（小时）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+    
+    print(f"请求预算 {args.budget:g}/分钟，模拟 {args.hours:g} 小时，"
+          f"固定间隔 {args.interval:g} 分钟，自适应间隔 {args.min_interval:g}-{args.max_interval:g} 秒")
+    print(f"{'视频数':>6} {'调度':<6} {'请求/分钟':>10} {'热门间隔(s)':>12} {'热门每次增长':>12} "
+          f"{'旧视频间隔(s)':>14} {'走红后达到最短间隔(s)':>22}")
+    for count in [int(n) for n in args.videos.split(',')]:
+        for mode in ('fixed', 'adaptive'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = simulate(mode, count, args)
+            detect = '-' if result['detect'] is None else f"{result['detect']:.0f}"
+            print(f"{count:>6} {mode:<6} {result['requests_per_minute']:>10.1f} {result['hot_gap']:>12.0f} "
+                  f"{result['hot_views']:>12.0f} {result['cold_gap']:>14.0f} {detect:>22}")
+
+
+if __name__ == '__main__':
+    main()
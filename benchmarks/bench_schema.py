@@ -0,0 +1,119 @@
+"""
+存储结构基准测试
+对比旧版 video_stats 表（文本时间戳 + 覆盖索引）与 v2 结构（videos + samples WITHOUT ROWID）
+的数据库大小和看板查询耗时
+
+用法:
+  python benchmarks/bench_schema.py
+  python benchmarks/bench_schema.py --videos 200 --samples 5000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, SQL_VIDEO_STATS, SQL_LATEST_DATA, to_epoch
+from bench_insert import make_rows
+
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE video_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bv_id TEXT NOT NULL,
+        title TEXT,
+        view INTEGER DEFAULT 0,
+        like INTEGER DEFAULT 0,
+        coin INTEGER DEFAULT 0,
+        favorite INTEGER DEFAULT 0,
+        share INTEGER DEFAULT 0,
+        online INTEGER DEFAULT 0,
+        timestamp TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_video_stats_recent
+    ON video_stats(bv_id, timestamp, title, view, like, coin, favorite, share, online);
+'''
+
+LEGACY_COLUMNS = 'id, bv_id, title, view, like, coin, favorite, share, online, timestamp'
+
+LEGACY_QUERIES = {
+    'latest 200': f'SELECT {LEGACY_COLUMNS} FROM video_stats WHERE bv_id = ? ORDER BY timestamp DESC LIMIT 200',
+    'latest 1': f'SELECT {LEGACY_COLUMNS} FROM video_stats WHERE bv_id = ? ORDER BY timestamp DESC LIMIT 1',
+    'one day': 'SELECT COUNT(*) FROM video_stats WHERE bv_id = ? AND date(timestamp) = ?',
+}
+
+V2_QUERIES = {
+    'latest 200': SQL_VIDEO_STATS.replace('LIMIT ?', 'LIMIT 200'),
+    'latest 1': SQL_LATEST_DATA,
+    'one day': '''SELECT COUNT(*) FROM videos v JOIN samples s ON s.video_id = v.id
+                  WHERE v.bv_id = ? AND s.ts BETWEEN ? AND ? + 86399''',
+}
+
+
+def file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def time_query(conn, sql, params, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='存储结构基准测试')
+    parser.add_argument('--videos', type=int, default=100, help='视频数量')
+    parser.add_argument('--samples', type=int, default=3000, help='每个视频的采样数')
+    parser.add_argument('--repeat', type=int, default=200, help='每个查询的重复次数')
+    args = parser.parse_args()
+    
+    rows = make_rows(args.videos * args.samples, args.videos)
+    day = rows[len(rows) // 2]['timestamp'][:10]
+    bv_id = rows[0]['bv_id']
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        legacy = sqlite3.connect(legacy_path)
+        legacy.executescript(LEGACY_SCHEMA)
+        legacy.executemany('''
+            INSERT INTO video_stats (bv_id, title, view, like, coin, favorite, share, online, timestamp)
+            VALUES (:bv_id, :title, :view, :like, :coin, :favorite, :share, :online, :timestamp)
+        ''', rows)
+        legacy.commit()
+        
+        v2_path = os.path.join(tmp, 'v2.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(v2_path)
+        for i in range(0, len(rows), 10000):
+            db.insert_many(rows[i:i + 10000])
+        with db.connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        
+        print(f"{len(rows):,} 条记录（{args.videos} 个视频 × {args.samples} 次采样）\n")
+        print(f"{'':<12} | {'旧版 video_stats':>18} | {'v2 samples':>12}")
+        print('-' * 50)
+        print(f"{'数据库大小':<8} | {file_size(legacy_path) / 1024 / 1024:>15.1f} MB | "
+              f"{file_size(v2_path) / 1024 / 1024:>9.1f} MB")
+        
+        day_start = to_epoch(day + ' 00:00:00')
+        with db.connection() as conn:
+            for name in LEGACY_QUERIES:
+                legacy_params = (bv_id, day) if name == 'one day' else (bv_id,)
+                v2_params = (bv_id, day_start, day_start) if name == 'one day' else (bv_id,)
+                old = time_query(legacy, LEGACY_QUERIES[name], legacy_params, args.repeat)
+                new = time_query(conn, V2_QUERIES[name], v2_params, args.repeat)
+                print(f"{name:<12} | {old:>15.3f} ms | {new:>9.3f} ms")
+        
+        legacy.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+推送通道负载测试
+启动 Web 服务并建立大量 /api/stream 订阅，另一个进程模拟监控进程按固定间隔写入新采样，
+统计每个订阅者收到的事件数、从提交写入到客户端收到的延迟，
+以及服务端为此执行的视频目录查询次数（与订阅者数量无关）
+
+用法:
+  python benchmarks/bench_stream.py
+  python benchmarks/bench_stream.py --subscribers 500 --rounds 10
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from bench_dashboard_rw import percentile
+
+
+def writer_process(db_path, videos, rounds, interval, commits):
+    """模拟监控进程：每轮为每个视频写入一条新采样，并记录提交时间"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(db_path)
+    base = int(time.time())
+    for n in range(1, rounds + 1):
+        time.sleep(interval)
+        timestamp = datetime.fromtimestamp(base + n).strftime('%Y-%m-%d %H:%M:%S')
+        db.insert_many([{
+            'bv_id': f'BV1bench{i:05d}',
+            'title': f'测试视频 {i}',
+            'view': 100000 + n,
+            'like': 5000 + n,
+            'coin': 3000,
+            'favorite': 2000,
+            'share': 1000,
+            'online': 12,
+            'timestamp': timestamp
+        } for i in range(videos)])
+        commits.put((base + n, time.time()))
+    db.close()
+
+
+def subscriber(port, received, ready, errors):
+    """打开一个 SSE 连接，记录每条 sample 事件的 (ts, 收到时间)"""
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/api/stream')
+        response = conn.getresponse()
+        ready.release()
+        event = None
+        while True:
+            line = response.fp.readline()
+            if not line:
+                break
+            line = line.decode('utf-8').rstrip('\n')
+            if line.startswith('event: '):
+                event = line[7:]
+            elif line.startswith('data: ') and event == 'sample':
+                received.append((json.loads(line[6:])['ts'], time.time()))
+    except Exception as e:
+        errors.append(str(e))
+        ready.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推送通道负载测试')
+    parser.add_argument('--subscribers', type=int, default=300, help='并发订阅者数量')
+    parser.add_argument('--videos', type=int, default=20, help='视频数量')
+    parser.add_argument('--rounds', type=int, default=5, help='写入轮数')
+    parser.add_argument('--interval', type=float, default=1.0, help='每轮写入间隔（秒）')
+    parser.add_argument('--poll-interval', type=float, default=10.0,
+                        help='对照：定时轮询间隔（秒），用于估算轮询方式的查询次数')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # 在临时目录中导入 app，使其使用临时数据库
+        shutil.copy(os.path.join(ROOT, 'config.json'), tmp)
+        os.chdir(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as web
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        
+        db_path = os.path.join(tmp, 'data.db')
+        server = make_server('127.0.0.1', 0, web.app, threaded=True)
+        server.daemon_threads = True
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        received = [[] for _ in range(args.subscribers)]
+        errors = []
+        ready = threading.Semaphore(0)
+        for i in range(args.subscribers):
+            threading.Thread(target=subscriber, args=(port, received[i], ready, errors), daemon=True).start()
+        for _ in range(args.subscribers):
+            ready.acquire()
+        # 等待所有订阅者注册到 broadcaster
+        while web.broadcaster.subscriber_count + len(errors) < args.subscribers:
+            time.sleep(0.05)
+        print(f"{web.broadcaster.subscriber_count} 个订阅者已连接，{len(errors)} 个失败")
+        
+        commits = multiprocessing.Queue()
+        writer = multiprocessing.Process(
+            target=writer_process,
+            args=(db_path, args.videos, args.rounds, args.interval, commits)
+        )
+        writer.start()
+        writer.join()
+        commit_times = dict(commits.get() for _ in range(args.rounds))
+        time.sleep(web.watcher.interval * 2 + 0.5)
+        
+        expected = args.videos * args.rounds
+        latencies = []
+        complete = 0
+        for events in received:
+            if len(events) >= expected:
+                complete += 1
+            latencies.extend((recv - commit_times[ts]) * 1000 for ts, recv in events if ts in commit_times)
+        
+        seconds = args.rounds * args.interval
+        polls = args.subscribers * seconds / args.poll_interval
+        
+        print(f"写入 {args.rounds} 轮 × {args.videos} 个视频，每个订阅者应收到 {expected} 条事件")
+        print(f"收到全部事件的订阅者: {complete}/{args.subscribers}，"
+              f"共投递 {len(latencies)} 条，断开的慢订阅者: {web.broadcaster.dropped}")
+        print(f"提交到收到的延迟: 平均 {sum(latencies) / max(1, len(latencies)):.0f} ms, "
+              f"p50 {percentile(latencies, 50):.0f} ms, p99 {percentile(latencies, 99):.0f} ms")
+        print(f"服务端视频目录查询: {web.watcher.changes} 次（与订阅者数量无关）")
+        print(f"对照：{args.subscribers} 个页面每 {args.poll_interval:g} 秒轮询一次，"
+              f"同样 {seconds:g} 秒内约 {polls:.0f} 次请求，新数据最多延迟 {args.poll_interval:g} 秒")
+        
+        server.shutdown()
+        os.chdir(ROOT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+HTTP传输层基准测试
+对比每次新建连接与连接池复用两种方式在本地TLS桩服务器上的吞吐量（requests/sec）
+
+用法:
+  python benchmarks/bench_transport.py
+  python benchmarks/bench_transport.py --requests 1000 --threads 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import urllib3
+
+from bilibili_api import HTTPTransport
+from stub_server import start_stub_server, generate_self_signed_cert
+
+
+def run(base_url, transport, total, threads):
+    """发送 total 个请求，返回每秒请求数"""
+    url = base_url + '/x/web-interface/view'
+    
+    def worker(i):
+        transport.get(url, {'bvid': f'BV1bench{i:05d}'}).json()
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(total)))
+    elapsed = time.perf_counter() - start
+    
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP传输层基准测试')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的请求总数')
+    parser.add_argument('--threads', type=int, default=4, help='并发线程数')
+    parser.add_argument('--latency', type=float, default=0.0, help='桩服务器单请求延迟（秒）')
+    parser.add_argument('--http2', action='store_true', help='额外测试HTTP/2（需要 httpx[http2]）')
+    args = parser.parse_args()
+    
+    # 自签名证书不做校验
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = generate_self_signed_cert(tmp)
+        server, base_url = start_stub_server(args.latency, certfile=certfile, keyfile=keyfile)
+        
+        cases = [
+            ('无连接池（每次新建TLS连接）', dict(keep_alive=False)),
+            ('连接池 keep-alive', dict(keep_alive=True)),
+        ]
+        if args.http2:
+            cases.append(('连接池 HTTP/2', dict(keep_alive=True, http2=True)))
+        
+        print(f"TLS桩服务器: {base_url}  请求数: {args.requests}  线程: {args.threads}")
+        try:
+            for name, options in cases:
+                transport = HTTPTransport(pool_per_host=args.threads, verify=False, **options)
+                try:
+                    rps = run(base_url, transport, args.requests, args.threads)
+                finally:
+                    transport.close()
+                print(f"  {name:<28} {rps:>8.1f} req/s")
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
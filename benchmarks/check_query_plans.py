@@ -0,0 +1,54 @@
+"""
+查询计划回归检查
+检查看板高频查询（database.HOT_QUERIES）是否直接由索引按顺序提供数据，
+出现临时B树排序（USE TEMP B-TREE）时以非零状态退出
+
+用法:
+  python benchmarks/check_query_plans.py            # 检查一个新建的临时数据库
+  python benchmarks/check_query_plans.py data.db    # 检查已有数据库（会先执行结构升级）
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, HOT_QUERIES
+
+
+def check(db):
+    """
+    Returns:
+        list: 不合格的查询名称
+    """
+    failures = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = db.explain_query_plan(sql, params)
+        bad = [step for step in plan if 'TEMP B-TREE' in step]
+        status = '✗' if bad else '✓'
+        print(f"{status} {name}")
+        for step in plan:
+            print(f"    {step}")
+        if bad:
+            failures.append(name)
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tmp, 'plan.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = Database(db_path)
+        failures = check(db)
+        db.close()
+    
+    if failures:
+        print(f"\n查询计划检查失败: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n查询计划检查通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+多节点分片抓取演示
+在本机启动桩服务器、协调进程和多个抓取子进程，依次演示：
+- 各抓取进程分到的视频数（一致性哈希的均衡程度）
+- 监控列表新增视频时已有视频是否换了抓取进程
+- 强制结束一个抓取进程后，它的视频多久被其余进程接管，期间是否有视频长时间没有数据
+
+用法:
+  python benchmarks/cluster_demo.py
+  python benchmarks/cluster_demo.py --videos 1000 --workers 4 --seconds 40
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cluster import Coordinator, HashRing
+from stub_server import start_stub_server
+
+
+def make_bv_ids(start, count):
+    return [f'BV1node{i:05d}' for i in range(start, start + count)]
+
+
+def write_list(path, bv_ids):
+    # 先写临时文件再替换，避免协调进程读到写了一半的列表
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(bv_ids) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def ring_movement(count, workers):
+    """计算哈希环增减一个节点时换节点的视频比例"""
+    keys = make_bv_ids(0, count)
+    ring = HashRing([f'w{i}' for i in range(workers)])
+    before = {key: ring.node_for(key) for key in keys}
+    ring.remove('w0')
+    moved = sum(1 for key in keys if ring.node_for(key) != before[key])
+    return moved / count
+
+
+def wait_until(predicate, timeout, step=0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(step)
+    return predicate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多节点分片抓取演示')
+    parser.add_argument('--videos', type=int, default=400, help='初始视频数量')
+    parser.add_argument('--workers', type=int, default=3, help='抓取进程数量')
+    parser.add_argument('--seconds', type=float, default=30, help='每个阶段运行的秒数')
+    parser.add_argument('--rps', type=float, default=200, help='每个抓取进程的每秒请求数上限')
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(latency=0.005)
+    tmp = tempfile.mkdtemp()
+    config_file = os.path.join(tmp, 'config.json')
+    list_file = os.path.join(tmp, 'monitor.list')
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'api_base_url': base_url,
+            'requests_per_second': args.rps,
+            'fetch_concurrency': 16,
+            'fetch_interval_minutes': 0.1,
+            'write_flush_seconds': 1,
+            'scheduler': {'min_interval_seconds': 2, 'max_interval_seconds': 5},
+            'cluster': {
+                'host': '127.0.0.1',
+                'port': 0,
+                'authkey': secrets.token_hex(16),
+                'heartbeat_seconds': 1,
+                'worker_timeout_seconds': 3,
+                'send_interval_seconds': 1
+            }
+        }, f)
+    bv_ids = make_bv_ids(0, args.videos)
+    write_list(list_file, bv_ids)
+    
+    log = io.StringIO()
+    workers = {}
+    with contextlib.redirect_stdout(log):
+        coordinator = Coordinator(config_file, list_file, os.path.join(tmp, 'data.db'))
+        thread = threading.Thread(target=coordinator.run, daemon=True)
+        thread.start()
+        wait_until(lambda: coordinator.address is not None, 5)
+        host, port = coordinator.address
+        for i in range(args.workers):
+            worker_id = f'worker{i + 1}'
+            workers[worker_id] = subprocess.Popen(
+                [sys.executable, '-u', os.path.join(ROOT, 'cluster.py'), 'worker', '--config', config_file,
+                 '--coordinator', f'{host}:{port}', '--id', worker_id],
+                cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+    
+    def shards():
+        with coordinator._lock:
+            return {w.worker_id: set(w.shard or ()) for w in coordinator.workers.values()}
+    
+    def sampled_since(keys, since):
+        with coordinator._lock:
+            return sum(1 for key in keys if coordinator.latest.get(key, {}).get('ts', 0) >= since)
+    
+    try:
+        with contextlib.redirect_stdout(log):
+            wait_until(lambda: len(shards()) == args.workers, 15)
+            time.sleep(args.seconds)
+        before = shards()
+        samples = sum(w.samples for w in coordinator.workers.values())
+        print(f"{args.videos} 个视频，{args.workers} 个抓取进程（每个限速 {args.rps:g} 请求/秒），"
+              f"哈希环每节点 {coordinator.options['replicas']} 个虚拟节点")
+        print(f"\n== 分片 ==")
+        for worker_id, shard in sorted(before.items()):
+            print(f"  {worker_id}: {len(shard)} 个视频")
+        print(f"  {args.seconds:g} 秒内收到 {samples} 条数据，"
+              f"{sampled_since(bv_ids, 0)}/{len(bv_ids)} 个视频有数据")
+        
+        # 新增视频：已有视频不应换抓取进程
+        added = make_bv_ids(args.videos, args.videos // 10)
+        with contextlib.redirect_stdout(log):
+            write_list(list_file, bv_ids + added)
+            wait_until(lambda: sum(len(s) for s in shards().values()) == len(bv_ids) + len(added), 10)
+        after = shards()
+        moved = sum(1 for worker_id, shard in before.items() for key in shard
+                    if key not in after.get(worker_id, ()))
+        print(f"\n== 监控列表新增 {len(added)} 个视频 ==")
+        print(f"  已有视频换抓取进程: {moved} 个")
+        bv_ids += added
+        
+        # 强制结束一个抓取进程
+        victim = 'worker1'
+        orphaned = after[victim]
+        # 采样时间精确到秒，只统计结束进程之后的下一秒起抓到的数据
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            killed_at = time.time()
+            workers[victim].kill()
+            workers[victim].wait()
+            detected = wait_until(lambda: victim not in shards(), 30, step=0.05)
+            detect_seconds = time.time() - killed_at
+            covered = wait_until(lambda: sampled_since(orphaned, math.ceil(killed_at)) == len(orphaned), 60)
+            cover_seconds = time.time() - killed_at
+            time.sleep(args.seconds)
+        final = shards()
+        print(f"\n== 强制结束 {victim}（{len(orphaned)} 个视频）==")
+        print(f"  判定失效: {detect_seconds:.1f} 秒" + ('' if detected else '（超时）'))
+        print(f"  全部被接管并重新抓到数据: {cover_seconds:.1f} 秒" + ('' if covered else '（超时）'))
+        for worker_id, shard in sorted(final.items()):
+            gained = len(shard - after[worker_id])
+            lost = len(after[worker_id] - shard)
+            print(f"  {worker_id}: {len(shard)} 个视频（接管 {gained}，移出 {lost}）")
+        print(f"  之后 {args.seconds:g} 秒内有数据的视频: "
+              f"{sampled_since(bv_ids, math.ceil(time.time() - args.seconds))}/{len(bv_ids)}")
+        print(f"  理论值: 移除 {args.workers} 个节点中的一个时约 "
+              f"{ring_movement(len(bv_ids), args.workers):.0%} 的视频换节点")
+    finally:
+        writer = coordinator.writer
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            # 协调进程通知抓取进程退出，超时未退出的强制结束
+            coordinator.close()
+            for process in workers.values():
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            server.shutdown()
+        print(f"\n协调进程共写入 {writer.saved} 条数据，{writer.transactions} 个事务")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""
+Web服务负载测试
+生成测试数据库，分别用开发服务器（python app.py 的方式）和生产服务器（serve.py）启动 Web 服务，
+多个客户端进程通过 keep-alive 连接持续请求所有只读 /api/* 接口，报告每个接口的 p50/p99 延迟和总吞吐量。
+
+测试期间另有 N 个推送通道（/api/stream）订阅者保持连接（相当于 N 个打开的看板页面），
+后台每秒写入一轮新采样，报告订阅者的连接数和收到的事件数。prod-threads 为
+stream_port 设为 null 的 serve.py（推送通道由工作线程处理），用于对照长连接占满线程池的情况。
+
+POST 接口（修改配置、删除数据）会改变数据，不在测试范围内。
+
+用法:
+  python benchmarks/load_test.py
+  python benchmarks/load_test.py --servers prod --clients 100 --seconds 30 --workers 4
+  python benchmarks/load_test.py --servers prod,prod-threads --subscribers 100
+  python benchmarks/load_test.py --url http://127.0.0.1:5000      # 测试已运行的服务
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+from bench_insert import make_rows
+from bench_dashboard_rw import percentile
+
+
+# (接口名, 权重, 路径模板)，{bv} 为随机视频，{bvs} 为随机5个视频
+ROUTES = [
+    ('GET /api/video/<bv_id>/stats', 30, '/api/video/{bv}/stats?limit=200'),
+    ('GET /api/video/<bv_id>/stats (降采样)', 10, '/api/video/{bv}/stats?limit=5000&max_points=500'),
+    ('GET /api/video/<bv_id>/latest', 15, '/api/video/{bv}/latest'),
+    ('GET /api/videos', 5, '/api/videos'),
+    ('GET /api/videos/info', 15, '/api/videos/info'),
+    ('GET /api/videos/compare', 15, '/api/videos/compare?bv_ids={bvs}&limit=200&metrics=view'),
+    ('GET /api/config', 5, '/api/config'),
+    ('GET /api/stream/stats', 5, '/api/stream/stats'),
+]
+
+
+TITLES = {
+    'dev': '开发服务器 (app.run)',
+    'prod': '生产服务器 (serve.py)',
+    'prod-threads': '生产服务器 (serve.py, stream_port: null)'
+}
+
+
+def generate_database(path, videos, samples):
+    """生成测试数据库"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(path)
+    rows = make_rows(videos * samples, videos)
+    for i in range(0, len(rows), 10000):
+        db.insert_many(rows[i:i + 10000])
+    db.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, workdir, port, args):
+    """在 workdir 中启动服务器，返回子进程"""
+    if kind == 'dev':
+        # 与 python app.py 相同的开发服务器（调试模式），不启用自动重载
+        command = [sys.executable, '-c',
+                   'import sys; sys.path.insert(0, sys.argv[1]); import app; '
+                   'app.app.run(host="127.0.0.1", port=int(sys.argv[2]), debug=True, use_reloader=False)',
+                   ROOT, str(port)]
+    else:
+        # prod-threads：不启动推送通道进程，/api/stream 由工作线程处理
+        stream_port = free_port() if kind == 'prod' else 0
+        command = [sys.executable, os.path.join(ROOT, 'serve.py'), '--host', '127.0.0.1', '--port', str(port),
+                   '--stream-port', str(stream_port)]
+        if args.workers:
+            command += ['--workers', str(args.workers)]
+        if args.threads:
+            command += ['--threads', str(args.threads)]
+    return subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/api/videos')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Subscribers:
+    """保持连接的推送通道订阅者，每个一个线程，跟随 serve.py 的重定向"""
+    
+    def __init__(self, host, port, count):
+        self.host = host
+        self.port = port
+        self.count = count
+        self.connected = 0
+        self.failed = 0
+        self.events = 0
+        self._sockets = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._ready = threading.Semaphore(0)
+    
+    def start(self, timeout=10):
+        """启动所有订阅者，最多等待 timeout 秒让它们连接"""
+        for _ in range(self.count):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        deadline = time.monotonic() + timeout
+        for _ in range(self.count):
+            if not self._ready.acquire(timeout=max(0, deadline - time.monotonic())):
+                break
+    
+    def _connect(self):
+        """
+        Returns:
+            tuple: (socket, 响应)；推送通道的响应没有长度，http.client 会在读取前释放 conn.sock，需先保存
+        """
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        conn.request('GET', '/api/stream')
+        sock = conn.sock
+        response = conn.getresponse()
+        if response.status == 307:
+            location = urlparse(response.getheader('Location'))
+            response.read()
+            conn.close()
+            conn = http.client.HTTPConnection(location.hostname, location.port, timeout=30)
+            conn.request('GET', location.path + ('?' + location.query if location.query else ''))
+            sock = conn.sock
+            response = conn.getresponse()
+        if response.status != 200:
+            raise http.client.HTTPException(f'HTTP {response.status}')
+        return sock, response
+    
+    def _run(self):
+        try:
+            sock, response = self._connect()
+        except (OSError, http.client.HTTPException):
+            with self._lock:
+                self.failed += 1
+            self._ready.release()
+            return
+        
+        with self._lock:
+            self.connected += 1
+            self._sockets.append(sock)
+        self._ready.release()
+        try:
+            sock.settimeout(None)
+            for line in response.fp:
+                if line.startswith(b'event: sample'):
+                    with self._lock:
+                        self.events += 1
+        except (OSError, ValueError):
+            pass
+    
+    def close(self):
+        """断开所有订阅者，返回仍保持连接的数量"""
+        alive = sum(thread.is_alive() for thread in self._threads)
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=1)
+        return alive
+
+
+def write_samples(path, videos, interval, stop):
+    """负载期间每隔 interval 秒给前 10 个视频各写入一条新采样，产生推送事件"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(path)
+    rounds = 0
+    while not stop.wait(interval):
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = make_rows(min(10, videos), videos)
+        for row in rows:
+            row['timestamp'] = timestamp
+        db.insert_many(rows)
+        rounds += 1
+    db.close()
+    return rounds
+
+
+def client_process(host, port, clients, seconds, videos, seed, results):
+    """一个客户端进程：多个线程各自保持一个 keep-alive 连接循环请求"""
+    names = [name for name, _, _ in ROUTES]
+    weights = [weight for _, weight, _ in ROUTES]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    
+    def worker(n):
+        rng = random.Random(seed * 1000 + n)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+        while time.monotonic() < deadline:
+            index = rng.choices(range(len(ROUTES)), weights)[0]
+            name, _, template = ROUTES[index]
+            path = template.format(
+                bv=f'BV1bench{rng.randrange(videos):05d}',
+                bvs=','.join(f'BV1bench{i:05d}' for i in rng.sample(range(videos), min(5, videos)))
+            )
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                # serve.py 把 /api/stream/stats 重定向到推送通道进程
+                if response.status in (200, 307):
+                    local[name].append((time.perf_counter() - start) * 1000)
+                else:
+                    local_errors[name] += 1
+            except (OSError, http.client.HTTPException):
+                local_errors[name] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.close()
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += local_errors[name]
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((latencies, errors))
+
+
+def run_load(host, port, args):
+    """运行负载并汇总结果"""
+    processes = max(1, min(args.processes, args.clients))
+    results = multiprocessing.Queue()
+    workers = []
+    for p in range(processes):
+        clients = args.clients // processes + (1 if p < args.clients % processes else 0)
+        workers.append(multiprocessing.Process(
+            target=client_process,
+            args=(host, port, clients, args.seconds, args.videos, args.seed + p, results)
+        ))
+    for w in workers:
+        w.start()
+    
+    latencies = {name: [] for name, _, _ in ROUTES}
+    errors = {name: 0 for name, _, _ in ROUTES}
+    for _ in workers:
+        part_latencies, part_errors = results.get()
+        for name in latencies:
+            latencies[name].extend(part_latencies[name])
+            errors[name] += part_errors[name]
+    for w in workers:
+        w.join()
+    return latencies, errors
+
+
+def run_with_subscribers(host, port, args, db_path=None):
+    """
+    订阅者连接后运行负载，负载期间写入新采样（db_path 为空时不写入）
+    
+    Returns:
+        tuple: (各接口延迟, 各接口错误数, 订阅者统计的说明)
+    """
+    subscribers = Subscribers(host, port, args.subscribers)
+    subscribers.start()
+    stop = threading.Event()
+    writer = None
+    if db_path:
+        writer = threading.Thread(target=write_samples, args=(db_path, args.videos, args.write_interval, stop))
+        writer.start()
+    try:
+        latencies, errors = run_load(host, port, args)
+    finally:
+        stop.set()
+        if writer is not None:
+            writer.join()
+        # 等待最后一轮写入推送到订阅者
+        time.sleep(1)
+        alive = subscribers.close()
+    
+    summary = (f"推送订阅者: {subscribers.connected}/{subscribers.count} 个已连接，"
+               f"{subscribers.failed} 个失败，结束时 {alive} 个仍在线，共收到 {subscribers.events} 条 sample 事件")
+    return latencies, errors, summary
+
+
+def report(title, latencies, errors, seconds, subscribers=None):
+    total = sum(len(v) for v in latencies.values())
+    failed = sum(errors.values())
+    print(f"\n== {title}: {total / seconds:.0f} 请求/秒，{failed} 个错误 ==")
+    if subscribers is not None:
+        print(subscribers)
+    print(f"{'接口':<40} {'请求数':>8} {'错误':>6} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for name, values in latencies.items():
+        print(f"{name:<40} {len(values):>8} {errors[name]:>6} "
+              f"{percentile(values, 50):>9.1f} {percentile(values, 99):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Web服务负载测试')
+    parser.add_argument('--servers', default='dev,prod',
+                        help='测试的服务器，逗号分隔：dev（开发服务器）、prod（serve.py）、'
+                             'prod-threads（serve.py，推送通道由工作线程处理）')
+    parser.add_argument('--url', help='直接测试已运行的服务（需已有 BV1bench 测试数据），不生成数据库')
+    parser.add_argument('--videos', type=int, default=200, help='测试数据库中的视频数')
+    parser.add_argument('--samples', type=int, default=2000, help='每个视频的采样数')
+    parser.add_argument('--clients', type=int, default=50, help='并发客户端（连接）数')
+    parser.add_argument('--processes', type=int, default=4, help='客户端进程数')
+    parser.add_argument('--seconds', type=float, default=15, help='每个服务器的测试时长（秒）')
+    parser.add_argument('--workers', type=int, help='serve.py 工作进程数，默认取 config.json')
+    parser.add_argument('--threads', type=int, help='serve.py 每个工作进程的线程数，默认取 config.json')
+    parser.add_argument('--subscribers', type=int, default=100, help='负载期间保持连接的推送通道订阅者数')
+    parser.add_argument('--write-interval', type=float, default=1.0, help='负载期间写入新采样的间隔（秒）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+    
+    print(f"{args.clients} 个并发连接，{args.processes} 个客户端进程，"
+          f"{args.subscribers} 个推送订阅者，每轮 {args.seconds:g} 秒")
+    
+    if args.url:
+        url = urlparse(args.url)
+        latencies, errors, summary = run_with_subscribers(url.hostname, url.port or 80, args)
+        report(args.url, latencies, errors, args.seconds, summary)
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(ROOT, 'config.json'), tmp)
+        print(f"生成测试数据库: {args.videos} 个视频 × {args.samples} 条采样")
+        generate_database(os.path.join(tmp, 'data.db'), args.videos, args.samples)
+        
+        for kind in [s.strip() for s in args.servers.split(',') if s.strip()]:
+            port = free_port()
+            server = start_server(kind, tmp, port, args)
+            try:
+                if not wait_ready('127.0.0.1', port):
+                    print(f"{kind} 服务器启动失败")
+                    continue
+                latencies, errors, summary = run_with_subscribers('127.0.0.1', port, args,
+                                                                  os.path.join(tmp, 'data.db'))
+                report(TITLES.get(kind, kind), latencies, errors, args.seconds, summary)
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
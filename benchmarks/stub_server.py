@@ -0,0 +1,282 @@
+"""
+本地Bilibili API桩服务器
+模拟视频信息、批量视频信息和在线人数接口，用于基准测试。
+可以注入故障：超过速率时触发风控（HTTP 412）、随机 5xx、code -352、断开连接、
+不存在的视频，以及一段时间内完全不可用。
+"""
+import json
+import os
+import random
+import ssl
+import subprocess
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# 默认不注入故障
+DEFAULT_FAULTS = {
+    'rate_limit': None,         # 最近1秒内请求数超过该值时触发风控，之后 penalty_seconds 秒内返回 412
+    'penalty_seconds': 5,       # 风控持续时间
+    'extend_penalty': True,     # 风控期间继续请求是否延长风控（模拟B站对持续请求的惩罚）
+    'error_rate': 0.0,          # 随机返回 503 的比例
+    'throttle_code_rate': 0.0,  # 随机返回 code -352（风控校验失败）的比例
+    'drop_rate': 0.0,           # 随机断开连接不返回响应的比例
+    'missing': (),              # 返回 code 62002（稿件不可见）的BV号
+    'outage': None,             # (开始秒数, 结束秒数)：相对启动时间，期间所有请求返回 503
+    'batch_limit': None         # 批量接口一次最多查询的视频数，超过时返回 code -400
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency)
+        
+        with self.server.lock:
+            self.server.request_count += 1
+            self.server.path_counts[url.path] += 1
+        
+        fault = self.server.inject_fault(params)
+        if fault == 'drop':
+            self.close_connection = True
+            return
+        if fault == 'throttled':
+            self.send_json({'code': -412, 'message': '请求被拦截'}, status=412)
+            return
+        if fault == 'unavailable':
+            self.send_json({'code': -500, 'message': '服务器错误'}, status=503)
+            return
+        if fault == 'throttle_code':
+            self.send_json({'code': -352, 'message': '风控校验失败'})
+            return
+        if fault == 'missing':
+            self.send_json({'code': 62002, 'message': '稿件不可见'})
+            return
+        
+        if url.path == '/x/web-interface/view':
+            bv_id = params.get('bvid', '')
+            seed = zlib.crc32(bv_id.encode('utf-8'))
+            tick = int(time.time())
+            # 记录 aid，批量接口按 aid 查询
+            with self.server.lock:
+                self.server.aids[seed] = bv_id
+            self.send_json({
+                'code': 0,
+                'message': '0',
+                'data': {
+                    'bvid': bv_id,
+                    'aid': seed,
+                    'cid': seed + 1,
+                    'title': f'测试视频 {bv_id}',
+                    'stat': {
+                        'view': seed % 100000 + tick % 1000,
+                        'like': seed % 5000,
+                        'coin': seed % 3000,
+                        'favorite': seed % 2000,
+                        'share': seed % 1000
+                    }
+                }
+            })
+        elif url.path == '/medialist/gateway/base/resource/infos':
+            resources = [r for r in params.get('resources', '').split(',') if r]
+            limit = self.server.faults['batch_limit']
+            if limit and len(resources) > limit:
+                self.send_json({'code': -400, 'message': '请求错误'})
+                return
+            tick = int(time.time())
+            items = []
+            for resource in resources:
+                aid = int(resource.split(':')[0])
+                bv_id = self.server.aids.get(aid)
+                # 未知或不可见的视频不出现在结果中
+                if bv_id is None or bv_id in self.server.faults['missing']:
+                    continue
+                items.append({
+                    'id': aid,
+                    'type': 2,
+                    'bv_id': bv_id,
+                    'title': f'测试视频 {bv_id}',
+                    'cnt_info': {
+                        'play': aid % 100000 + tick % 1000,
+                        'thumb_up': aid % 5000,
+                        'coin': aid % 3000,
+                        'collect': aid % 2000,
+                        'share': aid % 1000
+                    }
+                })
+            self.send_json({'code': 0, 'message': '0', 'data': items})
+        elif url.path == '/x/player/online/total':
+            seed = zlib.crc32(params.get('bvid', '').encode('utf-8'))
+            if params.get('cid') != str(seed + 1):
+                self.send_json({'code': -404, 'message': 'cid不匹配'})
+            else:
+                self.send_json({'code': 0, 'message': '0', 'data': {'total': '12'}})
+        else:
+            self.send_json({'code': -404, 'message': '啥都木有'})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    ssl_context = None
+    faults = DEFAULT_FAULTS
+    
+    def setup_faults(self, faults=None, seed=1):
+        self.faults = dict(DEFAULT_FAULTS)
+        self.faults.update(faults or {})
+        self.random = random.Random(seed)
+        self.started = time.monotonic()
+        self.recent = deque()
+        self.penalty_until = 0.0
+        # 各类故障响应的次数
+        self.fault_counts = {}
+    
+    def inject_fault(self, params):
+        """
+        决定本次请求是否注入故障
+        
+        Returns:
+            str: 故障类型，None 表示正常响应
+        """
+        faults = self.faults
+        with self.lock:
+            now = time.monotonic()
+            fault = None
+            outage = faults['outage']
+            if outage and outage[0] <= now - self.started < outage[1]:
+                fault = 'unavailable'
+            elif faults['rate_limit']:
+                self.recent.append(now)
+                while self.recent and self.recent[0] <= now - 1:
+                    self.recent.popleft()
+                if now < self.penalty_until:
+                    fault = 'throttled'
+                    if faults['extend_penalty']:
+                        self.penalty_until = now + faults['penalty_seconds']
+                elif len(self.recent) > faults['rate_limit']:
+                    fault = 'throttled'
+                    self.penalty_until = now + faults['penalty_seconds']
+            
+            if fault is None:
+                roll = self.random.random()
+                if roll < faults['drop_rate']:
+                    fault = 'drop'
+                elif roll < faults['drop_rate'] + faults['error_rate']:
+                    fault = 'unavailable'
+                elif roll < faults['drop_rate'] + faults['error_rate'] + faults['throttle_code_rate']:
+                    fault = 'throttle_code'
+                elif params.get('bvid') in faults['missing']:
+                    fault = 'missing'
+            
+            if fault is not None:
+                self.fault_counts[fault] = self.fault_counts.get(fault, 0) + 1
+            return fault
+    
+    def finish_request(self, request, client_address):
+        # 在处理线程中完成TLS握手，避免握手串行阻塞accept
+        if self.ssl_context is not None:
+            try:
+                request = self.ssl_context.wrap_socket(request, server_side=True)
+            except (ssl.SSLError, OSError):
+                return
+        super().finish_request(request, client_address)
+
+
+def generate_self_signed_cert(directory):
+    """
+    使用 openssl 生成自签名证书
+    
+    Returns:
+        tuple: (certfile, keyfile)
+    """
+    certfile = os.path.join(directory, 'stub.crt')
+    keyfile = os.path.join(directory, 'stub.key')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+        '-keyout', keyfile, '-out', certfile, '-days', '1',
+        '-subj', '/CN=127.0.0.1'
+    ], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def start_stub_server(latency=0.05, host='127.0.0.1', port=0, certfile=None, keyfile=None, faults=None):
+    """
+    在后台线程中启动桩服务器
+    
+    Args:
+        latency: 每个请求的模拟延迟（秒）
+        certfile: TLS证书，提供时以HTTPS方式提供服务
+        keyfile: TLS私钥
+        faults: 注入的故障，覆盖 DEFAULT_FAULTS
+        
+    Returns:
+        tuple: (server, base_url)
+    """
+    server = StubServer((host, port), StubHandler)
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.path_counts = Counter()
+    server.aids = {}
+    server.setup_faults(faults)
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    scheme = 'http'
+    if certfile:
+        server.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server.ssl_context.load_cert_chain(certfile, keyfile)
+        scheme = 'https'
+    
+    return server, f'{scheme}://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='本地Bilibili API桩服务器')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--rate-limit', type=int, help='每秒请求数超过该值时返回412风控')
+    parser.add_argument('--penalty', type=float, default=5, help='风控持续秒数')
+    parser.add_argument('--error-rate', type=float, default=0, help='随机返回503的比例')
+    parser.add_argument('--throttle-code-rate', type=float, default=0, help='随机返回code -352的比例')
+    parser.add_argument('--drop-rate', type=float, default=0, help='随机断开连接的比例')
+    parser.add_argument('--batch-limit', type=int, help='批量接口一次最多查询的视频数')
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(args.latency, port=args.port, faults={
+        'rate_limit': args.rate_limit,
+        'penalty_seconds': args.penalty,
+        'error_rate': args.error_rate,
+        'throttle_code_rate': args.throttle_code_rate,
+        'drop_rate': args.drop_rate,
+        'batch_limit': args.batch_limit
+    })
+    print(f"桩服务器运行在 {base_url}，按 Ctrl+C 停止")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,16 +3,802 @@ Bilibili API 接口封装
 用于获取视频数据
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from datetime import datetime
 
+from counts import to_count
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+
+API_BASE = 'https://api.bilibili.com'
+
+# 错误分类
+THROTTLED = 'throttled'     # 被限流/风控（HTTP 412/429，code -352/-403/-412/-509/-799），需要全局降速
+NOT_FOUND = 'not_found'     # 视频不存在或不可见，重试无意义
+INVALID = 'invalid'         # 请求参数错误（HTTP 400，code -400），重试无意义，但不说明视频不存在
+TRANSIENT = 'transient'     # 超时、连接失败、5xx 等临时错误，退避后重试
+
+# 重试无意义的错误分类
+FINAL_ERRORS = {NOT_FOUND, INVALID}
+
+THROTTLE_STATUS = {412, 429}
+THROTTLE_CODES = {-352, -403, -412, -509, -799}
+NOT_FOUND_STATUS = {404}
+NOT_FOUND_CODES = {-404, 62002, 62004, 62012}
+INVALID_STATUS = {400}
+INVALID_CODES = {-400}
+
+# 默认重试与熔断参数，可通过 config.json 的 "resilience" 字段覆盖
+DEFAULT_RESILIENCE_OPTIONS = {
+    'max_retries': 3,                   # 单个请求失败后的最大重试次数（不存在的视频不重试）
+    'backoff_base_seconds': 1,          # 指数退避的初始等待时间
+    'backoff_max_seconds': 60,          # 指数退避的最长等待时间
+    'burst': 1,                         # 令牌桶容量，允许短时间内连续发出的请求数
+    'breaker_window': 50,               # 熔断器统计最近多少个请求的结果
+    'breaker_min_requests': 10,         # 窗口内至少有多少个请求才判断错误率
+    'breaker_error_rate': 0.5,          # 错误率达到多少时熔断，null 表示不熔断
+    'breaker_cooldown_seconds': 30,     # 熔断后暂停的时间，恢复试探失败时加倍
+    'breaker_max_cooldown_seconds': 600  # 暂停时间上限
+}
+
+# 批量接口：一次请求按 aid 获取多个视频的标题和统计数据（不含在线人数）
+BATCH_PATH = '/medialist/gateway/base/resource/infos'
+
+# 默认批量抓取参数，可通过 config.json 的 "batch" 字段覆盖
+DEFAULT_BATCH_OPTIONS = {
+    'enabled': True,        # 已缓存 aid 的视频是否通过批量接口抓取
+    'initial_size': 20,     # 初始每批视频数
+    'min_size': 5,          # 每批最少视频数，这个大小仍被接口拒绝时停用批量接口
+    'max_size': 100,        # 每批最多视频数
+    'step': 5,              # 批量请求成功后每批增加的视频数
+    'fetch_online': True    # 是否逐个请求批量接口不返回的在线人数
+}
+
+
+class FetchError(Exception):
+    """
+    请求失败
+    
+    Attributes:
+        kind: 错误分类（THROTTLED / NOT_FOUND / INVALID / TRANSIENT）
+        status: HTTP状态码
+        code: 接口返回的 code
+    """
+    
+    def __init__(self, kind, message, status=None, code=None):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.code = code
+
+
+def classify_error(status=None, code=None):
+    """
+    根据HTTP状态码或接口 code 对错误分类
+    
+    Returns:
+        str: THROTTLED、NOT_FOUND、INVALID 或 TRANSIENT
+    """
+    if status in THROTTLE_STATUS or code in THROTTLE_CODES:
+        return THROTTLED
+    if status in NOT_FOUND_STATUS or code in NOT_FOUND_CODES:
+        return NOT_FOUND
+    if status in INVALID_STATUS or code in INVALID_CODES:
+        return INVALID
+    return TRANSIENT
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, rng=random):
+    """
+    带随机抖动的指数退避时间（full jitter），避免多个线程同时重试
+    
+    Args:
+        attempt: 第几次重试（从0开始）
+        base: 初始等待时间（秒）
+        cap: 最长等待时间（秒）
+        
+    Returns:
+        float: 等待秒数，在 [0, min(cap, base × 2^attempt)] 内均匀分布
+    """
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    全局令牌桶限速器（线程安全）
+    
+    令牌以 rate 个/秒的速度补充，最多积攒 burst 个，所有线程共享同一个桶，
+    保证整体请求速率不超过 rate 次/秒。
+    被限流时调用 throttle：暂停整个桶（所有线程一起等待）并把速率减半，
+    之后每个成功的请求让速率缓慢回升到上限（AIMD），避免恢复后立即再次触发限流。
+    """
+    
+    def __init__(self, rate, burst=1, min_rate_ratio=1 / 16, recovery_requests=200):
+        """
+        Args:
+            rate: 每秒请求数上限，<=0 表示不限速（仍会执行暂停）
+            burst: 桶容量
+            min_rate_ratio: 被限流后速率最低降到上限的多少
+            recovery_requests: 从减半后的速率回升到上限大约需要多少个成功请求
+        """
+        self.max_rate = rate if rate and rate > 0 else 0
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate * min_rate_ratio
+        self.recovery_step = self.max_rate / max(1, recovery_requests) * 2
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # 上次减速之后是否有请求成功，没有时再次被限流不重复减速（仍在途的请求报告的是同一次限流）
+        self._succeeded = True
+    
+    def _refill(self, now):
+        if self.rate and now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = max(self._updated, now)
+    
+    def acquire(self):
+        """阻塞直到获得一个请求名额"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                    reserved = False
+                else:
+                    if not self.rate:
+                        return
+                    self._refill(now)
+                    # 令牌不足时预支，等待到预支的令牌补充完成
+                    self._tokens -= 1
+                    wait = max(0.0, -self._tokens) / self.rate
+                    reserved = True
+            
+            if wait > 0:
+                time.sleep(wait)
+            # 等待期间桶被暂停时，预支的名额作废，重新排队
+            if reserved and time.monotonic() >= self._paused_until:
+                return
+    
+    def pause(self, seconds):
+        """
+        暂停发放令牌
+        
+        Args:
+            seconds: 暂停时长，与已有的暂停重叠时取较晚的结束时间
+        """
+        with self._lock:
+            self._pause(time.monotonic(), seconds)
+    
+    def _pause(self, now, seconds):
+        until = now + seconds
+        if until <= self._paused_until:
+            return
+        self._refill(now)
+        # 暂停结束后从空桶开始补充，避免恢复时突发请求
+        self._tokens = 0.0
+        self._updated = until
+        self._paused_until = until
+    
+    def throttle(self, seconds):
+        """
+        被限流：暂停 seconds 秒并把速率减半，两次减速之间至少要有一个请求成功，
+        避免同一次限流被多个在途请求重复报告导致速率降到底
+        
+        Returns:
+            bool: 是否降低了速率
+        """
+        with self._lock:
+            now = time.monotonic()
+            slowed = self._succeeded and self.rate > self.min_rate
+            if slowed:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._succeeded = False
+            self._pause(now, seconds)
+            return slowed
+    
+    def success(self):
+        """请求成功，速率加性回升"""
+        if self.rate < self.max_rate or not self._succeeded:
+            with self._lock:
+                self._succeeded = True
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+
+# 保留旧名称
+RateLimiter = TokenBucket
+
+
+class CircuitBreaker:
+    """
+    熔断器（线程安全）
+    
+    统计最近 window 个请求的结果，错误率达到阈值时熔断（open），暂停所有请求 cooldown 秒；
+    之后进入半开状态（half_open），只放行一个试探请求：成功则恢复（closed），
+    失败则再次熔断并把暂停时间加倍。
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, window=50, min_requests=10, error_rate=0.5, cooldown=30, max_cooldown=600):
+        """
+        Args:
+            window: 统计的最近请求数
+            min_requests: 判断错误率所需的最少请求数
+            error_rate: 熔断的错误率阈值，None 表示不熔断
+            cooldown: 熔断后暂停的秒数
+            max_cooldown: 暂停时间上限
+        """
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(max_cooldown, cooldown)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened = 0
+        self._results = deque(maxlen=window)
+        self._open_until = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        """阻塞直到允许发送请求（熔断期间等待，半开时只放行一个试探请求）"""
+        with self._cond:
+            while True:
+                if self.state == self.CLOSED:
+                    return
+                now = time.monotonic()
+                if self.state == self.OPEN and now >= self._open_until:
+                    self.state = self.HALF_OPEN
+                    self._probing = False
+                if self.state == self.HALF_OPEN and not self._probing:
+                    self._probing = True
+                    return
+                timeout = self._open_until - now if self.state == self.OPEN else None
+                self._cond.wait(timeout)
+    
+    def record(self, success):
+        """
+        记录一个请求的结果
+        
+        Args:
+            success: 是否成功（不存在的视频也算成功，说明接口正常）
+        """
+        with self._cond:
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing = False
+                if success:
+                    self.state = self.CLOSED
+                    self.cooldown = self.base_cooldown
+                    self._results.clear()
+                else:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open()
+                self._cond.notify_all()
+                return
+            
+            if self.state != self.CLOSED:
+                return
+            self._results.append(success)
+            if self.error_rate is None or len(self._results) < self.min_requests:
+                return
+            errors = self._results.count(False)
+            if errors / len(self._results) >= self.error_rate:
+                self._open()
+    
+    def _open(self):
+        self.state = self.OPEN
+        self.opened += 1
+        self._open_until = time.monotonic() + self.cooldown
+        self._results.clear()
+        print(f"⚠️  错误率过高，暂停请求 {self.cooldown:g} 秒")
+    
+    def remaining(self):
+        """熔断剩余的暂停时间（秒），未熔断时为0"""
+        with self._cond:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+
+class BatchSizer:
+    """
+    批量请求大小（线程安全）
+    
+    与令牌桶相同采用 AIMD：批量请求成功后每批加 step 个视频，因限流或临时错误失败时减半。
+    被接口拒绝（参数错误，通常是一次查询的视频过多）时把上限记为当前大小减一，
+    下一批取成功过的最大大小与被拒绝大小的中间值；在 min_size 下仍被拒绝时停用批量接口。
+    """
+    
+    def __init__(self, initial=20, min_size=5, max_size=100, step=5):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.limit = self.max_size
+        self.step = max(1, step)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.enabled = True
+        # 成功过的最大批量大小
+        self._good = 0
+        self._lock = threading.Lock()
+    
+    def success(self, size):
+        """一批请求成功，只有按当前大小发出的批次才会让大小增加"""
+        with self._lock:
+            self._good = max(self._good, size)
+            if size >= self.size:
+                self.size = min(self.limit, self.size + self.step)
+    
+    def failed(self):
+        """因限流或临时错误失败，大小减半"""
+        with self._lock:
+            self.size = max(self.min_size, self.size // 2)
+    
+    def rejected(self, size):
+        """
+        被接口拒绝
+        
+        Returns:
+            bool: 是否仍启用批量接口
+        """
+        with self._lock:
+            if size <= self.min_size:
+                self.enabled = False
+                return False
+            self.limit = min(self.limit, size - 1)
+            good = self._good if self._good < size else 0
+            self.size = max(self.min_size, min(self.limit, (good + size) // 2))
+            return True
+
+
+class HTTPTransport:
+    """
+    HTTP传输层
+    
+    默认使用带连接池的 requests.Session 复用 keep-alive 连接，
+    安装了 httpx 和 h2 时可启用 HTTP/2。
+    所有后端出错时统一抛出 requests.exceptions.RequestException。
+    """
+    
+    def __init__(self, headers=None, timeout=10, pool_size=4, pool_per_host=10,
+                 http2=False, keep_alive=True, verify=True):
+        """
+        Args:
+            headers: 默认请求头
+            timeout: 单次请求超时（秒）
+            pool_size: 连接池缓存的主机数
+            pool_per_host: 每个主机的最大连接数
+            http2: 是否启用HTTP/2（需要 httpx 和 h2）
+            keep_alive: 是否复用连接，False 时每次请求新建连接
+            verify: 是否校验TLS证书
+        """
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.verify = verify
+        self.http2 = False
+        self.session = None
+        self.client = None
+        
+        if not keep_alive:
+            return
+        
+        if http2:
+            if httpx is not None and h2 is not None:
+                self.http2 = True
+                self.client = httpx.Client(
+                    http2=True,
+                    headers=self.headers,
+                    timeout=timeout,
+                    verify=verify,
+                    limits=httpx.Limits(max_connections=pool_size * pool_per_host,
+                                        max_keepalive_connections=pool_per_host)
+                )
+                return
+            print("未安装 httpx[http2]，回退到 HTTP/1.1 连接池")
+        
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_per_host, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def get(self, url, params=None):
+        """
+        发送GET请求，HTTP状态码>=400时抛出异常
+        
+        Returns:
+            响应对象（支持 .json() 和 .status_code）
+        """
+        if self.client is not None:
+            try:
+                response = self.client.get(url, params=params)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPStatusError as e:
+                raise requests.exceptions.HTTPError(str(e), response=e.response) from e
+            except httpx.HTTPError as e:
+                raise requests.exceptions.ConnectionError(str(e)) from e
+        
+        if self.session is not None:
+            response = self.session.get(url, params=params, timeout=self.timeout, verify=self.verify)
+        else:
+            response = requests.get(url, params=params, headers=self.headers,
+                                    timeout=self.timeout, verify=self.verify)
+        response.raise_for_status()
+        return response
+    
+    def close(self):
+        """关闭连接池"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
 
 class BilibiliAPI:
-    def __init__(self):
+    def __init__(self, base_url=API_BASE, concurrency=8, requests_per_second=5, timeout=10,
+                 pool_size=4, pool_per_host=None, http2=False, keep_alive=True, resilience=None,
+                 batch=None):
+        """
+        Args:
+            base_url: API地址（测试时可指向本地桩服务器）
+            concurrency: 并发抓取的最大视频数
+            requests_per_second: 全局每秒请求数上限，<=0 表示不限速
+            timeout: 单次请求超时（秒）
+            pool_size: 连接池缓存的主机数
+            pool_per_host: 每个主机的最大连接数，默认与并发数相同
+            http2: 是否启用HTTP/2（需要 httpx 和 h2）
+            keep_alive: 是否复用连接
+            resilience: 重试与熔断参数，覆盖 DEFAULT_RESILIENCE_OPTIONS
+            batch: 批量抓取参数，覆盖 DEFAULT_BATCH_OPTIONS
+        """
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        
+        self.resilience = dict(DEFAULT_RESILIENCE_OPTIONS)
+        self.resilience.update(resilience or {})
+        self.rate_limiter = TokenBucket(requests_per_second, self.resilience['burst'])
+        self.breaker = CircuitBreaker(
+            window=self.resilience['breaker_window'],
+            min_requests=self.resilience['breaker_min_requests'],
+            error_rate=self.resilience['breaker_error_rate'],
+            cooldown=self.resilience['breaker_cooldown_seconds'],
+            max_cooldown=self.resilience['breaker_max_cooldown_seconds']
+        )
+        # 连续被限流的次数，决定全局暂停时间
+        self._throttle_streak = 0
+        
+        self.batch_options = dict(DEFAULT_BATCH_OPTIONS)
+        self.batch_options.update(batch or {})
+        self.batch_sizer = BatchSizer(
+            initial=self.batch_options['initial_size'],
+            min_size=self.batch_options['min_size'],
+            max_size=self.batch_options['max_size'],
+            step=self.batch_options['step']
+        )
+        self.batch_sizer.enabled = bool(self.batch_options['enabled'])
+        
+        # bv_id -> (aid, cid) 缓存，可由数据库预加载以跳过视频信息接口
+        self.video_meta = {}
+        self._changed_meta = set()
+        self._meta_lock = threading.Lock()
+        
+        # 按接口统计的请求次数，按分类统计的错误次数（含重试次数 retries）
+        self.request_counts = Counter()
+        self.error_counts = Counter()
+        self._stats_lock = threading.Lock()
+        
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://www.bilibili.com'
         }
+        
+        self.transport = HTTPTransport(
+            headers=self.headers,
+            timeout=timeout,
+            pool_size=pool_size,
+            pool_per_host=pool_per_host or self.concurrency,
+            http2=http2,
+            keep_alive=keep_alive
+        )
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """释放连接池"""
+        self.transport.close()
+    
+    def _get(self, path, params):
+        """发送GET请求（受全局速率限制）"""
+        self.rate_limiter.acquire()
+        with self._stats_lock:
+            self.request_counts[path] += 1
+        return self.transport.get(self.base_url + path, params)
+    
+    def _request(self, path, params):
+        """
+        发送GET请求并检查接口 code，失败时按错误分类处理：
+        不存在的视频直接失败；限流时暂停全局令牌桶（所有线程一起等待）后重试；
+        临时错误按带抖动的指数退避重试。每次结果都报告给熔断器。
+        
+        Returns:
+            dict: code 为 0 的响应
+            
+        Raises:
+            FetchError: 不存在的视频或重试次数用尽
+        """
+        options = self.resilience
+        attempt = 0
+        while True:
+            self.breaker.acquire()
+            try:
+                payload = self._get(path, params).json()
+                if not isinstance(payload, dict):
+                    raise ValueError('响应不是JSON对象')
+                code = payload.get('code', -1)
+                if code == 0:
+                    self.breaker.record(True)
+                    self.rate_limiter.success()
+                    self._throttle_streak = 0
+                    return payload
+                error = FetchError(classify_error(code=code), f"API错误: {payload.get('message', '未知错误')}",
+                                   code=code)
+            except requests.exceptions.HTTPError as e:
+                status = getattr(e.response, 'status_code', None)
+                error = FetchError(classify_error(status=status), f"请求失败: {e}", status=status)
+            except requests.exceptions.RequestException as e:
+                error = FetchError(TRANSIENT, f"请求失败: {e}")
+            except ValueError as e:
+                error = FetchError(TRANSIENT, f"解析响应失败: {e}")
+            
+            self.breaker.record(error.kind in FINAL_ERRORS)
+            with self._stats_lock:
+                self.error_counts[error.kind] += 1
+            if error.kind in FINAL_ERRORS or attempt >= options['max_retries']:
+                raise error
+            
+            base, cap = options['backoff_base_seconds'], options['backoff_max_seconds']
+            if error.kind == THROTTLED:
+                # 限流针对整个IP：暂停所有请求并降低速率，连续被限流时暂停时间加倍
+                with self._stats_lock:
+                    self._throttle_streak += 1
+                    streak = self._throttle_streak
+                delay = min(cap, base * 2 ** max(attempt, streak - 1))
+                if self.rate_limiter.throttle(delay * (0.5 + random.random() / 2)):
+                    print(f"⚠️  请求被限流，降速到 {self.rate_limiter.rate:.2f} 请求/秒")
+            else:
+                time.sleep(backoff_delay(attempt, base, cap))
+            
+            attempt += 1
+            with self._stats_lock:
+                self.error_counts['retries'] += 1
+    
+    def get_request_counts(self, reset=False):
+        """
+        获取各接口的请求次数
+        
+        Args:
+            reset: 是否在读取后清零（用于按轮统计）
+            
+        Returns:
+            dict: {接口路径: 请求次数}
+        """
+        with self._stats_lock:
+            counts = dict(self.request_counts)
+            if reset:
+                self.request_counts.clear()
+        return counts
+    
+    def get_error_counts(self, reset=False):
+        """
+        获取按分类统计的错误次数
+        
+        Args:
+            reset: 是否在读取后清零
+            
+        Returns:
+            dict: {THROTTLED/NOT_FOUND/INVALID/TRANSIENT/'retries': 次数}
+        """
+        with self._stats_lock:
+            counts = dict(self.error_counts)
+            if reset:
+                self.error_counts.clear()
+        return counts
+    
+    def load_video_meta(self, meta):
+        """预加载 bv_id -> (aid, cid) 缓存"""
+        with self._meta_lock:
+            self.video_meta.update(meta)
+    
+    def update_video_meta(self, bv_id, aid, cid):
+        """更新缓存，aid/cid 变化时标记为待持久化"""
+        with self._meta_lock:
+            if self.video_meta.get(bv_id) != (aid, cid):
+                self.video_meta[bv_id] = (aid, cid)
+                self._changed_meta.add(bv_id)
+    
+    def invalidate_video_meta(self, bv_id):
+        """使某个视频的 aid/cid 缓存失效"""
+        with self._meta_lock:
+            self.video_meta.pop(bv_id, None)
+    
+    def pop_changed_video_meta(self):
+        """
+        取出自上次调用以来发生变化的 aid/cid
+        
+        Returns:
+            dict: {bv_id: (aid, cid)}
+        """
+        with self._meta_lock:
+            changed = {bv: self.video_meta[bv] for bv in self._changed_meta if bv in self.video_meta}
+            self._changed_meta.clear()
+        return changed
+    
+    def iter_videos_info(self, bv_ids):
+        """
+        并发获取多个视频的信息
+        
+        启用批量接口时，已缓存 aid 的视频按批抓取，其余视频逐个抓取（同时得到 aid，下次即可批量）。
+        
+        Args:
+            bv_ids: 视频BV号列表
+            
+        Yields:
+            tuple: (bv_id, 视频数据字典或None, 失败时的 FetchError 或None)，按完成顺序返回
+        """
+        if not bv_ids:
+            return
+        
+        if self.batch_sizer.enabled:
+            yield from self._iter_batched(bv_ids)
+            return
+        
+        workers = min(self.concurrency, len(bv_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.try_video_info, bv_id): bv_id for bv_id in bv_ids}
+            for future in as_completed(futures):
+                yield (futures[future], *future.result())
+    
+    def _iter_batched(self, bv_ids):
+        """
+        批量抓取：每个任务返回 (结果列表, 需要重新分批的BV号, 需要逐个抓取的BV号, 是否还需补充在线人数)
+        
+        批量请求的大小在每批发出时按 batch_sizer 的当前值决定，同时进行的批量请求不超过并发数的一半，
+        其余线程用于逐个抓取和请求在线人数。
+        """
+        with self._meta_lock:
+            batched = deque(bv_id for bv_id in bv_ids if bv_id in self.video_meta)
+        known = set(batched)
+        
+        workers = min(self.concurrency, len(bv_ids))
+        max_batches = max(1, workers // 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._fetch_single, bv_id) for bv_id in bv_ids if bv_id not in known}
+            in_flight = set()
+            
+            while futures or batched:
+                # 批量接口被停用后，剩余的视频逐个抓取
+                while batched and not self.batch_sizer.enabled:
+                    futures.add(executor.submit(self._fetch_single, batched.popleft()))
+                while batched and len(in_flight) < max_batches:
+                    chunk = [batched.popleft() for _ in range(min(self.batch_sizer.size, len(batched)))]
+                    future = executor.submit(self._fetch_batch, chunk)
+                    in_flight.add(future)
+                    futures.add(future)
+                if not futures:
+                    continue
+                
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    futures.discard(future)
+                    in_flight.discard(future)
+                    results, retry, singles, online = future.result()
+                    batched.extendleft(reversed(retry))
+                    for bv_id in singles:
+                        futures.add(executor.submit(self._fetch_single, bv_id))
+                    for bv_id, video_info, error in results:
+                        if online and video_info is not None:
+                            futures.add(executor.submit(self._add_online, bv_id, video_info))
+                        else:
+                            yield bv_id, video_info, error
+    
+    def _fetch_single(self, bv_id):
+        return [(bv_id, *self.try_video_info(bv_id))], [], [], False
+    
+    def _add_online(self, bv_id, video_info):
+        video_info['online'] = self.get_online_count(bv_id)
+        return [(bv_id, video_info, None)], [], [], False
+    
+    def _fetch_batch(self, bv_ids):
+        """
+        通过批量接口获取一批视频的统计数据
+        
+        响应中缺少的视频（可能已删除或不可见）交给逐个抓取确认；
+        批量请求被拒绝时这批视频重新分批，限流或临时错误重试用尽时整批失败。
+        """
+        with self._meta_lock:
+            by_aid = {self.video_meta[bv_id][0]: bv_id for bv_id in bv_ids if bv_id in self.video_meta}
+        singles = [bv_id for bv_id in bv_ids if bv_id not in by_aid.values()]
+        if not by_aid:
+            return [], [], singles, False
+        
+        resources = ','.join(f'{aid}:2' for aid in by_aid)
+        try:
+            data = self._request(BATCH_PATH, {'resources': resources})
+        except FetchError as e:
+            if e.kind in FINAL_ERRORS or e.status == 414:
+                if not self.batch_sizer.rejected(len(by_aid)):
+                    print(f"⚠️  批量接口不可用（{e}），改为逐个抓取")
+                return [], list(by_aid.values()), singles, False
+            self.batch_sizer.failed()
+            return [(bv_id, None, e) for bv_id in by_aid.values()], [], singles, False
+        
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        results = []
+        found = set()
+        try:
+            for item in data.get('data') or []:
+                bv_id = by_aid.get(item.get('id'))
+                if bv_id is None or bv_id in found:
+                    continue
+                stat = item['cnt_info']
+                results.append((bv_id, {
+                    'bv_id': bv_id,
+                    'title': item['title'],
+                    'view': stat.get('play', 0),
+                    'like': stat.get('thumb_up', 0),
+                    'coin': stat.get('coin', 0),
+                    'favorite': stat.get('collect', 0),
+                    'share': stat.get('share', 0),
+                    'online': 0,
+                    'timestamp': timestamp
+                }, None))
+                found.add(bv_id)
+        except (KeyError, TypeError, AttributeError) as e:
+            self.batch_sizer.failed()
+            error = FetchError(TRANSIENT, f"解析批量数据失败: {e}")
+            return [(bv_id, None, error) for bv_id in by_aid.values()], [], singles, False
+        
+        self.batch_sizer.success(len(by_aid))
+        singles += [bv_id for bv_id in by_aid.values() if bv_id not in found]
+        return results, [], singles, self.batch_options['fetch_online']
+    
+    def try_video_info(self, bv_id):
+        """
+        获取视频信息，不抛出异常
+        
+        Returns:
+            tuple: (视频数据字典或None, FetchError或None)
+        """
+        try:
+            return self.fetch_video_info(bv_id), None
+        except FetchError as e:
+            return None, e
     
     def get_video_info(self, bv_id):
         """
@@ -22,24 +808,36 @@ class BilibiliAPI:
             bv_id: 视频BV号
             
         Returns:
-            dict: 包含视频各项数据的字典
+            dict: 包含视频各项数据的字典，失败时返回None
         """
-        try:
-            # 获取视频基础信息
-            url = f'https://api.bilibili.com/x/web-interface/view'
-            params = {'bvid': bv_id}
-            
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
+        video_info, error = self.try_video_info(bv_id)
+        if error is not None:
+            print(error)
+        return video_info
+    
+    def fetch_video_info(self, bv_id):
+        """
+        获取视频详细信息
+        
+        Args:
+            bv_id: 视频BV号
             
-            if data['code'] != 0:
-                print(f"API错误: {data.get('message', '未知错误')}")
-                return None
+        Returns:
+            dict: 包含视频各项数据的字典
             
+        Raises:
+            FetchError: 请求失败，kind 为错误分类
+        """
+        # 获取视频基础信息
+        data = self._request('/x/web-interface/view', {'bvid': bv_id})
+        
+        try:
             video_data = data['data']
             stat = video_data['stat']
+            aid = video_data.get('aid')
+            cid = video_data.get('cid')
+            if aid is not None and cid is not None:
+                self.update_video_meta(bv_id, aid, cid)
             
             result = {
                 'bv_id': bv_id,
@@ -51,62 +849,97 @@ class BilibiliAPI:
                 'share': stat.get('share', 0),      # 转发
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
-            
-            # 尝试获取实时观看人数（需要从播放页面获取）
-            try:
-                online = self.get_online_count(bv_id)
-                result['online'] = online
-            except Exception as e:
-                print(f"获取实时观看人数失败: {e}")
-                result['online'] = 0
-            
-            return result
-            
-        except requests.exceptions.RequestException as e:
-            print(f"请求失败: {e}")
-            return None
+        except (KeyError, TypeError, AttributeError) as e:
+            raise FetchError(TRANSIENT, f"解析数据失败: {e}") from e
+        
+        # 尝试获取实时观看人数（复用本次响应中的aid/cid，避免重复请求视频信息接口）
+        try:
+            online = self.get_online_count(bv_id, aid, cid)
+            result['online'] = online
         except Exception as e:
-            print(f"解析数据失败: {e}")
-            return None
+            print(f"获取实时观看人数失败: {e}")
+            result['online'] = 0
+        
+        return result
     
-    def get_online_count(self, bv_id):
+    def resolve_video_meta(self, bv_id):
+        """
+        请求视频信息接口获取 aid/cid 并写入缓存
+        
+        Args:
+            bv_id: 视频BV号
+            
+        Returns:
+            tuple: (aid, cid)，失败时返回None
+        """
+        try:
+            data = self._request('/x/web-interface/view', {'bvid': bv_id})
+        except FetchError as e:
+            if e.kind in FINAL_ERRORS:
+                return None
+            raise
+        
+        aid = data['data']['aid']
+        cid = data['data']['cid']
+        self.update_video_meta(bv_id, aid, cid)
+        return aid, cid
+    
+    def _fetch_online_total(self, bv_id, aid, cid):
+        """请求在线人数接口，失败时返回None"""
+        online_params = {
+            'aid': aid,
+            'cid': cid,
+            'bvid': bv_id
+        }
+        
+        try:
+            online_data = self._request('/x/player/online/total', online_params)
+        except FetchError as e:
+            if e.kind in FINAL_ERRORS:
+                return None
+            raise
+        
+        if 'data' in online_data:
+            return online_data['data'].get('total', 0)
+        
+        return None
+    
+    def get_online_count(self, bv_id, aid=None, cid=None):
         """
         获取实时观看人数
         
         Args:
             bv_id: 视频BV号
+            aid: 视频aid，未提供时使用缓存
+            cid: 视频cid，未提供时使用缓存
             
         Returns:
             int: 实时观看人数
         """
         try:
-            # 获取aid
-            url = f'https://api.bilibili.com/x/web-interface/view'
-            params = {'bvid': bv_id}
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
-            data = response.json()
-            
-            if data['code'] != 0:
-                return 0
-                
-            aid = data['data']['aid']
-            cid = data['data']['cid']
-            
-            # 获取在线人数
-            online_url = 'https://api.bilibili.com/x/player/online/total'
-            online_params = {
-                'aid': aid,
-                'cid': cid,
-                'bvid': bv_id
-            }
+            from_cache = False
             
-            online_response = requests.get(online_url, params=online_params, headers=self.headers, timeout=10)
-            online_data = online_response.json()
+            if aid is None or cid is None:
+                meta = self.video_meta.get(bv_id)
+                from_cache = meta is not None
+                if not from_cache:
+                    # 缓存未命中，才需要请求视频信息接口
+                    meta = self.resolve_video_meta(bv_id)
+                    if not meta:
+                        return 0
+                aid, cid = meta
             
-            if online_data['code'] == 0 and 'data' in online_data:
-                return online_data['data'].get('total', 0)
+            online = self._fetch_online_total(bv_id, aid, cid)
             
-            return 0
+            if online is None and from_cache:
+                # 缓存的cid可能已过期（如视频更换了分P），重新获取后再试一次
+                self.invalidate_video_meta(bv_id)
+                meta = self.resolve_video_meta(bv_id)
+                if meta:
+                    online = self._fetch_online_total(bv_id, *meta)
+            
+            # 人数较多时接口返回 '1000+' 这样的字符串
+            return to_count(online)
             
         except Exception as e:
             print(f"获取在线人数异常: {e}")
@@ -122,21 +955,20 @@ if __name__ == '__main__':
     
     args = parser.parse_args()
     
-    api = BilibiliAPI()
-    
-    # 如果提供了BV号，抓取该视频
-    if args.bvid:
-        bv_id = args.bvid
-        print(f"正在抓取视频: {bv_id}")
-        info = api.get_video_info(bv_id)
-        if info:
-            print(json.dumps(info, indent=2, ensure_ascii=False))
+    with BilibiliAPI() as api:
+        # 如果提供了BV号，抓取该视频
+        if args.bvid:
+            bv_id = args.bvid
+            print(f"正在抓取视频: {bv_id}")
+            info = api.get_video_info(bv_id)
+            if info:
+                print(json.dumps(info, indent=2, ensure_ascii=False))
+            else:
+                print("获取视频信息失败")
         else:
-            print("获取视频信息失败")
-    else:
-        # 没有参数时使用默认测试
-        print("用法: python bilibili_api.py -bv BV1JHLUz4EUy")
-        print("\n使用默认测试BV号...")
-        info = api.get_video_info('BV1JHLUz4EUy')
-        if info:
-            print(json.dumps(info, indent=2, ensure_ascii=False))
+            # 没有参数时使用默认测试
+            print("用法: python bilibili_api.py -bv BV1JHLUz4EUy")
+            print("\n使用默认测试BV号...")
+            info = api.get_video_info('BV1JHLUz4EUy')
+            if info:
+                print(json.dumps(info, indent=2, ensure_ascii=False))
@@ -0,0 +1,117 @@
+"""
+响应缓存
+按请求路径缓存接口的 JSON 响应。每个条目记录生成时的数据版本（视频目录中的
+采样数和采样时间，由数据库触发器在写入时维护），版本变化即视为失效，
+因此监控进程写入新数据后缓存立即失效，多进程部署时各进程也不会读到旧数据。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+# 每个条目除响应内容外的大致内存开销（字节）
+ENTRY_OVERHEAD = 200
+
+
+class ResponseCache:
+    """
+    按内存大小限制的 LRU 缓存，条目超过 ttl 秒未更新也会失效
+    """
+    
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=600):
+        """
+        Args:
+            max_bytes: 缓存内容的总大小上限（字节），0 表示关闭缓存
+            ttl: 条目最长保留时间（秒）
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+    
+    def get(self, key, version):
+        """
+        读取缓存
+        
+        Args:
+            key: 缓存键
+            version: 当前数据版本，与条目记录的版本不同时视为失效
+        
+        Returns:
+            缓存的值，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            entry_version, value, _, created = entry
+            if entry_version != version:
+                self.stale += 1
+            elif time.monotonic() - created > self.ttl:
+                self.expired += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            
+            self._remove(key)
+            self.misses += 1
+            return None
+    
+    def put(self, key, version, value, size):
+        """
+        写入缓存，超出大小上限时淘汰最久未使用的条目
+        
+        Args:
+            key: 缓存键
+            version: 生成该值时的数据版本
+            value: 缓存的值
+            size: 值占用的字节数
+        """
+        size += len(key) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (version, value, size, time.monotonic())
+            self.size += size
+            
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, key):
+        _, _, size, _ = self._entries.pop(key)
+        self.size -= size
+    
+    def stats(self):
+        """
+        获取缓存统计
+        
+        Returns:
+            dict: 命中、未命中（其中因数据变化 stale、超时 expired 失效的次数）、
+                  淘汰次数、条目数和占用大小
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stale': self.stale,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self.size,
+                'max_bytes': self.max_bytes
+            }
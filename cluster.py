@@ -0,0 +1,699 @@
+"""
+多节点分片抓取
+协调进程用一致性哈希把监控列表分给多个抓取进程（可以在不同主机上），监控列表变化或
+抓取进程增减时只有少量视频换到别的进程。抓取进程按自适应调度抓取自己的分片，把结果
+攒批发回协调进程，由协调进程统一批量写入数据库。抓取进程断开或心跳超时后，它的视频
+重新分配给其余进程。
+
+进程之间通过 TCP 传输按行分隔的 JSON 消息，接收方只做 JSON 解析。建立连接时双方用
+config.json 中的 authkey 做 HMAC 挑战-应答互相验证，口令必须由部署者设置；
+消息本身不加密，跨主机部署时只应在可信网络中开放端口。
+
+用法:
+  python cluster.py coordinator                              # 在存放 data.db 的主机上运行
+  python cluster.py worker --coordinator 10.0.0.1:7000       # 每个抓取节点运行一个或多个
+"""
+import argparse
+import bisect
+import hashlib
+import hmac
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+from bilibili_api import FINAL_ERRORS
+from database import Database, BatchWriter, to_epoch
+from detector import AnomalyDetector
+from migrate import LegacyMigrator
+from monitor import create_api
+from retention import RetentionPolicy
+from scheduler import AdaptiveScheduler
+from watchlist import Watchlist
+
+
+# 默认集群参数，可通过 config.json 的 "cluster" 字段覆盖
+DEFAULT_CLUSTER_OPTIONS = {
+    'host': '127.0.0.1',                # 协调进程监听地址，抓取进程在其他主机上时改为 0.0.0.0
+    'port': 7000,                       # 协调进程监听端口
+    'authkey': None,                    # 连接口令，必须设置（协调进程和抓取进程相同）
+    'heartbeat_seconds': 5,             # 抓取进程发送心跳的间隔
+    'worker_timeout_seconds': 20,       # 超过该时间没有收到消息的抓取进程视为已失效
+    'replicas': 100,                    # 每个抓取进程在哈希环上的虚拟节点数
+    'send_batch_size': 100,             # 抓取进程攒够多少条数据发送一次
+    'send_interval_seconds': 2,         # 抓取进程最长多久发送一次数据
+    'report_seconds': 60                # 协调进程输出分片统计的间隔
+}
+
+# 以项目名作为口令很容易被猜到，不能使用
+EXAMPLE_AUTHKEY = 'bilibili-monitor'
+
+# 单条消息的最大字节数（下发分片时包含整个分片的最新数据）
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# 握手的超时（秒）
+HANDSHAKE_TIMEOUT_SECONDS = 10
+
+
+def load_cluster_options(config):
+    options = dict(DEFAULT_CLUSTER_OPTIONS)
+    options.update(config.get('cluster') or {})
+    return options
+
+
+def load_authkey(options):
+    """
+    读取连接口令
+    
+    Returns:
+        bytes: 口令
+    
+    Raises:
+        ValueError: 没有设置口令或使用了容易猜到的口令
+    """
+    authkey = options.get('authkey')
+    if not authkey:
+        raise ValueError('请在 config.json 的 cluster.authkey 中设置连接口令（协调进程和抓取进程相同），'
+                         '例如 python -c "import secrets; print(secrets.token_hex(16))" 生成的随机字符串')
+    if authkey == EXAMPLE_AUTHKEY:
+        raise ValueError(f'cluster.authkey 不能使用容易猜到的口令 {EXAMPLE_AUTHKEY!r}，请改为随机字符串')
+    return str(authkey).encode('utf-8')
+
+
+def parse_address(value, default_port=DEFAULT_CLUSTER_OPTIONS['port']):
+    """把 host:port 解析为 (host, port)"""
+    host, _, port = value.rpartition(':')
+    if not host:
+        return value, default_port
+    return host, int(port)
+
+
+def now_str():
+    return datetime.now().strftime('%H:%M:%S')
+
+
+class HashRing:
+    """
+    一致性哈希环
+    
+    每个节点在环上有 replicas 个虚拟节点，视频归属于顺时针方向的第一个虚拟节点。
+    增加或移除一个节点时，只有原本属于该节点（或将属于该节点）的约 1/N 视频换节点。
+    """
+    
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.nodes = set()
+        self._hashes = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+    
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+    
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            h = self._hash(f'{node}#{i}')
+            idx = bisect.bisect(self._hashes, h)
+            self._hashes.insert(idx, h)
+            self._owners.insert(idx, node)
+    
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(h, owner) for h, owner in zip(self._hashes, self._owners) if owner != node]
+        self._hashes = [h for h, _ in kept]
+        self._owners = [owner for _, owner in kept]
+    
+    def node_for(self, key):
+        """返回 key 所属的节点，环为空时返回 None"""
+        if not self._hashes:
+            return None
+        idx = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[idx]
+    
+    def assign(self, keys):
+        """
+        把一组 key 分配到各节点
+        
+        Returns:
+            dict: {节点: [key, ...]}，没有分到 key 的节点对应空列表
+        """
+        shards = {node: [] for node in self.nodes}
+        for key in keys:
+            node = self.node_for(key)
+            if node is not None:
+                shards[node].append(key)
+        return shards
+
+
+def to_meta(meta):
+    """JSON 消息中的 {bv_id: [aid, cid]} 转回 {bv_id: (aid, cid)}"""
+    return {bv_id: tuple(value) for bv_id, value in meta.items()}
+
+
+class AuthenticationError(Exception):
+    """连接口令验证失败"""
+
+
+class Channel:
+    """
+    协调进程与抓取进程之间的消息通道
+    
+    每条消息是一行 UTF-8 JSON（元组按列表传输），接收方只做 JSON 解析，
+    不会像 pickle 那样执行对端构造的对象。建立连接时双方各发一个随机挑战，
+    对方用 authkey 计算 HMAC 应答，口令本身不在网络上传输。
+    """
+    
+    def __init__(self, sock):
+        self.sock = sock
+        self._file = sock.makefile('rb')
+    
+    @classmethod
+    def connect(cls, address, authkey):
+        """连接协调进程并完成握手"""
+        sock = socket.create_connection(address, timeout=HANDSHAKE_TIMEOUT_SECONDS)
+        return cls._handshake(sock, authkey, server=False)
+    
+    @classmethod
+    def accept(cls, sock, authkey):
+        """对已接受的连接完成握手"""
+        sock.settimeout(HANDSHAKE_TIMEOUT_SECONDS)
+        return cls._handshake(sock, authkey, server=True)
+    
+    @classmethod
+    def _handshake(cls, sock, authkey, server):
+        channel = cls(sock)
+        try:
+            # 服务端先验证对方，未通过验证的客户端拿不到服务端的应答
+            if server:
+                channel._deliver_challenge(authkey)
+                channel._answer_challenge(authkey)
+            else:
+                channel._answer_challenge(authkey)
+                channel._deliver_challenge(authkey)
+        except BaseException:
+            channel.close()
+            raise
+        sock.settimeout(None)
+        return channel
+    
+    def _deliver_challenge(self, authkey):
+        challenge = os.urandom(32).hex()
+        self.send({'challenge': challenge})
+        reply = self.recv()
+        expected = hmac.new(authkey, challenge.encode('ascii'), 'sha256').hexdigest()
+        digest = reply.get('digest') if isinstance(reply, dict) else None
+        if not isinstance(digest, str) or not hmac.compare_digest(digest.encode('utf-8'), expected.encode('ascii')):
+            self.send({'welcome': False})
+            raise AuthenticationError('对方的口令不正确')
+        self.send({'welcome': True})
+    
+    def _answer_challenge(self, authkey):
+        message = self.recv()
+        challenge = message.get('challenge') if isinstance(message, dict) else None
+        if not isinstance(challenge, str):
+            raise AuthenticationError('握手消息格式错误')
+        self.send({'digest': hmac.new(authkey, challenge.encode('utf-8'), 'sha256').hexdigest()})
+        reply = self.recv()
+        if not isinstance(reply, dict) or reply.get('welcome') is not True:
+            raise AuthenticationError('口令不正确，被对方拒绝')
+    
+    def send(self, message):
+        data = json.dumps(message, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self.sock.sendall(data.encode('utf-8'))
+    
+    def recv(self):
+        """
+        接收一条消息
+        
+        Raises:
+            EOFError: 连接已关闭
+            ValueError: 消息过长或不是合法的 JSON
+        """
+        line = self._file.readline(MAX_MESSAGE_BYTES + 1)
+        if not line:
+            raise EOFError('连接已关闭')
+        if not line.endswith(b'\n'):
+            raise ValueError('消息过长或不完整')
+        return json.loads(line)
+    
+    def close(self):
+        # 先 shutdown，使其他线程中阻塞的 recv 立即返回
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._file.close()
+
+
+class WorkerHandle:
+    """协调进程中一个已连接的抓取进程"""
+    
+    def __init__(self, worker_id, conn, info):
+        self.worker_id = worker_id
+        self.conn = conn
+        self.info = info
+        self.shard = None
+        self.last_seen = time.monotonic()
+        self.samples = 0
+        self.stats = {}
+        self._send_lock = threading.Lock()
+    
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+
+class Coordinator:
+    """
+    协调进程：维护监控列表和哈希环，向抓取进程下发分片，接收抓取结果并批量写入数据库
+    """
+    
+    def __init__(self, config_file='config.json', list_file='monitor.list', db_path='data.db'):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.options = load_cluster_options(self.config)
+        self.authkey = load_authkey(self.options)
+        self.db = Database(db_path, self.config.get('database'))
+        self.migrator = LegacyMigrator(self.db)
+        self.watchlist = Watchlist(self.db, list_file)
+        self.retention = RetentionPolicy.from_config(self.db, self.config)
+        self.detector = AnomalyDetector.from_config(self.db, self.config)
+        self.ring = HashRing(replicas=self.options['replicas'])
+        self.workers = {}
+        self.bv_list = []
+        self.address = None
+        self.failovers = 0
+        self.moved = 0
+        
+        # 各视频的最新数据和 aid/cid，分配给新的抓取进程时一并下发，使其可以继续计算增长速度
+        self.latest = {row['bv_id']: {'ts': row['ts'], 'view': row['view'], 'like': row['like']}
+                       for row in self.db.get_videos_info()}
+        self.meta = self.db.get_video_meta()
+        
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._stop = threading.Event()
+        self.writer = None
+        self.listener = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def start(self):
+        """开始监听抓取进程的连接"""
+        self.writer = BatchWriter(
+            self.db,
+            batch_size=self.config.get('write_batch_size', 1000),
+            flush_interval=self.config.get('write_flush_seconds', 5),
+            on_saved=self.detector.observe if self.detector.enabled else None
+        )
+        self.listener = socket.create_server((self.options['host'], self.options['port']), backlog=128)
+        self.address = self.listener.getsockname()[:2]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self.retention.start()
+        self.migrator.start()
+        print(f"协调进程已启动，监听 {self.address[0]}:{self.address[1]}")
+        print(self.retention.describe())
+        print(self.detector.describe())
+    
+    def close(self):
+        """通知抓取进程退出，写入剩余数据"""
+        self._stop.set()
+        with self._lock:
+            workers = list(self.workers.values())
+            self.workers.clear()
+        for worker in workers:
+            try:
+                worker.send(('stop',))
+            except (OSError, ValueError):
+                pass
+            worker.conn.close()
+        if self.listener is not None:
+            # shutdown 使阻塞的 accept 返回
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+            self.listener = None
+        if self.writer is not None:
+            saved = self.writer.close()
+            self.writer = None
+            print(f"共保存 {saved} 条数据")
+        self.retention.close()
+        self.migrator.close()
+        self.detector.close()
+        self.db.close()
+    
+    def run(self):
+        """主循环：同步监控列表、检查心跳、按需重新分配分片"""
+        self.start()
+        print("按 Ctrl+C 停止\n")
+        next_report = time.monotonic() + self.options['report_seconds']
+        try:
+            while not self._stop.is_set():
+                # 监控列表被修改后重新分配（没有变化时只查询版本号）
+                if self.watchlist.refresh():
+                    with self._lock:
+                        if self.watchlist.bv_ids != self.bv_list:
+                            print(f"[{now_str()}] 监控列表更新，共 {len(self.watchlist.bv_ids)} 个视频")
+                            self.bv_list = self.watchlist.bv_ids
+                            self._dirty = True
+                
+                self.check_heartbeats()
+                self.rebalance()
+                
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + self.options['report_seconds']
+                    print(f"[{now_str()}] {self.describe()}")
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print("\n\n协调进程已停止")
+    
+    def _accept_loop(self):
+        listener = self.listener
+        while not self._stop.is_set():
+            try:
+                sock, address = listener.accept()
+            except OSError:
+                if self._stop.is_set() or self.listener is None:
+                    break
+                continue
+            threading.Thread(target=self._serve_worker, args=(sock, address), daemon=True).start()
+    
+    def _serve_worker(self, sock, address):
+        """验证口令后接收一个抓取进程的消息，直到连接断开"""
+        try:
+            conn = Channel.accept(sock, self.authkey)
+        except (AuthenticationError, EOFError, OSError, ValueError) as e:
+            sock.close()
+            print(f"[{now_str()}] 拒绝来自 {address[0]} 的连接: {e}")
+            return
+        
+        try:
+            kind, worker_id, info = conn.recv()
+        except (EOFError, OSError, ValueError, TypeError):
+            conn.close()
+            return
+        if kind != 'hello' or not isinstance(worker_id, str) or not isinstance(info, dict):
+            conn.close()
+            return
+        
+        worker = WorkerHandle(worker_id, conn, info)
+        with self._lock:
+            old = self.workers.get(worker_id)
+            if old is not None:
+                # 同名抓取进程重连，替换旧连接
+                old.conn.close()
+            self.workers[worker_id] = worker
+            self.ring.add(worker_id)
+            self._dirty = True
+        print(f"[{now_str()}] 抓取进程 {worker_id} 已加入（{info.get('host')} pid {info.get('pid')}）")
+        
+        # 格式不对的消息（字段缺失、类型错误）与连接断开同样处理
+        try:
+            while not self._stop.is_set():
+                message = conn.recv()
+                worker.last_seen = time.monotonic()
+                if message[0] == 'samples':
+                    self.ingest(worker, message[1], to_meta(message[2]))
+                elif message[0] == 'heartbeat':
+                    worker.stats = message[1]
+        except (EOFError, OSError, ValueError, TypeError, KeyError, IndexError, AttributeError):
+            self.drop_worker(worker, '连接断开')
+    
+    def ingest(self, worker, rows, meta):
+        """提交抓取进程发回的数据和新增的 aid/cid"""
+        for row in rows:
+            self.writer.put(row)
+        worker.samples += len(rows)
+        with self._lock:
+            for row in rows:
+                self.latest[row['bv_id']] = {
+                    'ts': to_epoch(row['timestamp']),
+                    'view': row.get('view', 0),
+                    'like': row.get('like', 0)
+                }
+            self.meta.update(meta)
+        if meta:
+            self.db.save_video_meta(meta)
+    
+    def drop_worker(self, worker, reason):
+        """移除失效的抓取进程，它的视频在下次 rebalance 时分给其余进程"""
+        with self._lock:
+            if self.workers.get(worker.worker_id) is not worker:
+                return
+            del self.workers[worker.worker_id]
+            self.ring.remove(worker.worker_id)
+            self._dirty = True
+            if not self._stop.is_set():
+                self.failovers += 1
+        worker.conn.close()
+        shard = len(worker.shard or ())
+        print(f"[{now_str()}] 抓取进程 {worker.worker_id} 已移除（{reason}），{shard} 个视频将重新分配")
+    
+    def check_heartbeats(self):
+        timeout = self.options['worker_timeout_seconds']
+        now = time.monotonic()
+        with self._lock:
+            expired = [w for w in self.workers.values() if now - w.last_seen > timeout]
+        for worker in expired:
+            self.drop_worker(worker, f'{timeout} 秒没有心跳')
+    
+    def rebalance(self):
+        """按哈希环重新计算分片，只向分片有变化的抓取进程下发"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            shards = self.ring.assign(self.bv_list)
+            messages = []
+            for worker_id, shard in shards.items():
+                worker = self.workers[worker_id]
+                if worker.shard is not None and set(shard) == set(worker.shard):
+                    continue
+                added = set(shard) - set(worker.shard or ())
+                self.moved += len(added) if worker.shard is not None else 0
+                worker.shard = shard
+                latest = {bv_id: self.latest[bv_id] for bv_id in added if bv_id in self.latest}
+                meta = {bv_id: self.meta[bv_id] for bv_id in added if bv_id in self.meta}
+                messages.append((worker, ('assign', shard, latest, meta)))
+        
+        for worker, message in messages:
+            try:
+                worker.send(message)
+            except (OSError, ValueError):
+                self.drop_worker(worker, '下发分片失败')
+        if messages:
+            sizes = ', '.join(f"{worker.worker_id}={len(message[1])}" for worker, message in messages)
+            print(f"[{now_str()}] 分片已更新: {sizes}")
+    
+    def describe(self):
+        with self._lock:
+            workers = sorted(self.workers.values(), key=lambda w: w.worker_id)
+        parts = [f"{w.worker_id}: {len(w.shard or ())} 个视频, {w.samples} 条数据" for w in workers]
+        return (f"{len(workers)} 个抓取进程，{len(self.bv_list)} 个视频，"
+                f"失效转移 {self.failovers} 次，换节点 {self.moved} 个视频 | " + ('; '.join(parts) or '无'))
+
+
+class Worker:
+    """
+    抓取进程：连接协调进程，按自适应调度抓取分配到的视频，把结果攒批发回
+    
+    与协调进程断开后保留调度状态和未发送的数据，重连成功后继续。
+    """
+    
+    def __init__(self, address, worker_id=None, config_file='config.json', requests_per_second=None):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        if requests_per_second is not None:
+            self.config['requests_per_second'] = requests_per_second
+        self.options = load_cluster_options(self.config)
+        self.authkey = load_authkey(self.options)
+        self.address = address
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.api = create_api(self.config)
+        self.scheduler = AdaptiveScheduler.from_config(self.config)
+        self.conn = None
+        self.pending = []
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        self._stop.set()
+        if self.conn is not None:
+            self.conn.close()
+        self.api.close()
+    
+    def connect(self):
+        """连接协调进程，失败时按指数退避重试，直到成功或被停止"""
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                self.conn = Channel.connect(self.address, self.authkey)
+                self.send(('hello', self.worker_id, {'host': socket.gethostname(), 'pid': os.getpid()}))
+                self._connected.set()
+                print(f"[{now_str()}] {self.worker_id} 已连接协调进程 {self.address[0]}:{self.address[1]}")
+                threading.Thread(target=self._recv_loop, args=(self.conn,), daemon=True).start()
+                threading.Thread(target=self._heartbeat_loop, args=(self.conn,), daemon=True).start()
+                return True
+            except (AuthenticationError, OSError, EOFError, ValueError) as e:
+                print(f"[{now_str()}] 连接协调进程失败: {e}，{delay} 秒后重试")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30)
+        return False
+    
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+    
+    def _disconnected(self, conn):
+        if conn is self.conn and self._connected.is_set():
+            self._connected.clear()
+            if not self._stop.is_set():
+                print(f"[{now_str()}] 与协调进程断开")
+    
+    def _recv_loop(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'assign':
+                    _, shard, latest, meta = message
+                    self.api.load_video_meta(to_meta(meta))
+                    added, removed = self.scheduler.sync(shard, latest)
+                    print(f"[{now_str()}] 分到 {len(shard)} 个视频（新增 {added}，移除 {removed}）")
+                elif message[0] == 'stop':
+                    self._stop.set()
+                    break
+        except (EOFError, OSError, ValueError, TypeError, KeyError, IndexError, AttributeError):
+            pass
+        self._disconnected(conn)
+    
+    def _heartbeat_loop(self, conn):
+        """单独的线程发送心跳，抓取一批视频耗时较长时也不会被判定为失效"""
+        while conn is self.conn and self._connected.is_set():
+            try:
+                self.send(('heartbeat', self.scheduler.stats(top=0)))
+            except (OSError, ValueError):
+                self._disconnected(conn)
+                break
+            self._stop.wait(self.options['heartbeat_seconds'])
+    
+    def flush(self):
+        """把攒下的数据和新增的 aid/cid 发给协调进程，发送失败时保留到下次"""
+        with self._pending_lock:
+            rows, self.pending = self.pending, []
+        meta = self.api.pop_changed_video_meta()
+        if not rows and not meta:
+            return
+        try:
+            self.send(('samples', rows, meta))
+        except (OSError, ValueError):
+            with self._pending_lock:
+                self.pending[:0] = rows
+            self.api.load_video_meta(meta)
+            self._disconnected(self.conn)
+    
+    def run(self):
+        """主循环：抓取到期的视频，定期发送数据"""
+        send_interval = self.options['send_interval_seconds']
+        batch_size = self.options['send_batch_size']
+        next_send = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if not self._connected.is_set() and not self.connect():
+                    break
+                
+                paused = self.api.breaker.remaining()
+                due = [] if paused > 0 else self.scheduler.pop_due(limit=self.api.concurrency * 2)
+                if due:
+                    self.fetch_due(due)
+                else:
+                    next_due = self.scheduler.next_due()
+                    wait = 1 if next_due is None else next_due - time.time()
+                    self._stop.wait(min(max(wait, 0.05), 0.5, paused or 1))
+                
+                now = time.monotonic()
+                if len(self.pending) >= batch_size or now >= next_send:
+                    next_send = now + send_interval
+                    self.flush()
+        except KeyboardInterrupt:
+            print("\n\n抓取进程已停止")
+        finally:
+            if self._connected.is_set():
+                self.flush()
+            print(f"[{now_str()}] {self.worker_id} {self.scheduler.describe()}")
+    
+    def fetch_due(self, bv_ids):
+        """抓取一批到期的视频，结果放入待发送列表并报告给调度器"""
+        for bv_id, video_info, error in self.api.iter_videos_info(bv_ids):
+            if video_info:
+                with self._pending_lock:
+                    self.pending.append(video_info)
+                self.scheduler.record(bv_id, video_info)
+            else:
+                self.scheduler.record_failure(bv_id, retry=error.kind not in FINAL_ERRORS)
+        counts = self.api.get_request_counts(reset=True)
+        self.scheduler.observe_requests(sum(counts.values()), len(bv_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bilibili视频热度监视器 - 多节点分片抓取')
+    sub = parser.add_subparsers(dest='role', required=True)
+    
+    coordinator = sub.add_parser('coordinator', help='协调进程：分配分片并写入数据库')
+    coordinator.add_argument('--config', default='config.json', help='配置文件')
+    coordinator.add_argument('--list', default='monitor.list', help='监控列表文件')
+    coordinator.add_argument('--db', default='data.db', help='数据库文件')
+    coordinator.add_argument('--port', type=int, help='监听端口，默认使用配置文件的 cluster.port')
+    
+    worker = sub.add_parser('worker', help='抓取进程：抓取分配到的视频')
+    worker.add_argument('--config', default='config.json', help='配置文件')
+    worker.add_argument('--coordinator', default='127.0.0.1', help='协调进程地址 host[:port]')
+    worker.add_argument('--id', help='抓取进程名称，默认 主机名-pid')
+    worker.add_argument('--rps', type=float, help='本进程每秒请求数上限，默认使用配置文件的 requests_per_second')
+    
+    args = parser.parse_args()
+    
+    with open(args.config, 'r', encoding='utf-8') as f:
+        options = load_cluster_options(json.load(f))
+    try:
+        load_authkey(options)
+    except ValueError as e:
+        print(f"无法启动: {e}")
+        sys.exit(1)
+    
+    if args.role == 'coordinator':
+        with Coordinator(args.config, args.list, args.db) as node:
+            if args.port is not None:
+                node.options['port'] = args.port
+            node.run()
+    else:
+        with Worker(parse_address(args.coordinator, options['port']), args.id, args.config, args.rps) as node:
+            node.run()
+
+
+if __name__ == '__main__':
+    main()
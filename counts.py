@@ -0,0 +1,32 @@
+"""
+计数解析
+B站部分接口（如在线人数）把计数返回为 '1000+'、'10万+' 这样的文本，
+这里把它们统一转换为整数。抓取、存储和导出共用，不依赖其他模块。
+"""
+
+
+# 把 '1000+'、'10万+' 这样的文本计数转换为整数，与 to_count 一致（无法解析时为0），
+# 用于在 SQL 中转换已保存的文本，{column} 为列名
+SQL_TO_COUNT = (
+    "CAST(CAST(REPLACE(REPLACE({column}, '+', ''), '万', '') AS REAL)"
+    " * (CASE WHEN {column} LIKE '%万%' THEN 10000 ELSE 1 END) AS INTEGER)"
+)
+
+
+def to_count(value):
+    """
+    把计数转换为整数
+    
+    B站在线人数接口的 total 是字符串，人数较多时为 '1000+'、'10万+' 这样的下限，
+    按下限保存；无法解析时为0。
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value or '').strip().rstrip('+')
+    scale = 1
+    if text.endswith('万'):
+        text, scale = text[:-1], 10000
+    try:
+        return int(float(text) * scale)
+    except ValueError:
+        return 0
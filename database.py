@@ -3,53 +3,763 @@
 使用SQLite存储视频数据
 """
 import sqlite3
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
 import os
 
+from counts import SQL_TO_COUNT, to_count
+
+
+# 默认连接参数，可通过 config.json 的 "database" 字段覆盖
+DEFAULT_DB_OPTIONS = {
+    'journal_mode': 'wal',      # WAL模式下读写互不阻塞
+    'synchronous': 'normal',    # WAL模式下只在检查点时fsync
+    'busy_timeout_ms': 5000,    # 遇到锁时等待的毫秒数
+    'cache_size_kb': 16384,     # 每个连接的页缓存大小
+    'mmap_size_mb': 256,        # 内存映射读取的大小，0表示关闭
+    'pool_size': 8,             # 连接池保留的空闲连接数
+    'auto_vacuum': 'incremental',  # 新建数据库的空间回收方式，已有数据库需执行一次 VACUUM 才会改变
+    'delete_chunk_rows': 2000,  # 删除/清理数据时每个事务最多删除的行数
+    'delete_pause_ms': 10,      # 每批删除之间让出写锁的时间
+    'vacuum_pages': 500,        # 增量回收时每个事务最多回收的页数
+    'legacy_batch_size': 5000,  # 后台迁移旧版 video_stats 数据时每个事务迁移的行数
+    'legacy_pause_ms': 50       # 每批迁移之间让出写锁的时间
+}
+
+# 数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 8
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 各项统计指标（samples 表中的列）
+METRIC_COLUMNS = ('view', 'like', 'coin', 'favorite', 'share', 'online')
+
+
+
+def stats_columns(metrics=METRIC_COLUMNS):
+    """
+    看板查询返回的列，ts 为 Unix 时间戳，timestamp 为本地时间字符串
+    
+    Args:
+        metrics: 需要返回的指标列，必须是 METRIC_COLUMNS 的子集
+    """
+    columns = ', '.join(f's.{metric}' for metric in metrics)
+    return f"v.bv_id, v.title, {columns}, s.ts, datetime(s.ts, 'unixepoch', 'localtime') AS timestamp"
+
+
+def normalize_metrics(metrics):
+    """
+    校验指标列表
+    
+    Args:
+        metrics: 指标名列表，为空时表示全部指标
+        
+    Returns:
+        tuple: 按 METRIC_COLUMNS 顺序排列的指标
+        
+    Raises:
+        ValueError: 包含未知指标时
+    """
+    if not metrics:
+        return METRIC_COLUMNS
+    invalid = [metric for metric in metrics if metric not in METRIC_COLUMNS]
+    if invalid:
+        raise ValueError(f"未知指标: {', '.join(invalid)}")
+    return tuple(metric for metric in METRIC_COLUMNS if metric in metrics)
+
+
+STATS_COLUMNS = stats_columns()
+
+# 汇总层：层级名 -> (表名, 桶宽度秒数)，原始采样为最细的 'raw' 层。
+# 小时桶按整点划分，天桶按本地时间零点划分
+ROLLUP_TIERS = {
+    'hourly': ('samples_hourly', 3600),
+    'daily': ('samples_daily', 86400)
+}
+
+TIERS = ('raw',) + tuple(ROLLUP_TIERS)
+
+# 桶起始时间的SQL表达式，{ts} 替换为采样时间
+ROLLUP_BUCKET_SQL = {
+    'hourly': '{ts} - {ts} % 3600',
+    'daily': "CAST(strftime('%s', {ts}, 'unixepoch', 'localtime', 'start of day', 'utc') AS INTEGER)"
+}
+
+# 汇总表中每个指标保存的值：桶内第一个、最后一个、最小、最大值
+ROLLUP_AGGREGATES = ('first', 'last', 'min', 'max')
+
+# 查询汇总层时每个指标可附加的列，delta 为与上一个桶最后一个值的差
+ROLLUP_DETAIL = ('first', 'min', 'max', 'delta')
+
+
+def bucket_start(tier, ts):
+    """
+    计算采样时间所在汇总桶的起始时间，与 ROLLUP_BUCKET_SQL 一致
+    
+    Args:
+        tier: 'hourly' 或 'daily'
+        ts: Unix 时间戳
+    """
+    ts = int(ts)
+    if tier == 'hourly':
+        return ts - ts % 3600
+    day = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(day.timestamp())
+
+
+def rollup_detail_columns(metrics=METRIC_COLUMNS):
+    """查询汇总层时附加的列名，如 view_min、view_delta"""
+    return [f'{metric}_{name}' for metric in metrics for name in ROLLUP_DETAIL]
+
+
+def rollup_table_sql(tier):
+    """汇总表的建表语句"""
+    table = ROLLUP_TIERS[tier][0]
+    columns = ',\n'.join(f'        {metric}_{agg} INTEGER NOT NULL'
+                          for metric in METRIC_COLUMNS for agg in ROLLUP_AGGREGATES)
+    return f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        video_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        first_ts INTEGER NOT NULL,
+        last_ts INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL,
+{columns},
+        PRIMARY KEY (video_id, bucket)
+    ) WITHOUT ROWID
+'''
+
+
+def rollup_upsert_sql(tier, source='NEW', where='WHERE true'):
+    """
+    把采样合并进汇总表的语句，触发器、迁移回填和删除数据后的重建共用
+    
+    Args:
+        tier: 汇总层级
+        source: 采样行的引用，触发器中为 NEW，否则为 samples 表的别名
+        where: 采样的来源和条件（UPSERT 的 SELECT 必须带 WHERE 子句）
+    """
+    table = ROLLUP_TIERS[tier][0]
+    bucket = ROLLUP_BUCKET_SQL[tier].format(ts=f'{source}.ts')
+    names = ['video_id', 'bucket', 'first_ts', 'last_ts', 'sample_count']
+    values = [f'{source}.video_id', bucket, f'{source}.ts', f'{source}.ts', '1']
+    updates = [
+        'sample_count = sample_count + excluded.sample_count',
+        'first_ts = MIN(first_ts, excluded.first_ts)',
+        'last_ts = MAX(last_ts, excluded.last_ts)'
+    ]
+    for metric in METRIC_COLUMNS:
+        names.extend(f'{metric}_{agg}' for agg in ROLLUP_AGGREGATES)
+        values.extend([f'{source}.{metric}'] * len(ROLLUP_AGGREGATES))
+        updates.extend([
+            f'{metric}_first = CASE WHEN excluded.first_ts < first_ts THEN excluded.{metric}_first ELSE {metric}_first END',
+            f'{metric}_last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.{metric}_last ELSE {metric}_last END',
+            f'{metric}_min = MIN({metric}_min, excluded.{metric}_min)',
+            f'{metric}_max = MAX({metric}_max, excluded.{metric}_max)'
+        ])
+    return f'''
+        INSERT INTO {table} ({', '.join(names)})
+        SELECT {', '.join(values)}
+        {where}
+        ON CONFLICT(video_id, bucket) DO UPDATE SET {', '.join(updates)}
+    '''
+
+
+# 汇总层的时间范围查询：每个桶返回最后一个值（时间为桶内最后一次采样），
+# 起始时间所在的桶也包含在内
+SQL_ROLLUP_SERIES = '''
+    SELECT {columns}
+    FROM videos v JOIN {table} r
+        ON r.video_id = v.id AND r.bucket BETWEEN ? AND ?
+    WHERE v.bv_id IN ({placeholders})
+    ORDER BY v.bv_id, r.bucket
+'''
+
+SQL_VIDEO_STATS_TEMPLATE = '''
+    SELECT {columns}
+    FROM videos v JOIN samples s ON s.video_id = v.id
+    WHERE v.bv_id = ? AND s.ts > ?
+    ORDER BY s.ts DESC
+    LIMIT ?
+'''
+
+SQL_VIDEO_STATS = SQL_VIDEO_STATS_TEMPLATE.format(columns=STATS_COLUMNS)
+
+# 多个视频各自最新N条：用相关子查询沿主键定位每个视频第N新的时间点，
+# 再按主键范围取出该时间点之后的数据，全程走索引；第二个参数为增量查询的游标
+SQL_MANY_VIDEO_STATS = '''
+    SELECT {columns}
+    FROM videos v JOIN samples s
+        ON s.video_id = v.id
+        AND s.ts >= COALESCE((
+            SELECT ts FROM samples
+            WHERE video_id = v.id
+            ORDER BY ts DESC
+            LIMIT 1 OFFSET ?
+        ), 0)
+        AND s.ts > ?
+    WHERE v.bv_id IN ({placeholders})
+    ORDER BY v.bv_id, s.ts
+'''
+
+# 导出：按视频、时间顺序读取时间范围内的采样，{where} 为空时导出所有视频
+SQL_EXPORT_SAMPLES = '''
+    SELECT {columns}
+    FROM videos v JOIN samples s
+        ON s.video_id = v.id AND s.ts BETWEEN ? AND ?
+    {where}
+    ORDER BY v.bv_id, s.ts
+'''
+
+# 视频目录（videos 表）中维护的最新一次采样
+CATALOG_COLUMNS = '''
+    bv_id, title, view, like, coin, favorite, share, online, last_ts AS ts,
+    datetime(last_ts, 'unixepoch', 'localtime') AS timestamp,
+    sample_count, first_ts
+'''
+
+SQL_LATEST_DATA = f'''
+    SELECT {CATALOG_COLUMNS} FROM videos
+    WHERE bv_id = ? AND sample_count > 0
+'''
+
+# 视频数据版本（采样数与最新采样时间），用于生成 ETag
+SQL_DATA_VERSIONS = '''
+    SELECT bv_id, sample_count, first_ts, last_ts FROM videos
+    WHERE bv_id IN ({placeholders})
+'''
+
+# 所有视频的数据版本，任一视频写入或删除数据后都会变化
+SQL_CATALOG_VERSION = '''
+    SELECT COUNT(*), SUM(sample_count), MIN(first_ts), MAX(last_ts) FROM videos
+'''
+
+SQL_ALL_BV_IDS = '''
+    SELECT bv_id FROM videos
+    WHERE sample_count > 0
+    ORDER BY id
+'''
+
+SQL_VIDEOS_INFO = f'''
+    SELECT {CATALOG_COLUMNS} FROM videos
+    WHERE sample_count > 0
+    ORDER BY id
+'''
+
+# 按 samples 表重新计算视频目录，用于删除数据之后
+SQL_REFRESH_CATALOG = '''
+    UPDATE videos SET
+        sample_count = (SELECT COUNT(*) FROM samples WHERE video_id = videos.id),
+        first_ts = (SELECT MIN(ts) FROM samples WHERE video_id = videos.id),
+        last_ts = (SELECT MAX(ts) FROM samples WHERE video_id = videos.id),
+        view = (SELECT view FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        like = (SELECT like FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        coin = (SELECT coin FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        favorite = (SELECT favorite FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        share = (SELECT share FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        online = (SELECT online FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1)
+    WHERE id = ?
+'''
+
+# 删除数据后更新视频目录的时间范围和最新数据，采样数在分批删除时已同步扣减
+SQL_REFRESH_CATALOG_BOUNDS = '''
+    UPDATE videos SET
+        first_ts = (SELECT MIN(ts) FROM samples WHERE video_id = videos.id),
+        last_ts = (SELECT MAX(ts) FROM samples WHERE video_id = videos.id),
+        view = (SELECT view FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        like = (SELECT like FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        coin = (SELECT coin FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        favorite = (SELECT favorite FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        share = (SELECT share FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1),
+        online = (SELECT online FROM samples WHERE video_id = videos.id ORDER BY ts DESC LIMIT 1)
+    WHERE id = ?
+'''
+
+# 异常报警：按 id 倒序分页，{where} 为空时查询所有视频；第一个参数为游标（只返回更新的报警）
+SQL_ALERTS = '''
+    SELECT a.id, v.bv_id, v.title, a.ts, datetime(a.ts, 'unixepoch', 'localtime') AS timestamp,
+        a.kind, a.rate, a.baseline, a.zscore
+    FROM alerts a JOIN videos v ON v.id = a.video_id
+    WHERE a.id > ? {where}
+    ORDER BY a.id DESC
+    LIMIT ?
+'''
+
+# 看板高频查询及示例参数，查询计划中不应出现临时B树排序
+HOT_QUERIES = {
+    'get_video_stats': (SQL_VIDEO_STATS, ('BV1xx411c7XZ', 0, 100)),
+    'get_latest_data': (SQL_LATEST_DATA, ('BV1xx411c7XZ',)),
+    'get_all_bv_ids': (SQL_ALL_BV_IDS, ()),
+    'get_videos_info': (SQL_VIDEOS_INFO, ()),
+    'get_many_video_stats': (
+        SQL_MANY_VIDEO_STATS.format(columns=STATS_COLUMNS, placeholders='?, ?, ?'),
+        (99, 0, 'BV1xx411c7XZ', 'BV1yy411c7XZ', 'BV1zz411c7XZ')
+    ),
+    'get_catalog_version': (SQL_CATALOG_VERSION, ()),
+    'iter_samples': (
+        SQL_EXPORT_SAMPLES.format(
+            columns='v.bv_id, s.ts, s.view',
+            where='WHERE v.bv_id IN (?, ?, ?)'
+        ),
+        (0, 2 ** 62, 'BV1xx411c7XZ', 'BV1yy411c7XZ', 'BV1zz411c7XZ')
+    ),
+    'iter_samples (all)': (
+        SQL_EXPORT_SAMPLES.format(columns='v.bv_id, s.ts, s.view', where=''),
+        (0, 2 ** 62)
+    ),
+    'get_data_versions': (
+        SQL_DATA_VERSIONS.format(placeholders='?, ?, ?'),
+        ('BV1xx411c7XZ', 'BV1yy411c7XZ', 'BV1zz411c7XZ')
+    ),
+    'get_range_series (daily)': (
+        SQL_ROLLUP_SERIES.format(
+            columns='v.bv_id, r.last_ts, r.view_last',
+            table='samples_daily',
+            placeholders='?, ?, ?'
+        ),
+        (0, 2 ** 62, 'BV1xx411c7XZ', 'BV1yy411c7XZ', 'BV1zz411c7XZ')
+    ),
+    'get_alerts': (SQL_ALERTS.format(where=''), (0, 100)),
+    'get_alerts (video)': (SQL_ALERTS.format(where='AND v.bv_id = ?'), (0, 'BV1xx411c7XZ', 100)),
+}
+
+
+def to_epoch(value):
+    """把 'YYYY-MM-DD HH:MM:SS' 本地时间字符串转换为 Unix 时间戳"""
+    return int(datetime.strptime(value, TIME_FORMAT).timestamp())
+
+
+def parse_time_bound(value, end=False):
+    """
+    解析删除条件中的时间
+    
+    Args:
+        value: 'YYYY-MM-DD'、'YYYY-MM-DDTHH:MM' 或 'YYYY-MM-DD HH:MM:SS'
+        end: 是否为结束时间，仅有日期时取当天最后一秒
+        
+    Returns:
+        int: Unix 时间戳
+    """
+    value = value.strip().replace('T', ' ')
+    for fmt, span in (('%Y-%m-%d %H:%M:%S', 0), ('%Y-%m-%d %H:%M', 59), ('%Y-%m-%d', 86399)):
+        try:
+            epoch = int(datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            continue
+        return epoch + span if end else epoch
+    raise ValueError(f"无法解析时间: {value}")
+
 
 class Database:
-    def __init__(self, db_path='data.db'):
+    def __init__(self, db_path='data.db', options=None):
+        """
+        Args:
+            db_path: 数据库文件路径
+            options: 连接参数，见 DEFAULT_DB_OPTIONS
+        """
         self.db_path = db_path
+        self.options = dict(DEFAULT_DB_OPTIONS)
+        self.options.update(options or {})
+        
+        # 空闲连接池，连接在查询之间保持打开
+        self._pool = queue.LifoQueue(maxsize=max(1, int(self.options['pool_size'])))
+        
+        # 创建连接池的进程ID，用于识别预加载后 fork 出的工作进程
+        self._pid = os.getpid()
+        self._inherited = []
+        
+        # bv_id -> (videos.id, title) 缓存，避免每次写入都查询维度表
+        self._video_ids = {}
+        
         self.init_database()
     
     def get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
+        """创建一个新的数据库连接并应用连接参数"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.options['busy_timeout_ms'] / 1000,
+            check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.options['busy_timeout_ms'])}")
+        conn.execute(f"PRAGMA synchronous = {self.options['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {-int(self.options['cache_size_kb'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.options['mmap_size_mb']) * 1024 * 1024}")
         return conn
     
+    @contextmanager
+    def connection(self):
+        """
+        从连接池借用一个连接
+        
+        退出时提交未完成的事务（出现异常则回滚），然后把连接放回连接池。
+        """
+        self._check_fork()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self.get_connection()
+        
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+    
+    def _check_fork(self):
+        """
+        在 fork 出的子进程中（如多进程服务器预加载应用后）换用新的连接池
+        
+        SQLite 连接不能跨 fork 使用。继承来的连接只保留引用、不关闭也不使用，
+        避免子进程关闭连接时执行检查点或删除父进程仍在使用的 WAL 文件。
+        """
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        
+        while True:
+            try:
+                self._inherited.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        self._pool = queue.LifoQueue(maxsize=self._pool.maxsize)
+        self._pid = pid
+    
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
     def init_database(self):
         """初始化数据库表"""
         conn = self.get_connection()
+        
+        # 空间回收方式必须在建表之前设置，对已有数据库不起作用（需 VACUUM）
+        conn.execute(f"PRAGMA auto_vacuum = {self.options['auto_vacuum']}")
+        
+        # 日志模式记录在数据库文件中，只需设置一次
+        conn.execute(f"PRAGMA journal_mode = {self.options['journal_mode']}")
+        
         cursor = conn.cursor()
         
-        # 创建视频数据表
+        # 创建视频维度表，同时作为视频目录保存每个视频的最新采样和采样数
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS video_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                bv_id TEXT NOT NULL,
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                bv_id TEXT NOT NULL UNIQUE,
                 title TEXT,
-                view INTEGER DEFAULT 0,
-                like INTEGER DEFAULT 0,
-                coin INTEGER DEFAULT 0,
-                favorite INTEGER DEFAULT 0,
-                share INTEGER DEFAULT 0,
-                online INTEGER DEFAULT 0,
-                timestamp TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                sample_count INTEGER NOT NULL DEFAULT 0,
+                first_ts INTEGER,
+                last_ts INTEGER,
+                view INTEGER,
+                like INTEGER,
+                coin INTEGER,
+                favorite INTEGER,
+                share INTEGER,
+                online INTEGER
+            )
+        ''')
+        
+        # 创建采样数据表，按 (视频, 时间) 聚簇存储
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS samples (
+                video_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                view INTEGER NOT NULL DEFAULT 0,
+                like INTEGER NOT NULL DEFAULT 0,
+                coin INTEGER NOT NULL DEFAULT 0,
+                favorite INTEGER NOT NULL DEFAULT 0,
+                share INTEGER NOT NULL DEFAULT 0,
+                online INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (video_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        
+        # 创建视频元数据缓存表（bv_id -> aid/cid）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS video_meta (
+                bv_id TEXT PRIMARY KEY,
+                aid INTEGER NOT NULL,
+                cid INTEGER NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 创建监控列表表和运行时设置表，修改时 settings 表中的 version 加1
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS watchlist (
+                position INTEGER PRIMARY KEY,
+                bv_id TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
             )
         ''')
         
-        # 创建索引
+        # 创建后台任务表，任务参数和进度保存在数据库中，所有Web进程都能查询和取消
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_bv_timestamp 
-            ON video_stats(bv_id, timestamp)
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                total INTEGER,
+                processed INTEGER NOT NULL DEFAULT 0,
+                vacuumed_pages INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                finished_at INTEGER
+            )
         ''')
         
+        # 创建异常检测的状态表（每个视频一行）和报警表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS detector_state (
+                bv_id TEXT PRIMARY KEY,
+                last_ts INTEGER NOT NULL,
+                last_view INTEGER NOT NULL,
+                mean REAL NOT NULL,
+                var REAL NOT NULL,
+                count INTEGER NOT NULL,
+                alert_ts INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY,
+                video_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                rate REAL NOT NULL,
+                baseline REAL NOT NULL,
+                zscore REAL NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_video ON alerts (video_id, id)')
+        
         conn.commit()
+        
+        self.migrate(conn)
+        
+        if self.has_legacy_data(conn):
+            print("检测到旧版 video_stats 表中的历史数据，监控程序和Web服务会在后台分批迁移"
+                  "（也可运行 python migrate.py）")
+        
         conn.close()
         print("数据库初始化完成")
     
+    def migrate(self, conn):
+        """
+        根据 PRAGMA user_version 依次升级数据库结构
+        
+        Args:
+            conn: 数据库连接
+        """
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        
+        print(f"正在升级数据库结构: v{version} -> v{SCHEMA_VERSION}")
+        
+        # v1: 旧版 video_stats 表的覆盖索引，已被 v2 结构取代，不再创建
+        
+        if version < 2:
+            # v2: 数据改存 videos + samples 表，旧表只在迁移时按 rowid 读取，不再需要索引
+            conn.execute('DROP INDEX IF EXISTS idx_bv_timestamp')
+            conn.execute('DROP INDEX IF EXISTS idx_video_stats_recent')
+        
+        if version < 3:
+            # v3: videos 表兼作视频目录，由触发器在写入采样时维护
+            existing = {row['name'] for row in conn.execute('PRAGMA table_info(videos)')}
+            for column in ('sample_count INTEGER NOT NULL DEFAULT 0', 'first_ts INTEGER',
+                           'last_ts INTEGER', 'view INTEGER', 'like INTEGER', 'coin INTEGER',
+                           'favorite INTEGER', 'share INTEGER', 'online INTEGER'):
+                if column.split()[0] not in existing:
+                    conn.execute(f'ALTER TABLE videos ADD COLUMN {column}')
+            
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_samples_catalog
+                AFTER INSERT ON samples
+                BEGIN
+                    UPDATE videos SET
+                        sample_count = sample_count + 1,
+                        first_ts = MIN(COALESCE(first_ts, NEW.ts), NEW.ts),
+                        last_ts = MAX(COALESCE(last_ts, NEW.ts), NEW.ts),
+                        view = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.view ELSE view END,
+                        like = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.like ELSE like END,
+                        coin = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.coin ELSE coin END,
+                        favorite = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.favorite ELSE favorite END,
+                        share = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.share ELSE share END,
+                        online = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.online ELSE online END
+                    WHERE id = NEW.video_id;
+                END
+            ''')
+            
+            video_ids = [(row['id'],) for row in conn.execute('SELECT id FROM videos')]
+            conn.executemany(SQL_REFRESH_CATALOG, video_ids)
+        
+        if version < 4:
+            # v4: 在线人数统一保存为整数。之前接口返回的 '1000+' 等文本被原样保存，
+            # 降采样等按数值处理时出错
+            for table in ('samples', 'videos'):
+                conn.execute(f'''
+                    UPDATE {table} SET online = {SQL_TO_COUNT.format(column='online')}
+                    WHERE typeof(online) = 'text'
+                ''')
+        
+        # v5: 监控列表和抓取间隔改存 watchlist / settings 表（已在 init_database 中创建），
+        # 监控程序启动时从 monitor.list 导入
+        
+        if version < 6:
+            # v6: 小时、天汇总表，由触发器在写入采样时增量维护，已有的采样一次性回填
+            for tier, (table, _) in ROLLUP_TIERS.items():
+                conn.execute(rollup_table_sql(tier))
+                conn.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_samples_{tier}
+                    AFTER INSERT ON samples
+                    BEGIN
+                        {rollup_upsert_sql(tier)};
+                    END
+                ''')
+                conn.execute(f'DELETE FROM {table}')
+                conn.execute(rollup_upsert_sql(tier, 's', 'FROM samples s WHERE true'))
+        
+        # v7: 后台任务表（已在 init_database 中创建），删除数据改为分批执行的后台任务
+        
+        # v8: 异常检测的状态表和报警表（已在 init_database 中创建）
+        
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    
+    def has_legacy_data(self, conn):
+        """旧版 video_stats 表是否还有未迁移的数据"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'video_stats'"
+        ).fetchone()
+        if not exists:
+            return False
+        return conn.execute('SELECT 1 FROM video_stats LIMIT 1').fetchone() is not None
+    
+    def migrate_legacy_batch(self, batch_size=5000):
+        """
+        把旧版 video_stats 表中最新的一批数据迁移到 samples 表
+        
+        每批在独立的短事务中完成（复制后删除旧行），可随时中断后继续，
+        迁移期间监控程序可以照常写入。从最新的数据开始迁移，
+        看板会先看到最近的历史。
+        
+        多个进程（监控程序、各Web进程）可以同时迁移：每批开始时即获取写锁，
+        各自迁移不同的批。
+        
+        Args:
+            batch_size: 每批迁移的记录数
+            
+        Returns:
+            tuple: (本批迁移的记录数, 剩余记录数)
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if not self.has_legacy_data(conn):
+                return 0, 0
+            
+            low = conn.execute('''
+                SELECT MIN(id) FROM (
+                    SELECT id FROM video_stats ORDER BY id DESC LIMIT ?
+                )
+            ''', (batch_size,)).fetchone()[0]
+            
+            conn.execute('''
+                INSERT OR IGNORE INTO videos (bv_id, title)
+                SELECT bv_id, title FROM video_stats
+                WHERE id >= ?
+                ORDER BY id DESC
+            ''', (low,))
+            
+            conn.execute(f'''
+                INSERT OR IGNORE INTO samples
+                (video_id, ts, view, like, coin, favorite, share, online)
+                SELECT v.id, CAST(strftime('%s', o.timestamp, 'utc') AS INTEGER),
+                       o.view, o.like, o.coin, o.favorite, o.share, {SQL_TO_COUNT.format(column='o.online')}
+                FROM video_stats o JOIN videos v ON v.bv_id = o.bv_id
+                WHERE o.id >= ?
+            ''', (low,))
+            
+            moved = conn.execute('DELETE FROM video_stats WHERE id >= ?', (low,)).rowcount
+            
+            remaining = conn.execute('SELECT COUNT(*) FROM video_stats').fetchone()[0]
+            if remaining == 0:
+                conn.execute('DROP TABLE video_stats')
+            conn.commit()
+            
+            return moved, remaining
+    
+    def explain_query_plan(self, sql, params=()):
+        """
+        获取查询计划
+        
+        Args:
+            sql: SQL语句
+            params: 查询参数
+            
+        Returns:
+            list: 查询计划各步骤的描述
+        """
+        with self.connection() as conn:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            return [row['detail'] for row in rows]
+    
+    def get_video_ids(self, conn, rows):
+        """
+        获取（必要时创建）数据中各视频在维度表中的 id，标题变化时同步更新
+        
+        Args:
+            conn: 数据库连接（在调用方的事务中执行）
+            rows: 视频数据字典列表
+            
+        Returns:
+            dict: {bv_id: video_id}
+        """
+        titles = {data['bv_id']: data.get('title') for data in rows}
+        changed = [(bv_id, title) for bv_id, title in titles.items()
+                   if bv_id not in self._video_ids or self._video_ids[bv_id][1] != title]
+        
+        if changed:
+            conn.executemany('''
+                INSERT INTO videos (bv_id, title) VALUES (?, ?)
+                ON CONFLICT(bv_id) DO UPDATE SET title = excluded.title
+            ''', changed)
+            
+            placeholders = ','.join('?' * len(changed))
+            for row in conn.execute(
+                f'SELECT id, bv_id FROM videos WHERE bv_id IN ({placeholders})',
+                [bv_id for bv_id, _ in changed]
+            ):
+                self._video_ids[row['bv_id']] = (row['id'], titles[row['bv_id']])
+        
+        return {bv_id: self._video_ids[bv_id][0] for bv_id in titles}
+    
     def insert_video_data(self, data):
         """
         插入视频数据
@@ -60,94 +770,468 @@ class Database:
         Returns:
             bool: 是否插入成功
         """
+        if self.insert_many([data]) == 1:
+            print(f"数据插入成功: {data.get('timestamp')}")
+            return True
+        return False
+    
+    def insert_many(self, rows, raise_errors=False):
+        """
+        批量插入视频数据（单个事务）
+        
+        同一视频同一秒的重复数据会被忽略，不计入返回的记录数。
+        
+        Args:
+            rows: 视频数据字典列表
+            raise_errors: 失败时抛出异常，而不是输出错误并返回0
+            
+        Returns:
+            int: 实际插入的记录数，失败时返回0
+        """
+        if not rows:
+            return 0
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                video_ids = self.get_video_ids(conn, rows)
+                
+                # rowcount 只统计插入 samples 的行，不含被忽略的重复数据和触发器的修改
+                cursor = conn.executemany('''
+                    INSERT OR IGNORE INTO samples
+                    (video_id, ts, view, like, coin, favorite, share, online)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(
+                    video_ids[data['bv_id']],
+                    to_epoch(data['timestamp']),
+                    data.get('view', 0),
+                    data.get('like', 0),
+                    data.get('coin', 0),
+                    data.get('favorite', 0),
+                    data.get('share', 0),
+                    to_count(data.get('online', 0))
+                ) for data in rows])
+                
+                conn.commit()
+                return cursor.rowcount
+            
+        except Exception as e:
+            # 事务已回滚，维度表缓存可能包含未提交的 id
+            self._video_ids.clear()
+            if raise_errors:
+                raise
+            print(f"批量插入失败: {e}")
+            return 0
+    
+    def get_video_meta(self):
+        """
+        获取已缓存的视频元数据
+        
+        Returns:
+            dict: {bv_id: (aid, cid)}
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('SELECT bv_id, aid, cid FROM video_meta')
+                
+                rows = cursor.fetchall()
+                
+                return {row['bv_id']: (row['aid'], row['cid']) for row in rows}
             
-            cursor.execute('''
-                INSERT INTO video_stats 
-                (bv_id, title, view, like, coin, favorite, share, online, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('bv_id'),
-                data.get('title'),
-                data.get('view', 0),
-                data.get('like', 0),
-                data.get('coin', 0),
-                data.get('favorite', 0),
-                data.get('share', 0),
-                data.get('online', 0),
-                data.get('timestamp')
-            ))
+        except Exception as e:
+            print(f"查询视频元数据失败: {e}")
+            return {}
+    
+    def save_video_meta(self, meta):
+        """
+        保存视频元数据，cid 变化时覆盖旧记录
+        
+        Args:
+            meta: {bv_id: (aid, cid)}
             
-            conn.commit()
-            conn.close()
-            print(f"数据插入成功: {data.get('timestamp')}")
+        Returns:
+            bool: 是否保存成功
+        """
+        if not meta:
             return True
+        
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany('''
+                    INSERT INTO video_meta (bv_id, aid, cid, updated_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(bv_id) DO UPDATE SET
+                        aid = excluded.aid,
+                        cid = excluded.cid,
+                        updated_at = excluded.updated_at
+                ''', [(bv_id, aid, cid) for bv_id, (aid, cid) in meta.items()])
+                
+                conn.commit()
+                return True
             
         except Exception as e:
-            print(f"数据插入失败: {e}")
+            print(f"保存视频元数据失败: {e}")
             return False
     
-    def get_video_stats(self, bv_id, limit=100):
+    def get_settings_version(self):
+        """
+        获取监控列表和运行时设置的版本号，每次修改加1
+        
+        Returns:
+            int: 版本号，从未保存过时为0
+        """
+        with self.connection() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'version'").fetchone()
+            return int(row['value']) if row else 0
+    
+    def get_watchlist(self):
+        """
+        在同一个读事务中获取监控列表和运行时设置
+        
+        Returns:
+            tuple: (版本号, BV号列表, 设置字典)
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            settings = {row['key']: json.loads(row['value'])
+                        for row in conn.execute('SELECT key, value FROM settings')}
+            bv_ids = [row['bv_id'] for row in conn.execute('SELECT bv_id FROM watchlist ORDER BY position')]
+            return int(settings.pop('version', 0)), bv_ids, settings
+    
+    def save_watchlist(self, bv_ids=None, settings=None):
+        """
+        替换监控列表和/或更新运行时设置（单个事务），内容有变化时版本号加1
+        
+        Args:
+            bv_ids: 新的监控列表，None 表示不修改，重复的BV号只保留第一个
+            settings: 要更新的设置 {key: 可JSON序列化的值}
+        
+        Returns:
+            int: 保存后的版本号
+        """
+        with self.connection() as conn:
+            # 立即获取写锁，两个进程同时修改时依次执行
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT value FROM settings WHERE key = 'version'").fetchone()
+            version = int(row['value']) if row else 0
+            changed = False
+            
+            if bv_ids is not None:
+                bv_ids = list(dict.fromkeys(bv_ids))
+                current = [row['bv_id'] for row in conn.execute('SELECT bv_id FROM watchlist ORDER BY position')]
+                if bv_ids != current:
+                    conn.execute('DELETE FROM watchlist')
+                    conn.executemany('INSERT INTO watchlist (position, bv_id) VALUES (?, ?)',
+                                     list(enumerate(bv_ids)))
+                    changed = True
+            
+            for key, value in (settings or {}).items():
+                value = json.dumps(value)
+                row = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+                if row is None or row['value'] != value:
+                    conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
+                    changed = True
+            
+            if changed:
+                version += 1
+                conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('version', ?)",
+                             (str(version),))
+            conn.commit()
+            return version
+    
+    def get_video_stats(self, bv_id, limit=100, metrics=None, since=0):
         """
         获取视频历史数据
         
         Args:
             bv_id: 视频BV号
             limit: 返回的数据条数
+            metrics: 需要返回的指标列表，None表示全部
+            since: 只返回采样时间（Unix秒）晚于该值的数据，用于增量轮询
             
         Returns:
             list: 历史数据列表
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            metrics = normalize_metrics(metrics)
+            sql = SQL_VIDEO_STATS_TEMPLATE.format(columns=stats_columns(metrics))
             
-            cursor.execute('''
-                SELECT * FROM video_stats
-                WHERE bv_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (bv_id, limit))
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(sql, (bv_id, since, limit))
+                
+                rows = cursor.fetchall()
+                
+                # 转换为字典列表并反转顺序（时间从早到晚）
+                result = [dict(row) for row in rows]
+                result.reverse()
+                
+                return result
             
-            rows = cursor.fetchall()
-            conn.close()
+        except Exception as e:
+            print(f"查询数据失败: {e}")
+            return []
+    
+    def get_many_video_stats(self, bv_ids, limit=100, metrics=None, since=0):
+        """
+        一次查询获取多个视频各自最新的历史数据
+        
+        Args:
+            bv_ids: 视频BV号列表
+            limit: 每个视频返回的数据条数
+            metrics: 需要返回的指标列表，None表示全部
+            since: 只返回采样时间（Unix秒）晚于该值的数据，用于增量轮询
+            
+        Returns:
+            dict: {bv_id: 历史数据列表（时间从早到晚）}，没有数据的视频对应空列表
+        """
+        result = {bv_id: [] for bv_id in bv_ids}
+        if not bv_ids or limit <= 0:
+            return result
+        
+        try:
+            metrics = normalize_metrics(metrics)
+            sql = SQL_MANY_VIDEO_STATS.format(
+                columns=stats_columns(metrics),
+                placeholders=', '.join('?' * len(result))
+            )
             
-            # 转换为字典列表并反转顺序（时间从早到晚）
-            result = [dict(row) for row in rows]
-            result.reverse()
+            with self.connection() as conn:
+                for row in conn.execute(sql, [limit - 1, since, *result]):
+                    result[row['bv_id']].append(dict(row))
             
             return result
             
         except Exception as e:
-            print(f"查询数据失败: {e}")
-            return []
+            print(f"批量查询数据失败: {e}")
+            return result
     
-    def get_all_bv_ids(self):
+    def get_many_video_series(self, bv_ids, limit=100, metrics=None, since=0):
         """
-        获取所有已监控的BV号
+        一次查询获取多个视频的列式历史数据（用于降采样等批量计算）
         
+        Args:
+            bv_ids: 视频BV号列表
+            limit: 每个视频返回的数据条数
+            metrics: 需要返回的指标列表，None表示全部
+            since: 只返回采样时间（Unix秒）晚于该值的数据
+            
         Returns:
-            list: BV号列表
+            dict: {bv_id: {'title': 标题, 'ts': [...], 指标名: [...]}}，时间从早到晚
         """
+        metrics = normalize_metrics(metrics)
+        result = {bv_id: dict({'title': None, 'ts': []}, **{m: [] for m in metrics})
+                  for bv_id in bv_ids}
+        if not bv_ids or limit <= 0:
+            return result
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            columns = 'v.bv_id, v.title, s.ts, ' + ', '.join(f's.{m}' for m in metrics)
+            sql = SQL_MANY_VIDEO_STATS.format(
+                columns=columns,
+                placeholders=', '.join('?' * len(result))
+            )
             
-            cursor.execute('''
-                SELECT DISTINCT bv_id FROM video_stats
-            ''')
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(sql, [limit - 1, since, *result]).fetchall()
+            
+            # 结果按视频排序，逐个视频把行转置为列，比逐行追加快得多
+            for bv_id, group in groupby(rows, key=itemgetter(0)):
+                columns = list(zip(*group))
+                series = result[bv_id]
+                series['title'] = columns[1][0]
+                series['ts'] = list(columns[2])
+                for i, metric in enumerate(metrics, 3):
+                    series[metric] = list(columns[i])
+            
+            return result
+            
+        except Exception as e:
+            print(f"批量查询数据失败: {e}")
+            return result
+    
+    def get_range_series(self, bv_ids, start_ts=0, end_ts=2 ** 62, metrics=None, tier='raw', detail=False):
+        """
+        一次查询获取多个视频在时间范围内某一层的列式数据
+        
+        Args:
+            bv_ids: 视频BV号列表
+            start_ts / end_ts: 时间范围（Unix秒，包含两端）
+            metrics: 需要返回的指标列表，None表示全部
+            tier: 读取的层级，见 TIERS；汇总层每个桶返回一个点，取桶内最后一次采样的时间和值
+            detail: 读取汇总层时是否附加 rollup_detail_columns 中的列
+                    （桶内第一个值、最小值、最大值，以及与上一个桶相比的增量）
+            
+        Returns:
+            dict: {bv_id: {'title': 标题, 'ts': [...], 指标名: [...]}}，时间从早到晚
+            
+        Raises:
+            ValueError: 层级或指标不合法时
+        """
+        metrics = normalize_metrics(metrics)
+        if tier not in TIERS:
+            raise ValueError(f"tier 必须是 {'/'.join(TIERS)} 之一")
+        extra = rollup_detail_columns(metrics) if detail and tier != 'raw' else []
+        names = [*metrics, *extra]
+        result = {bv_id: dict({'title': None, 'ts': []}, **{name: [] for name in names})
+                  for bv_id in bv_ids}
+        if not bv_ids:
+            return result
+        
+        placeholders = ', '.join('?' * len(result))
+        if tier == 'raw':
+            columns = ['v.bv_id', 'v.title', 's.ts'] + [f's.{m}' for m in metrics]
+            sql = SQL_EXPORT_SAMPLES.format(columns=', '.join(columns), where=f'WHERE v.bv_id IN ({placeholders})')
+            params = [start_ts, end_ts, *result]
+        else:
+            columns = ['v.bv_id', 'v.title', 'r.last_ts'] + [f'r.{m}_last' for m in metrics]
+            if extra:
+                for m in metrics:
+                    columns += [
+                        f'r.{m}_first', f'r.{m}_min', f'r.{m}_max',
+                        f'r.{m}_last - COALESCE(LAG(r.{m}_last) OVER '
+                        f'(PARTITION BY r.video_id ORDER BY r.bucket), r.{m}_first)'
+                    ]
+            sql = SQL_ROLLUP_SERIES.format(
+                columns=', '.join(columns),
+                table=ROLLUP_TIERS[tier][0],
+                placeholders=placeholders
+            )
+            params = [bucket_start(tier, start_ts), end_ts, *result]
+        
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(sql, params).fetchall()
             
-            rows = cursor.fetchall()
-            conn.close()
+            for bv_id, group in groupby(rows, key=itemgetter(0)):
+                columns = list(zip(*group))
+                series = result[bv_id]
+                series['title'] = columns[1][0]
+                series['ts'] = list(columns[2])
+                for i, name in enumerate(names, 3):
+                    series[name] = list(columns[i])
             
-            return [row['bv_id'] for row in rows]
+            return result
+            
+        except Exception as e:
+            print(f"按时间范围查询数据失败: {e}")
+            return result
+    
+    def iter_samples(self, bv_ids=None, start_ts=0, end_ts=2 ** 62, metrics=None,
+                     chunk_size=10000, timestamp=False):
+        """
+        分块读取采样数据，用于大批量导出
+        
+        生成器在整个读取过程中占用一个连接，并读取同一个快照；每块最多 chunk_size 行，
+        内存占用与导出的总行数无关。
+        
+        Args:
+            bv_ids: 视频BV号列表，None表示所有视频
+            start_ts / end_ts: 时间范围（Unix秒，包含两端）
+            metrics: 需要导出的指标列表，None表示全部
+            chunk_size: 每块的行数
+            timestamp: 是否在 ts 后附加本地时间字符串
+            
+        Yields:
+            list: 元组 (bv_id, ts, [timestamp,] 指标...) 的列表，按视频、时间排序
+        """
+        metrics = normalize_metrics(metrics)
+        columns = ['v.bv_id', 's.ts']
+        if timestamp:
+            columns.append("datetime(s.ts, 'unixepoch', 'localtime')")
+        columns.extend(f's.{metric}' for metric in metrics)
+        
+        params = [start_ts, end_ts]
+        where = ''
+        if bv_ids is not None:
+            where = f"WHERE v.bv_id IN ({', '.join('?' * len(bv_ids))})"
+            params.extend(bv_ids)
+        sql = SQL_EXPORT_SAMPLES.format(columns=', '.join(columns), where=where)
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def get_data_versions(self, bv_ids):
+        """
+        获取视频的数据版本，只读视频目录，不访问采样数据
+        
+        Args:
+            bv_ids: 视频BV号列表
+            
+        Returns:
+            dict: {bv_id: (sample_count, first_ts, last_ts)}，不存在的视频不包含在内
+        """
+        if not bv_ids:
+            return {}
+        
+        sql = SQL_DATA_VERSIONS.format(placeholders=', '.join('?' * len(bv_ids)))
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            return {row[0]: row[1:] for row in cursor.execute(sql, list(bv_ids))}
+    
+    def get_catalog_version(self):
+        """
+        获取所有视频的数据版本，只读视频目录
+        
+        Returns:
+            tuple: (视频数, 采样总数, 最早采样时间, 最新采样时间)
+        """
+        with self.connection() as conn:
+            return tuple(conn.execute(SQL_CATALOG_VERSION).fetchone())
+    
+    def get_all_bv_ids(self):
+        """
+        获取所有已监控的BV号
+        
+        Returns:
+            list: BV号列表
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(SQL_ALL_BV_IDS)
+                
+                rows = cursor.fetchall()
+                
+                return [row['bv_id'] for row in rows]
             
         except Exception as e:
             print(f"查询BV号列表失败: {e}")
             return []
     
+    def get_videos_info(self):
+        """
+        获取所有有数据的视频信息（标题、最新数据、采样数）
+        
+        Returns:
+            list: 视频信息列表
+        """
+        try:
+            with self.connection() as conn:
+                rows = conn.execute(SQL_VIDEOS_INFO).fetchall()
+                return [dict(row) for row in rows]
+            
+        except Exception as e:
+            print(f"查询视频信息失败: {e}")
+            return []
+    
     def get_latest_data(self, bv_id):
         """
         获取指定视频的最新数据
@@ -159,47 +1243,124 @@ class Database:
             dict: 最新数据
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM video_stats
-                WHERE bv_id = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-            ''', (bv_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                return dict(row)
-            return None
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(SQL_LATEST_DATA, (bv_id,))
+                
+                row = cursor.fetchone()
+                
+                if row:
+                    return dict(row)
+                return None
             
         except Exception as e:
             print(f"查询最新数据失败: {e}")
             return None
     
-    def clear_old_data(self, days=30):
+    def _delete_range(self, table, column, video_id, low, high, finish=None, progress=None, cancelled=None):
         """
-        清理指定天数之前的旧数据
+        按主键范围分批删除一个视频在 [low, high] 内的数据
+        
+        每批在单独的短事务中最多删除 delete_chunk_rows 行，批与批之间暂停 delete_pause_ms，
+        写入线程不会被一次大删除长时间阻塞。删除 samples 时同步扣减视频目录中的采样数。
+        剩余不足一批的数据与 finish 在同一个事务中删除，删除期间新写入的数据不会被遗漏。
         
         Args:
-            days: 保留最近多少天的数据
-        """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            table / column: 表名和主键中的时间列
+            video_id: 视频在维度表中的 id
+            low / high: 时间范围（含两端）
+            finish: finish(conn, end) 在最后一个事务中调用，end 为实际删除到的位置
+            progress: 每批之后调用 progress(本批删除的行数)
+            cancelled: 每批之前调用，返回 True 时停止
             
-            cursor.execute('''
-                DELETE FROM video_stats
-                WHERE created_at < datetime('now', '-' || ? || ' days')
-            ''', (days,))
+        Returns:
+            tuple: (删除的行数, 是否删完)
+        """
+        chunk = max(1, int(self.options['delete_chunk_rows']))
+        deleted = 0
+        while True:
+            stop = cancelled is not None and cancelled()
+            count = 0
+            with self.connection() as conn:
+                upper = low - 1
+                if not stop:
+                    row = conn.execute(f'''
+                        SELECT {column} FROM {table}
+                        WHERE video_id = ? AND {column} BETWEEN ? AND ?
+                        ORDER BY {column} LIMIT 1 OFFSET ?
+                    ''', (video_id, low, high, chunk)).fetchone()
+                    upper = row[0] - 1 if row else high
+                    count = conn.execute(
+                        f'DELETE FROM {table} WHERE video_id = ? AND {column} BETWEEN ? AND ?',
+                        (video_id, low, upper)
+                    ).rowcount
+                    if count and table == 'samples':
+                        conn.execute('UPDATE videos SET sample_count = sample_count - ? WHERE id = ?',
+                                     (count, video_id))
+                last = stop or upper >= high
+                if last and finish is not None:
+                    finish(conn, upper)
             
-            deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            deleted += count
+            if count and progress is not None:
+                progress(count)
+            if last:
+                return deleted, not stop
+            low = upper + 1
+            time.sleep(self.options['delete_pause_ms'] / 1000)
+    
+    def prune_tier(self, tier, cutoff, cancelled=None):
+        """
+        删除某一层中早于 cutoff 的数据（保留策略）
+        
+        原始采样的截止时间向前对齐到本地时间零点，使每个汇总桶的原始采样要么完整保留、
+        要么全部删除，删除部分数据后仍能用原始采样重建汇总桶；汇总层只删除整个早于
+        截止时间的桶。每个视频按主键范围分批删除（见 _delete_range），不会长时间阻塞写入。
+        
+        Args:
+            tier: 层级，见 TIERS
+            cutoff: 截止时间（Unix秒）
+            cancelled: 返回 True 时在当前批之后停止
             
+        Returns:
+            int: 删除的记录数
+        """
+        if tier not in TIERS:
+            raise ValueError(f"tier 必须是 {'/'.join(TIERS)} 之一")
+        if tier == 'raw':
+            table, column, cutoff = 'samples', 'ts', bucket_start('daily', cutoff)
+        else:
+            table, column, cutoff = ROLLUP_TIERS[tier][0], 'bucket', bucket_start(tier, cutoff)
+        
+        with self.connection() as conn:
+            video_ids = [row['id'] for row in conn.execute('SELECT id FROM videos')]
+        
+        def refresh_catalog(conn, end, video_id):
+            if tier == 'raw' and end >= 0:
+                conn.execute(SQL_REFRESH_CATALOG_BOUNDS, (video_id,))
+        
+        deleted_count = 0
+        for video_id in video_ids:
+            count, done = self._delete_range(
+                table, column, video_id, 0, cutoff - 1,
+                finish=lambda conn, end: refresh_catalog(conn, end, video_id),
+                cancelled=cancelled
+            )
+            deleted_count += count
+            if not done:
+                break
+        return deleted_count
+    
+    def clear_old_data(self, days=30):
+        """
+        清理指定天数之前的原始采样，小时、天汇总数据保留（见 prune_tier）
+        
+        Args:
+            days: 保留最近多少天的原始采样
+        """
+        try:
+            deleted_count = self.prune_tier('raw', int(time.time()) - days * 86400)
             print(f"清理了 {deleted_count} 条旧数据")
             return deleted_count
             
@@ -207,56 +1368,428 @@ class Database:
             print(f"清理旧数据失败: {e}")
             return 0
     
+    def _detach_rollups(self, conn, video_id, start_ts, end_ts):
+        """
+        原始采样删除后处理与时间范围重叠的汇总桶
+        
+        完全落在范围内的桶直接删除；部分重叠的桶如果范围外一端的原始采样仍在，先删除，
+        再由调用方用剩下的原始采样重建；原始采样已被保留策略清理的桶无法拆分，保持不变。
+        
+        Returns:
+            list: 需要重建的桶 [(层级, first_ts, last_ts)]
+        """
+        rebuild = []
+        for tier, (table, _) in ROLLUP_TIERS.items():
+            low = bucket_start(tier, start_ts)
+            conn.execute(f'''
+                DELETE FROM {table}
+                WHERE video_id = ? AND bucket BETWEEN ? AND ? AND first_ts >= ? AND last_ts <= ?
+            ''', (video_id, low, end_ts, start_ts, end_ts))
+            
+            # 剩下的重叠桶最多两个（范围的两端）
+            edges = conn.execute(f'''
+                SELECT bucket, first_ts, last_ts FROM {table}
+                WHERE video_id = ? AND bucket BETWEEN ? AND ? AND last_ts >= ? AND first_ts <= ?
+            ''', (video_id, low, end_ts, start_ts, end_ts)).fetchall()
+            for row in edges:
+                # 桶在范围外一端的采样还在，说明这个桶的原始采样是完整的
+                outside = row['first_ts'] if row['first_ts'] < start_ts else row['last_ts']
+                if conn.execute('SELECT 1 FROM samples WHERE video_id = ? AND ts = ?',
+                                (video_id, outside)).fetchone():
+                    conn.execute(f'DELETE FROM {table} WHERE video_id = ? AND bucket = ?',
+                                 (video_id, row['bucket']))
+                    rebuild.append((tier, row['first_ts'], row['last_ts']))
+        return rebuild
+    
+    def _select_video_ids(self, conn, bv_id=None):
+        """删除条件对应的视频 id，bv_id 为 None 时为所有视频"""
+        if bv_id:
+            return [row['id'] for row in conn.execute('SELECT id FROM videos WHERE bv_id = ?', (bv_id,))]
+        return [row['id'] for row in conn.execute('SELECT id FROM videos')]
+    
+    def count_samples(self, bv_id=None, start_ts=0, end_ts=2 ** 62):
+        """
+        统计时间范围内的采样数（按主键范围计数，用于估计删除任务的进度）
+        
+        Args:
+            bv_id: 视频BV号，None表示所有视频
+            start_ts / end_ts: 时间范围（Unix秒，含两端）
+        """
+        with self.connection() as conn:
+            total = 0
+            for video_id in self._select_video_ids(conn, bv_id):
+                total += conn.execute(
+                    'SELECT COUNT(*) FROM samples WHERE video_id = ? AND ts BETWEEN ? AND ?',
+                    (video_id, start_ts, end_ts)
+                ).fetchone()[0]
+            return total
+    
+    def delete_samples(self, bv_id=None, start_ts=0, end_ts=2 ** 62, progress=None, cancelled=None):
+        """
+        分批删除时间范围内的采样
+        
+        每个视频按主键范围分批删除（见 _delete_range），最后一批与汇总桶的删除/重建、
+        视频目录的更新在同一个事务中完成。删除过程中汇总表仍包含尚未处理完的视频的旧数据。
+        被取消时已删除的部分保持一致，汇总表和视频目录按实际删除到的位置更新。
+        
+        Args:
+            bv_id: 视频BV号，None表示所有视频
+            start_ts / end_ts: 时间范围（Unix秒，含两端）
+            progress: 每批之后调用 progress(本批删除的行数)
+            cancelled: 返回 True 时在当前批之后停止
+            
+        Returns:
+            tuple: (删除的记录数, 是否删完)
+        """
+        with self.connection() as conn:
+            video_ids = self._select_video_ids(conn, bv_id)
+        
+        def finish(conn, end, video_id):
+            if end < start_ts:
+                return
+            for tier, first_ts, last_ts in self._detach_rollups(conn, video_id, start_ts, end):
+                conn.execute(
+                    rollup_upsert_sql(tier, 's', 'FROM samples s WHERE s.video_id = ? AND s.ts BETWEEN ? AND ?'),
+                    (video_id, first_ts, last_ts)
+                )
+            conn.execute(SQL_REFRESH_CATALOG_BOUNDS, (video_id,))
+        
+        deleted_count = 0
+        for video_id in video_ids:
+            count, done = self._delete_range(
+                'samples', 'ts', video_id, start_ts, end_ts,
+                finish=lambda conn, end: finish(conn, end, video_id),
+                progress=progress, cancelled=cancelled
+            )
+            deleted_count += count
+            if not done:
+                return deleted_count, False
+        return deleted_count, True
+    
     def delete_video_data(self, bv_id=None, start_date=None, end_date=None):
         """
-        删除指定条件的数据
+        删除指定条件的数据（同步执行，Web端通过 jobs.JobRunner 在后台执行）
         
         Args:
             bv_id: 视频BV号，None表示所有视频
-            start_date: 开始日期 (YYYY-MM-DD)
-            end_date: 结束日期 (YYYY-MM-DD)
+            start_date: 开始时间 (YYYY-MM-DD 或 YYYY-MM-DDTHH:MM)
+            end_date: 结束时间 (YYYY-MM-DD 或 YYYY-MM-DDTHH:MM)，仅有日期时包含当天
             
         Returns:
             int: 删除的记录数
         """
+        if not (bv_id or start_date or end_date):
+            # 如果没有任何条件，拒绝删除（安全考虑）
+            return 0
+        
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            start_ts = parse_time_bound(start_date) if start_date else 0
+            end_ts = parse_time_bound(end_date, end=True) if end_date else 2 ** 62
+            deleted_count, _ = self.delete_samples(bv_id, start_ts, end_ts)
+            print(f"删除了 {deleted_count} 条数据")
+            return deleted_count
             
-            conditions = []
-            params = []
+        except Exception as e:
+            print(f"删除数据失败: {e}")
+            return 0
+    
+    def incremental_vacuum(self, pages=None):
+        """
+        回收一批空闲页（需要 auto_vacuum = incremental），每次调用是一个短事务
+        
+        Args:
+            pages: 本次最多回收的页数，默认 vacuum_pages
             
-            if bv_id:
-                conditions.append('bv_id = ?')
-                params.append(bv_id)
+        Returns:
+            tuple: (本次回收的页数, 剩余空闲页数)，数据库没有启用增量回收时返回 None
+        """
+        pages = int(pages or self.options['vacuum_pages'])
+        with self.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return None
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before:
+                # execute() 只执行这条 PRAGMA 的第一步（回收一页），executescript 才会执行完
+                conn.executescript(f'PRAGMA incremental_vacuum({pages})')
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            return before - after, after
+    
+    def reclaim_space(self, progress=None, cancelled=None):
+        """
+        分批回收全部空闲页，批与批之间暂停 delete_pause_ms，删除大量数据后调用
+        
+        Args:
+            progress: 每批之后调用 progress(本批回收的页数, 剩余空闲页数)
+            cancelled: 返回 True 时停止
             
-            if start_date:
-                conditions.append("date(timestamp) >= ?")
-                params.append(start_date)
+        Returns:
+            int: 回收的页数，数据库没有启用增量回收时返回 None
+        """
+        reclaimed = 0
+        while cancelled is None or not cancelled():
+            result = self.incremental_vacuum()
+            if result is None:
+                return None
+            pages, remaining = result
+            reclaimed += pages
+            if progress is not None:
+                progress(pages, remaining)
+            if not pages or not remaining:
+                break
+            time.sleep(self.options['delete_pause_ms'] / 1000)
+        return reclaimed
+    
+    def create_job(self, kind, params):
+        """
+        创建后台任务
+        
+        Args:
+            kind: 任务类型，如 'delete'
+            params: 任务参数（可JSON序列化）
             
-            if end_date:
-                conditions.append("date(timestamp) <= ?")
-                params.append(end_date)
+        Returns:
+            dict: 新任务，见 get_job
+        """
+        now = int(time.time())
+        with self.connection() as conn:
+            job_id = conn.execute(
+                'INSERT INTO jobs (kind, params, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                (kind, json.dumps(params), now, now)
+            ).lastrowid
+        return self.get_job(job_id)
+    
+    def get_job(self, job_id):
+        """
+        获取后台任务
+        
+        Returns:
+            dict: 任务的各个字段，params 已解析；任务不存在时返回 None
+        """
+        with self.connection() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+    
+    def list_jobs(self, limit=20):
+        """最近的后台任务，按创建时间倒序"""
+        with self.connection() as conn:
+            job_ids = [row['id'] for row in conn.execute(
+                'SELECT id FROM jobs ORDER BY id DESC LIMIT ?', (limit,))]
+        return [self.get_job(job_id) for job_id in job_ids]
+    
+    def claim_job(self, stale_seconds=60):
+        """
+        领取一个待执行的任务，状态改为 running
+        
+        超过 stale_seconds 没有更新的 running 任务视为所在进程已退出，可以重新领取；
+        删除任务可以重复执行，从中断的位置继续。
+        
+        Returns:
+            dict: 领取到的任务，没有时返回 None
+        """
+        now = int(time.time())
+        with self.connection() as conn:
+            # 立即获取写锁，多个进程同时领取时只有一个成功
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT id FROM jobs
+                WHERE status = 'pending' OR (status = 'running' AND updated_at < ?)
+                ORDER BY id LIMIT 1
+            ''', (now - stale_seconds,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                         (now, row['id']))
+        return self.get_job(row['id'])
+    
+    def update_job(self, job_id, **fields):
+        """
+        更新任务的进度或状态，同时作为心跳刷新 updated_at
+        
+        Args:
+            job_id: 任务 id
+            **fields: 要更新的字段，如 status、total、processed、message
             
-            if not conditions:
-                # 如果没有任何条件，拒绝删除（安全考虑）
-                return 0
+        Returns:
+            bool: 是否已请求取消
+        """
+        fields['updated_at'] = int(time.time())
+        if fields.get('status') in ('done', 'cancelled', 'failed'):
+            fields['finished_at'] = fields['updated_at']
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        with self.connection() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+    
+    def cancel_job(self, job_id):
+        """
+        请求取消任务：未开始的任务直接标记为已取消，运行中的任务在当前批之后停止
+        
+        Returns:
+            bool: 任务是否处于可以取消的状态
+        """
+        now = int(time.time())
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            count = conn.execute('''
+                UPDATE jobs SET cancel_requested = 1, updated_at = ?
+                WHERE id = ? AND status IN ('pending', 'running')
+            ''', (now, job_id)).rowcount
+            conn.execute('''
+                UPDATE jobs SET status = 'cancelled', message = '已取消', finished_at = ?
+                WHERE id = ? AND status = 'pending'
+            ''', (now, job_id))
+        return count > 0
+    
+    def load_detector_state(self):
+        """
+        读取异常检测的状态
+        
+        Returns:
+            list: (bv_id, last_ts, last_view, mean, var, count, alert_ts) 元组列表
+        """
+        with self.connection() as conn:
+            return [tuple(row) for row in conn.execute(
+                'SELECT bv_id, last_ts, last_view, mean, var, count, alert_ts FROM detector_state')]
+    
+    def save_detector_state(self, rows):
+        """保存异常检测的状态，rows 的格式同 load_detector_state"""
+        with self.connection() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO detector_state (bv_id, last_ts, last_view, mean, var, count, alert_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    def insert_alerts(self, alerts):
+        """
+        写入异常报警
+        
+        Args:
+            alerts: 字典列表，包含 bv_id、ts、kind、rate、baseline、zscore
+        """
+        with self.connection() as conn:
+            conn.executemany('''
+                INSERT INTO alerts (video_id, ts, kind, rate, baseline, zscore)
+                SELECT id, :ts, :kind, :rate, :baseline, :zscore FROM videos WHERE bv_id = :bv_id
+            ''', alerts)
+    
+    def get_alerts(self, bv_id=None, since=0, limit=100):
+        """
+        查询异常报警，最新的在前
+        
+        Args:
+            bv_id: 视频BV号，None表示所有视频
+            since: 只返回 id 大于该值的报警（轮询时传入上次结果中最大的 id）
+            limit: 最多返回的条数
             
-            where_clause = ' AND '.join(conditions)
-            sql = f'DELETE FROM video_stats WHERE {where_clause}'
+        Returns:
+            list: 报警字典列表
+        """
+        if bv_id:
+            sql, params = SQL_ALERTS.format(where='AND v.bv_id = ?'), (since, bv_id, limit)
+        else:
+            sql, params = SQL_ALERTS.format(where=''), (since, limit)
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+
+class BatchWriter:
+    """
+    后台批量写入线程
+    
+    抓取线程通过有界队列提交数据，写入线程攒批后调用 insert_many，
+    使网络抓取与磁盘写入同时进行。队列满时 put 会阻塞，起到背压作用。
+    一批数据在攒满 batch_size 条、距第一条超过 flush_interval 秒或关闭时写入。
+    写入成功后在写入线程中调用 on_saved(batch)（如异常检测），不占用抓取时间。
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, db, batch_size=1000, flush_interval=5.0, queue_size=1000, on_saved=None):
+        """
+        Args:
+            db: Database 实例
+            batch_size: 单个事务最多写入的记录数
+            flush_interval: 一批数据最长等待时间（秒），None 表示只在攒满或关闭时写入
+            queue_size: 队列容量
+            on_saved: 一批数据写入成功后的回调，参数为该批数据。executemany 无法得知哪些行
+                      被 INSERT OR IGNORE 忽略，因此该批数据中可能包含重复采样（同一视频同一秒）
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_saved = on_saved
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.saved = 0
+        self.failed = 0
+        self.ignored = 0
+        self.transactions = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def put(self, row):
+        """提交一条待写入的数据"""
+        self.queue.put(row)
+    
+    def close(self):
+        """
+        写入剩余数据并停止线程
+        
+        Returns:
+            int: 成功写入的记录总数
+        """
+        self.queue.put(self._STOP)
+        self._thread.join()
+        return self.saved
+    
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            inserted = self.db.insert_many(batch, raise_errors=True)
+        except Exception as e:
+            print(f"批量插入失败: {e}")
+            self.failed += len(batch)
+            return
+        self.saved += inserted
+        # 同一视频同一秒的重复数据
+        self.ignored += len(batch) - inserted
+        self.transactions += 1
+        if inserted and self.on_saved is not None:
+            try:
+                self.on_saved(batch)
+            except Exception as e:
+                print(f"写入后处理失败: {e}")
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
             
-            cursor.execute(sql, params)
-            deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            if item is self._STOP:
+                self._flush(batch)
+                break
             
-            print(f"删除了 {deleted_count} 条数据")
-            return deleted_count
+            if item is not None:
+                batch.append(item)
+                if deadline is None and self.flush_interval is not None:
+                    deadline = time.monotonic() + self.flush_interval
             
-        except Exception as e:
-            print(f"删除数据失败: {e}")
-            return 0
-
+            if len(batch) >= self.batch_size or (deadline is not None and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
 
 if __name__ == '__main__':
     # 测试代码
@@ -0,0 +1,238 @@
+"""
+增长异常检测
+在写入管道中对每个视频的播放增速做在线检测：每批采样写入数据库后，用指数加权的均值和方差
+作为该视频的基线，增速的 z 分数超过阈值时记录一条报警（alerts 表，/api/alerts 查询）。
+
+每个视频只保存上一次的采样和基线（固定大小，与历史长度无关），所有视频的状态存放在
+按列的 NumPy 数组中，一批采样向量化更新；状态定期写回 detector_state 表，重启后继续使用。
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from database import to_epoch
+
+
+# 默认检测参数，可通过 config.json 的 "detector" 字段覆盖
+DEFAULT_DETECTOR_OPTIONS = {
+    'enabled': True,
+    'halflife_minutes': 360,    # 基线（指数加权均值和方差）的半衰期，按实际采样间隔折算权重
+    'threshold': 4.0,           # 增速的 z 分数达到该值时报警
+    'warmup': 6,                # 至少观察多少个采样间隔后才报警
+    'min_rate': 100,            # 每小时播放增量低于该值时不报警
+    'min_std': 10,              # 标准差下限（每小时播放），避免增长平稳的视频因微小波动报警
+    'min_std_ratio': 0.2,       # 标准差相对基线的下限
+    'cooldown_minutes': 60,     # 同一视频两次报警的最小间隔
+    'save_seconds': 60          # 状态写回数据库的间隔
+}
+
+# 每个视频的状态：上一次采样的时间和播放量、增速的指数加权均值和方差、已观察的间隔数、上次报警时间
+STATE_FIELDS = (
+    ('last_ts', np.int64),
+    ('last_view', np.int64),
+    ('mean', np.float64),
+    ('var', np.float64),
+    ('count', np.int64),
+    ('alert_ts', np.int64)
+)
+
+
+class AnomalyDetector:
+    """
+    播放增速的在线异常检测
+    
+    observe() 由 BatchWriter 在写入线程中调用，不占用抓取时间。
+    同一批中同一视频的多条采样按时间顺序分轮处理；时间不晚于上一次采样的数据
+    （重复采样，写入时已被忽略）直接跳过。
+    """
+    
+    def __init__(self, db, options=None):
+        """
+        Args:
+            db: Database 实例
+            options: 检测参数，覆盖 DEFAULT_DETECTOR_OPTIONS
+        """
+        self.db = db
+        self.options = dict(DEFAULT_DETECTOR_OPTIONS)
+        self.options.update(options or {})
+        self.enabled = bool(self.options['enabled'])
+        
+        # bv_id -> 状态数组中的下标
+        self.index = {}
+        self.bv_ids = []
+        self.state = {name: np.zeros(0, dtype=dtype) for name, dtype in STATE_FIELDS}
+        self._dirty = np.zeros(0, dtype=bool)
+        self._lock = threading.Lock()
+        self._next_save = time.monotonic() + self.options['save_seconds']
+        
+        # 计入基线的采样数（不含重复采样）和产生的报警数
+        self.observed = 0
+        self.alerts = 0
+    
+    @classmethod
+    def from_config(cls, db, config):
+        """根据 config.json 的 detector 字段创建，并读取保存的状态"""
+        detector = cls(db, config.get('detector'))
+        if detector.enabled:
+            detector.load()
+        return detector
+    
+    def _grow(self, size):
+        """扩大状态数组（按倍数增长），新位置的 last_ts 为 -1 表示还没有采样"""
+        capacity = len(self._dirty)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for name, dtype in STATE_FIELDS:
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:len(self.state[name])] = self.state[name]
+            self.state[name] = grown
+        self.state['last_ts'][len(self._dirty):] = -1
+        dirty = np.zeros(capacity, dtype=bool)
+        dirty[:len(self._dirty)] = self._dirty
+        self._dirty = dirty
+    
+    def _slot(self, bv_id):
+        slot = self.index.get(bv_id)
+        if slot is None:
+            slot = self.index[bv_id] = len(self.bv_ids)
+            self.bv_ids.append(bv_id)
+            self._grow(slot + 1)
+        return slot
+    
+    def load(self):
+        """从 detector_state 表读取保存的状态"""
+        rows = self.db.load_detector_state()
+        with self._lock:
+            for row in rows:
+                slot = self._slot(row[0])
+                for (name, _), value in zip(STATE_FIELDS, row[1:]):
+                    self.state[name][slot] = value
+        if rows:
+            print(f"异常检测: 已恢复 {len(rows)} 个视频的基线")
+    
+    def observe(self, rows):
+        """
+        处理一批已写入数据库的采样，检测到异常时写入 alerts 表
+        
+        Args:
+            rows: 视频数据字典列表（与 insert_many 相同）。可能包含写入时被忽略的
+                  重复采样（同一视频同一秒），这些采样不晚于上一次采样，直接跳过
+        
+        Returns:
+            list: 本批产生的报警
+        """
+        if not self.enabled or not rows:
+            return []
+        
+        # 一批数据中的采样时间大多相同，只解析一次
+        epochs = {}
+        for row in rows:
+            if row['timestamp'] not in epochs:
+                epochs[row['timestamp']] = to_epoch(row['timestamp'])
+        
+        with self._lock:
+            slots = np.fromiter((self._slot(row['bv_id']) for row in rows), dtype=np.int64, count=len(rows))
+            ts = np.fromiter((epochs[row['timestamp']] for row in rows), dtype=np.int64, count=len(rows))
+            views = np.fromiter((row.get('view', 0) for row in rows), dtype=np.int64, count=len(rows))
+            
+            alerts = []
+            pending = np.argsort(ts, kind='stable')
+            while len(pending):
+                # 每轮处理每个视频最早的一条采样
+                _, first = np.unique(slots[pending], return_index=True)
+                take = pending[first]
+                alerts += self._update(slots[take], ts[take], views[take])
+                pending = np.delete(pending, first)
+            
+            self.alerts += len(alerts)
+            save = time.monotonic() >= self._next_save
+        
+        if alerts:
+            self.db.insert_alerts(alerts)
+            for alert in alerts:
+                print(f"⚡ 异常增长: {alert['bv_id']} 播放增速 {alert['rate']:,.0f}/小时"
+                      f"（基线 {alert['baseline']:,.0f}/小时，z={alert['zscore']:.1f}）")
+        if save:
+            self.save()
+        return alerts
+    
+    def _update(self, slots, ts, views):
+        """用每个视频最多一条的采样向量化更新状态，返回报警列表"""
+        options = self.options
+        state = self.state
+        last_ts = state['last_ts'][slots]
+        last_view = state['last_view'][slots]
+        mean = state['mean'][slots]
+        var = state['var'][slots]
+        count = state['count'][slots]
+        alert_ts = state['alert_ts'][slots]
+        
+        seen = last_ts >= 0
+        elapsed = ts - last_ts
+        newer = ~seen | (elapsed > 0)
+        # 播放量减少（数据修正）时不计算增速，只更新起点
+        valid = seen & (elapsed > 0) & (views >= last_view)
+        elapsed = np.maximum(elapsed, 1)
+        rate = np.where(valid, (views - last_view) * 3600.0 / elapsed, 0.0)
+        
+        std = np.maximum(np.sqrt(var), np.maximum(options['min_std'], options['min_std_ratio'] * np.abs(mean)))
+        zscore = (rate - mean) / std
+        alert = (valid & (count >= options['warmup']) & (zscore >= options['threshold'])
+                 & (rate >= options['min_rate'])
+                 & (ts - alert_ts >= options['cooldown_minutes'] * 60))
+        
+        # 指数加权均值和方差，权重按实际间隔折算：间隔越长，新数据的权重越大；
+        # 观察的间隔数较少时按算术平均累积（第一个间隔的权重为1），避免基线停留在第一个值附近
+        alpha = 1 - np.exp(-elapsed * math.log(2) / (options['halflife_minutes'] * 60))
+        alpha = np.maximum(alpha, 1.0 / (count + 1))
+        diff = rate - mean
+        increment = alpha * diff
+        new_mean = mean + increment
+        new_var = (1 - alpha) * (var + diff * increment)
+        
+        state['mean'][slots] = np.where(valid, new_mean, mean)
+        state['var'][slots] = np.where(valid, new_var, var)
+        state['count'][slots] = count + valid
+        state['last_ts'][slots] = np.where(newer, ts, last_ts)
+        state['last_view'][slots] = np.where(newer, views, last_view)
+        state['alert_ts'][slots] = np.where(alert, ts, alert_ts)
+        self._dirty[slots[newer]] = True
+        self.observed += int(np.count_nonzero(newer))
+        
+        return [{
+            'bv_id': self.bv_ids[slots[i]],
+            'ts': int(ts[i]),
+            'kind': 'spike',
+            'rate': round(float(rate[i]), 2),
+            'baseline': round(float(mean[i]), 2),
+            'zscore': round(float(zscore[i]), 2)
+        } for i in np.flatnonzero(alert)]
+    
+    def save(self):
+        """把有变化的状态写回数据库"""
+        with self._lock:
+            slots = np.flatnonzero(self._dirty[:len(self.bv_ids)])
+            rows = list(zip(
+                (self.bv_ids[slot] for slot in slots),
+                *(self.state[name][slots].tolist() for name, _ in STATE_FIELDS)
+            ))
+            self._dirty[slots] = False
+            self._next_save = time.monotonic() + self.options['save_seconds']
+        if rows:
+            self.db.save_detector_state(rows)
+    
+    def close(self):
+        """保存状态"""
+        if self.enabled:
+            self.save()
+    
+    def describe(self):
+        """检测参数的说明"""
+        if not self.enabled:
+            return '异常检测: 关闭'
+        options = self.options
+        return (f"异常检测: 增速 z 分数 ≥ {options['threshold']:g}，基线半衰期 {options['halflife_minutes']:g} 分钟，"
+                f"已跟踪 {len(self.bv_ids)} 个视频")
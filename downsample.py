@@ -0,0 +1,168 @@
+"""
+时间序列降采样模块
+为图表接口把长序列压缩到有限的数据点，基于NumPy向量化计算
+
+支持两种方式:
+  - lttb: Largest-Triangle-Three-Buckets，保留曲线形状，返回原始采样点
+  - avg/min/max/last: 按固定时间桶聚合
+"""
+from datetime import datetime
+import numpy as np
+
+from database import TIME_FORMAT
+
+
+AGGREGATES = ('avg', 'min', 'max', 'last')
+MODES = ('lttb',) + AGGREGATES
+
+# 单次请求允许的最大数据点数
+MAX_POINTS_LIMIT = 10000
+
+
+def lttb_indices(x, y, threshold):
+    """
+    用 LTTB 算法选出保留的数据点
+    
+    Args:
+        x: 横坐标（时间戳）数组，升序
+        y: 纵坐标数组
+        threshold: 目标点数
+        
+    Returns:
+        numpy.ndarray: 保留点的下标（升序）
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # 首尾两点固定保留，中间的点平均分成 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        
+        # 下一个桶的平均点（最后一个桶使用末尾的点）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        # 选出与上一个选中点、下一个桶平均点组成三角形面积最大的点
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    
+    return selected
+
+
+def bucket_aggregate(ts, columns, width, agg):
+    """
+    按固定时间桶聚合
+    
+    Args:
+        ts: 时间戳数组，升序
+        columns: {指标名: 数组}
+        width: 桶宽度（秒）
+        agg: 聚合方式，avg/min/max/last
+        
+    Returns:
+        tuple: (每个桶的时间戳数组, {指标名: 聚合后的数组})
+               avg/min/max 使用桶起始时间，last 使用桶内最后一个采样的时间
+    """
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) == 0:
+        return ts, {name: np.asarray(values) for name, values in columns.items()}
+    
+    buckets = ts // width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)]
+    
+    result = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64 if agg == 'avg' else np.int64)
+        if agg == 'avg':
+            result[name] = np.round(np.add.reduceat(values, starts) / (ends - starts), 2)
+        elif agg == 'min':
+            result[name] = np.minimum.reduceat(values, starts)
+        elif agg == 'max':
+            result[name] = np.maximum.reduceat(values, starts)
+        else:
+            result[name] = values[ends - 1]
+    
+    bucket_ts = ts[ends - 1] if agg == 'last' else buckets[starts] * width
+    return bucket_ts, result
+
+
+def downsample_series(series, metrics, max_points=None, resolution=None, mode='lttb'):
+    """
+    对列式序列降采样
+    
+    Args:
+        series: {'ts': [...], 指标名: [...]}
+        metrics: 参与降采样的指标，lttb 模式按第一个指标选点
+        max_points: 最多返回的数据点数
+        resolution: 聚合模式下的时间桶宽度（秒），与 max_points 同时提供时取较粗的一个
+        mode: lttb/avg/min/max/last
+        
+    Returns:
+        dict: 与输入结构相同的列式序列
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知降采样方式: {mode}")
+    
+    ts = np.asarray(series['ts'], dtype=np.int64)
+    n = len(ts)
+    if n == 0:
+        return series
+    
+    result = {key: value for key, value in series.items() if key != 'ts' and key not in metrics}
+    
+    if mode == 'lttb':
+        if not max_points or max_points >= n:
+            return series
+        index = lttb_indices(ts, series[metrics[0]], max_points)
+        result['ts'] = ts[index].tolist()
+        for metric in metrics:
+            result[metric] = np.asarray(series[metric])[index].tolist()
+        return result
+    
+    width = int(resolution or 1)
+    if max_points:
+        span = int(ts[-1] - ts[0]) + 1
+        # 时间桶按宽度对齐，首尾可能各占半个桶，因此按 max_points-1 个桶计算宽度
+        width = max(width, -(-span // max(1, max_points - 1)))
+    
+    bucket_ts, columns = bucket_aggregate(ts, {m: series[m] for m in metrics}, width, mode)
+    result['ts'] = bucket_ts.tolist()
+    for metric in metrics:
+        result[metric] = columns[metric].tolist()
+    return result
+
+
+def series_to_rows(bv_id, series, metrics):
+    """
+    把列式序列转换为接口使用的行格式
+    
+    Returns:
+        list: [{'bv_id', 'title', 指标..., 'ts', 'timestamp'}]
+    """
+    title = series.get('title')
+    rows = []
+    for i, ts in enumerate(series['ts']):
+        row = {'bv_id': bv_id, 'title': title}
+        for metric in metrics:
+            row[metric] = series[metric][i]
+        row['ts'] = ts
+        row['timestamp'] = datetime.fromtimestamp(ts).strftime(TIME_FORMAT)
+        rows.append(row)
+    return rows
@@ -0,0 +1,141 @@
+"""
+数据导出
+把 Database.iter_samples 分块读取的采样数据编码为 CSV、Arrow IPC 或 Parquet，
+逐块生成字节串，供 Web 服务以流式响应返回
+"""
+import csv
+import io
+
+from counts import to_count
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# 导出格式 -> (MIME类型, 文件扩展名, 是否需要 pyarrow)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', False),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', True),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', True),
+}
+
+
+class ChunkSink(io.RawIOBase):
+    """只追加的内存缓冲区，每块数据写完后取出已写入的内容并清空"""
+    
+    def __init__(self):
+        self._buffer = bytearray()
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+    
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def iter_csv(chunks, metrics):
+    """
+    编码为 CSV（带 UTF-8 BOM，便于 Excel 打开）
+    
+    Args:
+        chunks: iter_samples(timestamp=True) 生成的数据块
+        metrics: 导出的指标
+    
+    Yields:
+        bytes: CSV 内容
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    buffer.write('\ufeff')
+    writer.writerow(['bv_id', 'ts', 'timestamp', *metrics])
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    data = buffer.getvalue()
+    if data:
+        yield data.encode('utf-8')
+
+
+def arrow_schema(metrics):
+    """导出数据的 Arrow 结构：bv_id、ts（UTC 秒级时间戳）和各指标"""
+    return pa.schema(
+        [('bv_id', pa.string()), ('ts', pa.timestamp('s', tz='UTC'))]
+        + [(metric, pa.int64()) for metric in metrics]
+    )
+
+
+def to_array(column, field):
+    """
+    把一列数据转换为 Arrow 数组
+    
+    指标列中混有 '1000+' 这样的文本计数（升级前保存的在线人数）时先转换为整数，
+    避免导出到一半时失败。
+    """
+    try:
+        return pa.array(column, type=field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        if not pa.types.is_integer(field.type):
+            raise
+        return pa.array([to_count(value) for value in column], type=field.type)
+
+
+def to_record_batch(rows, schema):
+    """把一块行数据转置为 Arrow RecordBatch"""
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [to_array(column, field) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def iter_arrow(chunks, metrics):
+    """
+    编码为 Arrow IPC 流格式，每块数据一个 RecordBatch
+    
+    Yields:
+        bytes: Arrow IPC 流内容
+    """
+    schema = arrow_schema(metrics)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(to_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_parquet(chunks, metrics):
+    """
+    编码为 Parquet，每块数据一个行组
+    
+    Yields:
+        bytes: Parquet 文件内容
+    """
+    schema = arrow_schema(metrics)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in chunks:
+            writer.write_batch(to_record_batch(rows, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(fmt, chunks, metrics):
+    """按格式编码导出数据"""
+    if fmt == 'csv':
+        return iter_csv(chunks, metrics)
+    if fmt == 'arrow':
+        return iter_arrow(chunks, metrics)
+    return iter_parquet(chunks, metrics)
@@ -0,0 +1,217 @@
+"""
+后台任务
+删除数据等耗时操作由Web请求写入数据库的 jobs 表后立即返回任务 id，由后台线程分批执行：
+每批是一个短事务，批与批之间让出写锁，监控程序的写入不会被一次大删除阻塞。
+任务的状态和进度保存在数据库中，所有Web进程都能查询和取消；执行任务的进程退出后，
+其他进程在任务超时没有更新后接手，从中断的位置继续（删除可以重复执行）。
+"""
+import os
+import threading
+import time
+
+from database import parse_time_bound
+
+
+# 默认任务参数，可通过 config.json 的 "jobs" 字段覆盖
+DEFAULT_JOB_OPTIONS = {
+    'poll_seconds': 2,          # 检查新任务的间隔（本进程提交的任务立即执行）
+    'stale_seconds': 60,        # 运行中的任务超过该时间没有更新，视为执行的进程已退出
+    'progress_seconds': 0.5     # 写入进度的最短间隔
+}
+
+def delete_params(bv_id=None, start_date=None, end_date=None):
+    """
+    校验删除条件并转换为任务参数
+    
+    Args:
+        bv_id: 视频BV号，None表示所有视频
+        start_date / end_date: 时间范围，格式见 database.parse_time_bound
+    
+    Returns:
+        dict: {'bv_id', 'start_ts', 'end_ts'}
+    
+    Raises:
+        ValueError: 没有任何条件（安全考虑）或时间无法解析时
+    """
+    if not (bv_id or start_date or end_date):
+        raise ValueError('至少需要指定视频或时间范围')
+    start_ts = parse_time_bound(start_date) if start_date else 0
+    end_ts = parse_time_bound(end_date, end=True) if end_date else 2 ** 62
+    if start_ts > end_ts:
+        raise ValueError('开始时间不能晚于结束时间')
+    return {'bv_id': bv_id or None, 'start_ts': start_ts, 'end_ts': end_ts}
+
+
+def describe_job(job):
+    """任务的API表示，附加 0~1 的进度"""
+    result = dict(job)
+    if job['status'] == 'done':
+        result['progress'] = 1.0
+    elif job['total']:
+        result['progress'] = round(min(1.0, job['processed'] / job['total']), 4)
+    else:
+        result['progress'] = 0.0
+    return result
+
+
+class JobRunner:
+    """
+    执行 jobs 表中任务的后台线程
+    
+    线程在第一次提交或查询任务时启动（多进程服务器 fork 之后各自启动），
+    每个进程同一时间只执行一个任务，多个任务按提交顺序执行。
+    """
+    
+    def __init__(self, db, options=None):
+        """
+        Args:
+            db: Database 实例
+            options: 任务参数，覆盖 DEFAULT_JOB_OPTIONS
+        """
+        self.db = db
+        self.options = dict(DEFAULT_JOB_OPTIONS)
+        self.options.update(options or {})
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+    
+    @classmethod
+    def from_config(cls, db, config):
+        """根据 config.json 的 jobs 字段创建"""
+        return cls(db, config.get('jobs'))
+    
+    def submit_delete(self, bv_id=None, start_date=None, end_date=None):
+        """
+        提交删除任务，立即返回
+        
+        Returns:
+            dict: 新任务，见 describe_job
+        
+        Raises:
+            ValueError: 删除条件不合法时
+        """
+        job = self.db.create_job('delete', delete_params(bv_id, start_date, end_date))
+        self.start()
+        self._wake.set()
+        return describe_job(job)
+    
+    def get(self, job_id):
+        """获取任务，不存在时返回 None"""
+        self.start()
+        job = self.db.get_job(job_id)
+        return describe_job(job) if job else None
+    
+    def list(self, limit=20):
+        """最近的任务"""
+        self.start()
+        return [describe_job(job) for job in self.db.list_jobs(limit)]
+    
+    def cancel(self, job_id):
+        """
+        请求取消任务
+        
+        Returns:
+            bool: 任务是否处于可以取消的状态
+        """
+        return self.db.cancel_job(job_id)
+    
+    def start(self):
+        """启动后台线程（在 fork 出的子进程中重新启动）"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """停止后台线程，正在执行的任务在当前批之后放回队列"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+    
+    def _run(self):
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                job = self.db.claim_job(self.options['stale_seconds'])
+            except Exception as e:
+                print(f"领取后台任务失败: {e}")
+                job = None
+            
+            if job is None:
+                self._wake.wait(self.options['poll_seconds'])
+                self._wake.clear()
+                continue
+            self._execute(job, stop)
+    
+    def _execute(self, job, stop):
+        """执行一个删除任务：分批删除，然后分批回收空闲页"""
+        job_id = job['id']
+        params = job['params']
+        state = {
+            'processed': job['processed'],
+            'vacuumed_pages': job['vacuumed_pages'],
+            'cancel': job['cancel_requested'],
+            'reported': time.monotonic()
+        }
+        
+        def report(force=False, **fields):
+            # 限制写入进度的频率，同时读取是否已请求取消
+            now = time.monotonic()
+            if force or now - state['reported'] >= self.options['progress_seconds']:
+                state['reported'] = now
+                state['cancel'] = self.db.update_job(
+                    job_id, processed=state['processed'], vacuumed_pages=state['vacuumed_pages'], **fields
+                )
+        
+        def on_delete(count):
+            state['processed'] += count
+            report()
+        
+        def on_vacuum(pages, remaining):
+            state['vacuumed_pages'] += pages
+            report()
+        
+        def cancelled():
+            return state['cancel'] or stop.is_set()
+        
+        print(f"开始执行删除任务 #{job_id}")
+        try:
+            remaining = self.db.count_samples(params['bv_id'], params['start_ts'], params['end_ts'])
+            report(True, total=state['processed'] + remaining, message='正在删除')
+            _, done = self.db.delete_samples(
+                params['bv_id'], params['start_ts'], params['end_ts'],
+                progress=on_delete, cancelled=cancelled
+            )
+            
+            pages = 0
+            if done:
+                report(True, message='正在回收空间')
+                pages = self.db.reclaim_space(progress=on_vacuum, cancelled=cancelled)
+        except Exception as e:
+            print(f"删除任务 #{job_id} 失败: {e}")
+            self.db.update_job(job_id, status='failed', processed=state['processed'], message=str(e))
+            return
+        
+        if stop.is_set() and not state['cancel']:
+            # 进程退出：放回队列，由其他进程或下次启动后继续
+            report(True, status='pending', message='等待继续执行')
+            return
+        
+        if not done:
+            message = f"已取消，删除了 {state['processed']} 条数据"
+            report(True, status='cancelled', message=message)
+        else:
+            message = f"删除了 {state['processed']} 条数据"
+            if pages is None:
+                message += '（数据库未启用增量回收，空闲页留待复用）'
+            elif state['vacuumed_pages']:
+                message += f"，回收了 {state['vacuumed_pages']} 个空闲页"
+            report(True, status='done', message=message)
+        print(f"删除任务 #{job_id}: {message}")
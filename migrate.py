@@ -0,0 +1,133 @@
+"""
+数据迁移工具
+把旧版 video_stats 表中的历史数据在线迁移到 videos + samples 表
+
+迁移按批进行，每批是一个短事务，监控程序和Web服务可以照常运行；
+中断后重新运行即可从断点继续。监控程序和Web服务启动时也会用 LegacyMigrator
+在后台线程中迁移，不需要手动运行本工具。
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from database import Database
+
+
+class LegacyMigrator:
+    """
+    在后台线程中分批迁移旧版数据，迁移完成后线程退出
+    
+    从最新的数据开始迁移，看板随迁移进度逐步显示历史数据。
+    线程在 start() 时启动（多进程服务器 fork 之后各自启动），没有旧数据时不启动。
+    """
+    
+    def __init__(self, db, batch_size=None, pause=None):
+        """
+        Args:
+            db: Database 实例
+            batch_size: 每批迁移的记录数，默认 database.legacy_batch_size
+            pause: 每批之间的间隔（秒），默认 database.legacy_pause_ms
+        """
+        self.db = db
+        self.batch_size = batch_size or db.options['legacy_batch_size']
+        self.pause = db.options['legacy_pause_ms'] / 1000 if pause is None else pause
+        self.migrated = 0
+        self.done = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+    
+    def run(self, progress=None, stop=None):
+        """
+        迁移所有旧数据（同步执行）
+        
+        Args:
+            progress: 每批之后调用 progress(已迁移数, 剩余数)
+            stop: threading.Event，设置后在当前批之后停止
+        
+        Returns:
+            int: 本次迁移的记录数
+        """
+        total = 0
+        while stop is None or not stop.is_set():
+            moved, remaining = self.db.migrate_legacy_batch(self.batch_size)
+            total += moved
+            self.migrated += moved
+            if moved and progress is not None:
+                progress(total, remaining)
+            if moved == 0 or remaining == 0:
+                self.done = True
+                break
+            time.sleep(self.pause)
+        return total
+    
+    def start(self):
+        """有旧数据时启动后台迁移线程（在 fork 出的子进程中重新启动）"""
+        with self._lock:
+            if self.done or (self._thread is not None and self._pid == os.getpid()):
+                return
+            self._pid = os.getpid()
+            with self.db.connection() as conn:
+                if not self.db.has_legacy_data(conn):
+                    self.done = True
+                    return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """停止后台线程，正在迁移的一批完成后返回（未迁移的数据下次启动后继续）"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+    
+    def _run(self):
+        print("开始在后台迁移旧版 video_stats 表中的历史数据")
+        start = time.time()
+        try:
+            total = self.run(stop=self._stop)
+        except Exception as e:
+            print(f"后台迁移旧版数据失败: {e}（可运行 python migrate.py 重试）")
+            return
+        if self.done:
+            print(f"✓ 旧版数据迁移完成，本进程迁移 {total:,} 条，耗时 {time.time() - start:.1f} 秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='迁移旧版 video_stats 表中的历史数据')
+    parser.add_argument('--db', default='data.db', help='数据库文件路径')
+    parser.add_argument('--batch-size', type=int, help='每批迁移的记录数，默认 database.legacy_batch_size')
+    parser.add_argument('--pause', type=float, help='每批之间的间隔（秒），默认 database.legacy_pause_ms')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='迁移完成后执行VACUUM回收空间并启用增量回收（会短暂锁库）')
+    args = parser.parse_args()
+    
+    options = None
+    if os.path.exists('config.json'):
+        with open('config.json', 'r', encoding='utf-8') as f:
+            options = json.load(f).get('database')
+    
+    db = Database(args.db, options)
+    
+    start = time.time()
+    migrator = LegacyMigrator(db, args.batch_size, args.pause)
+    total = migrator.run(lambda moved, remaining: print(f"已迁移 {moved:,} 条，剩余 {remaining:,} 条"))
+    
+    print(f"✓ 迁移完成，共 {total:,} 条数据，耗时 {time.time() - start:.1f} 秒")
+    
+    if args.vacuum:
+        print("正在执行 VACUUM...")
+        with db.connection() as conn:
+            # 已有数据库的空间回收方式只有在 VACUUM 时才会改变
+            conn.execute(f"PRAGMA auto_vacuum = {db.options['auto_vacuum']}")
+            conn.execute('VACUUM')
+        print("✓ VACUUM 完成")
+    
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
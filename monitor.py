@@ -7,25 +7,69 @@ import time
 import json
 import argparse
 from datetime import datetime
-from bilibili_api import BilibiliAPI
-from database import Database
+from bilibili_api import BilibiliAPI, API_BASE, FINAL_ERRORS
+from database import Database, BatchWriter
+from detector import AnomalyDetector
+from migrate import LegacyMigrator
+from retention import RetentionPolicy
+from scheduler import AdaptiveScheduler, DEFAULT_SCHEDULER_OPTIONS
+from watchlist import Watchlist
+
+
+def create_api(config):
+    """根据 config.json 创建 BilibiliAPI"""
+    return BilibiliAPI(
+        base_url=config.get('api_base_url', API_BASE),
+        concurrency=config.get('fetch_concurrency', 8),
+        requests_per_second=config.get('requests_per_second', 5),
+        pool_size=config.get('http_pool_size', 4),
+        pool_per_host=config.get('http_pool_per_host'),
+        http2=config.get('http2', False),
+        resilience=config.get('resilience'),
+        batch=config.get('batch')
+    )
 
 
 class VideoMonitor:
-    def __init__(self, config_file='config.json', list_file='monitor.list'):
+    def __init__(self, config_file='config.json', list_file='monitor.list', db_path='data.db'):
         # 加载配置
         with open(config_file, 'r', encoding='utf-8') as f:
             self.config = json.load(f)
         
         self.interval = self.config.get('fetch_interval_minutes', 10)
+        # 命令行 -t 指定的间隔，优先于设置页修改的间隔
+        self.interval_override = None
         self.list_file = list_file
         
+        # 抓取模式: concurrent（并发+全局限速）或 sequential（逐个抓取，间隔1秒）
+        self.fetch_mode = self.config.get('fetch_mode', 'concurrent')
+        
+        # 调度方式: adaptive（每个视频按增长速度自适应间隔）或 fixed（所有视频按固定间隔一起抓取）
+        self.scheduler_options = dict(DEFAULT_SCHEDULER_OPTIONS)
+        self.scheduler_options.update(self.config.get('scheduler') or {})
+        self.schedule_mode = self.scheduler_options['mode']
+        
         # 初始化API和数据库
-        self.api = BilibiliAPI()
-        self.db = Database()
+        self.api = create_api(self.config)
+        self.db = Database(db_path, self.config.get('database'))
+        
+        # 旧版 video_stats 表中的历史数据在后台分批迁移
+        self.migrator = LegacyMigrator(self.db)
+        self.migrator.start()
+        
+        # 各层数据的保留策略，持续运行时在后台线程中清理旧数据
+        self.retention = RetentionPolicy.from_config(self.db, self.config)
+        
+        # 播放增速的异常检测，每批数据写入后在写入线程中更新
+        self.detector = AnomalyDetector.from_config(self.db, self.config)
         
-        # 读取监控列表
-        self.bv_list = self.load_monitor_list()
+        # 预加载 aid/cid 缓存
+        self.api.load_video_meta(self.db.get_video_meta())
+        
+        # 读取监控列表和运行时设置（首次启动时从 monitor.list 导入数据库）
+        self.watchlist = Watchlist(self.db, list_file)
+        self.bv_list = []
+        self.refresh_watchlist()
         
         print("=" * 60)
         print("Bilibili视频热度监视器")
@@ -33,84 +77,164 @@ class VideoMonitor:
         print(f"监控视频数量: {len(self.bv_list)}")
         for bv in self.bv_list:
             print(f"  - {bv}")
-        print(f"抓取间隔: {self.interval} 分钟")
+        if self.schedule_mode == 'adaptive':
+            print(f"抓取间隔: 自适应 {self.scheduler_options['min_interval_seconds']}"
+                  f"-{self.scheduler_options['max_interval_seconds']} 秒")
+        else:
+            print(f"抓取间隔: {self.interval} 分钟")
+        print(f"抓取模式: {self.fetch_mode}")
+        print(self.retention.describe())
+        print(self.detector.describe())
         print("=" * 60)
     
-    def load_monitor_list(self):
-        """从 monitor.list 文件读取BV号列表"""
-        import os
-        
-        if not os.path.exists(self.list_file):
-            # 如果文件不存在，创建默认文件
-            with open(self.list_file, 'w', encoding='utf-8') as f:
-                f.write('# Bilibili视频监控列表\n')
-                f.write('# 每行一个BV号，# 开头的行为注释\n')
-                f.write('# 示例：\n')
-                f.write('# BV1xx411c7XZ\n')
-            return []
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        """停止清理和迁移线程，保存异常检测状态，释放网络连接和数据库连接"""
+        self.retention.close()
+        self.migrator.close()
+        self.detector.close()
+        self.api.close()
+        self.db.close()
+    
+    def refresh_watchlist(self):
+        """
+        检查监控列表和抓取间隔是否被修改，有变化时更新
         
-        bv_list = []
-        with open(self.list_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                bv = line.strip()
-                if bv and not bv.startswith('#'):  # 忽略空行和注释
-                    bv_list.append(bv)
+        没有变化时只查询一次版本号并检查 monitor.list 的修改时间，不重新读取列表。
         
-        return bv_list
+        Returns:
+            bool: 是否有变化
+        """
+        if not self.watchlist.refresh():
+            return False
+        self.bv_list = self.watchlist.bv_ids
+        self.interval = self.interval_override or self.watchlist.settings.get(
+            'fetch_interval_minutes', self.config.get('fetch_interval_minutes', 10))
+        return True
+    
+    def create_writer(self):
+        """创建批量写入线程，每批写入后交给异常检测"""
+        return BatchWriter(
+            self.db,
+            batch_size=self.config.get('write_batch_size', 1000),
+            flush_interval=self.config.get('write_flush_seconds', 5),
+            on_saved=self.detector.observe if self.detector.enabled else None
+        )
     
     def fetch_and_save(self):
         """抓取并保存所有视频数据"""
         try:
             print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始抓取数据...")
             
-            # 重新加载监控列表（以支持动态更新）
-            self.bv_list = self.load_monitor_list()
+            # 监控列表或抓取间隔被修改时更新（以支持动态更新）
+            self.refresh_watchlist()
+            total = len(self.bv_list)
             
-            # 遍历所有BV号
-            for idx, bv_id in enumerate(self.bv_list, 1):
-                print(f"\n[{idx}/{len(self.bv_list)}] 抓取 {bv_id}...")
-                
-                # 获取视频信息
-                video_info = self.api.get_video_info(bv_id)
+            # 抓取结果经有界队列交给后台线程批量写入
+            writer = self.create_writer()
+            
+            try:
+                missed = []
+                results = self.fetch_videos(self.bv_list)
+                for idx, (bv_id, video_info, error) in enumerate(results, 1):
+                    self.save_video_info(idx, total, bv_id, video_info, writer, error)
+                    if error is not None and error.kind not in FINAL_ERRORS:
+                        missed.append(bv_id)
                 
-                if video_info:
-                    # 显示数据
-                    print(f"  标题: {video_info.get('title', 'N/A')}")
-                    print(f"  播放: {video_info.get('view', 0):,} | "
-                          f"点赞: {video_info.get('like', 0):,} | "
-                          f"投币: {video_info.get('coin', 0):,}")
-                    
-                    # 处理在线人数（可能是字符串或整数）
-                    online = video_info.get('online', 0)
-                    online_str = str(online) if isinstance(online, str) else f"{online:,}"
-                    print(f"  收藏: {video_info.get('favorite', 0):,} | "
-                          f"转发: {video_info.get('share', 0):,} | "
-                          f"在线: {online_str}")
-                    
-                    # 保存到数据库
-                    success = self.db.insert_video_data(video_info)
-                    
-                    if success:
-                        print(f"  ✓ 数据保存成功")
-                    else:
-                        print(f"  ✗ 数据保存失败")
-                else:
-                    print(f"  ✗ 获取视频信息失败")
+                # 因限流或临时错误缺失的视频在本轮最后重新抓取一次
+                if missed:
+                    print(f"\n↻ {len(missed)} 个视频抓取失败，重新排队抓取")
+                    results = self.fetch_videos(missed)
+                    for idx, (bv_id, video_info, error) in enumerate(results, 1):
+                        self.save_video_info(idx, len(missed), bv_id, video_info, writer, error)
+            finally:
+                saved = writer.close()
+            
+            if writer.failed:
+                print(f"\n✗ {writer.failed} 条数据保存失败")
+            if writer.ignored:
+                print(f"\n- {writer.ignored} 条重复数据（同一视频同一秒）已忽略")
+            print(f"\n✓ 本轮保存 {saved} 条数据（{writer.transactions} 个事务）")
+            
+            # 持久化本轮新增或变化的 aid/cid
+            self.db.save_video_meta(self.api.pop_changed_video_meta())
+            
+            # 统计本轮请求数
+            counts = self.api.get_request_counts(reset=True)
+            detail = ', '.join(f"{path}={count}" for path, count in sorted(counts.items()))
+            print(f"本轮请求数: {sum(counts.values())} ({detail})")
+            self.print_error_counts()
+            
+        except Exception as e:
+            print(f"✗ 发生错误: {e}")
+    
+    def fetch_videos(self, bv_ids):
+        """
+        按抓取模式获取一组视频的信息
+        
+        Yields:
+            tuple: (bv_id, 视频数据字典或None, FetchError或None)
+        """
+        if self.fetch_mode == 'sequential':
+            # 逐个抓取，每个视频之间固定等待1秒
+            for idx, bv_id in enumerate(bv_ids, 1):
+                yield (bv_id, *self.api.try_video_info(bv_id))
                 
                 # 避免请求过快
-                if idx < len(self.bv_list):
+                if idx < len(bv_ids):
                     time.sleep(1)
-                
-        except Exception as e:
-            print(f"✗ 发生错误: {e}")
+        else:
+            # 并发抓取，请求速率由API的全局限速器控制
+            yield from self.api.iter_videos_info(bv_ids)
+    
+    def print_error_counts(self):
+        """输出并清零自上次调用以来的请求错误统计"""
+        errors = self.api.get_error_counts(reset=True)
+        if errors or self.api.breaker.opened:
+            detail = ', '.join(f"{kind}={count}" for kind, count in sorted(errors.items()))
+            print(f"请求错误: {detail or '无'}，累计熔断 {self.api.breaker.opened} 次")
+    
+    def save_video_info(self, idx, total, bv_id, video_info, writer, error=None):
+        """显示单个视频的抓取结果并提交写入"""
+        print(f"\n[{idx}/{total}] 抓取 {bv_id}...")
+        
+        if video_info:
+            # 显示数据
+            print(f"  标题: {video_info.get('title', 'N/A')}")
+            print(f"  播放: {video_info.get('view', 0):,} | "
+                  f"点赞: {video_info.get('like', 0):,} | "
+                  f"投币: {video_info.get('coin', 0):,}")
+            
+            # 处理在线人数（可能是字符串或整数）
+            online = video_info.get('online', 0)
+            online_str = str(online) if isinstance(online, str) else f"{online:,}"
+            print(f"  收藏: {video_info.get('favorite', 0):,} | "
+                  f"转发: {video_info.get('share', 0):,} | "
+                  f"在线: {online_str}")
+            
+            # 提交到写入队列
+            writer.put(video_info)
+        else:
+            print(f"  ✗ 获取视频信息失败" + (f"（{error.kind}）: {error}" if error else ""))
     
     def start(self):
         """启动监控"""
+        self.retention.start()
+        if self.schedule_mode == 'adaptive':
+            self.run_adaptive()
+            return
+        
         # 立即执行一次
         self.fetch_and_save()
         
         # 设置定时任务
-        schedule.every(self.interval).minutes.do(self.fetch_and_save)
+        interval = self.interval
+        job = schedule.every(interval).minutes.do(self.fetch_and_save)
         
         print(f"\n监控已启动，每 {self.interval} 分钟抓取一次数据")
         next_time = datetime.now().timestamp() + self.interval * 60
@@ -123,9 +247,90 @@ class VideoMonitor:
             while True:
                 schedule.run_pending()
                 time.sleep(1)
+                
+                # 设置页修改抓取间隔后重新安排定时任务
+                if self.refresh_watchlist() and self.interval != interval:
+                    schedule.cancel_job(job)
+                    interval = self.interval
+                    job = schedule.every(interval).minutes.do(self.fetch_and_save)
+                    print(f"\n抓取间隔已修改为 {interval} 分钟，⏰ 下次抓取时间: "
+                          f"{job.next_run.strftime('%Y-%m-%d %H:%M:%S')}")
         except KeyboardInterrupt:
             print("\n\n监控已停止")
     
+    def run_adaptive(self):
+        """
+        按视频分别调度：每个视频有自己的下次抓取时间，间隔随播放量、点赞数的增长速度调整，
+        总请求量不超过 request_budget_per_minute。监控列表修改后自动生效。
+        """
+        scheduler = AdaptiveScheduler.from_config(self.config)
+        report_seconds = self.scheduler_options['report_seconds']
+        # 从数据库取各视频的最新数据，重启后第一次抓取即可计算增长速度
+        latest = {row['bv_id']: row for row in self.db.get_videos_info()}
+        writer = self.create_writer()
+        
+        print(f"\n自适应调度已启动，抓取间隔 {scheduler.min_interval}-{scheduler.max_interval} 秒，"
+              f"请求预算 {scheduler.budget or '不限'}/分钟")
+        print("按 Ctrl+C 停止监控\n")
+        
+        scheduler.sync(self.bv_list, latest)
+        next_report = time.monotonic() + report_seconds
+        try:
+            while True:
+                # 监控列表被修改后同步（没有变化时只查询版本号）
+                if self.refresh_watchlist():
+                    added, removed = scheduler.sync(self.bv_list, latest)
+                    if added or removed:
+                        print(f"监控列表更新: 新增 {added} 个，移除 {removed} 个，共 {len(self.bv_list)} 个视频")
+                
+                # 熔断期间不取出到期的视频，恢复后按到期顺序补抓
+                paused = self.api.breaker.remaining()
+                if paused > 0:
+                    time.sleep(min(paused, 1))
+                    continue
+                
+                due = scheduler.pop_due(limit=self.api.concurrency * 2)
+                if due:
+                    self.fetch_due(scheduler, due, writer)
+                else:
+                    next_due = scheduler.next_due()
+                    wait = 1 if next_due is None else next_due - time.time()
+                    time.sleep(min(max(wait, 0.05), 1))
+                
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + report_seconds
+                    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {scheduler.describe()}")
+                    self.print_error_counts()
+                    print()
+        except KeyboardInterrupt:
+            print("\n\n监控已停止")
+        finally:
+            saved = writer.close()
+            print(scheduler.describe())
+            print(f"共保存 {saved} 条数据（{writer.transactions} 个事务）")
+    
+    def fetch_due(self, scheduler, bv_ids, writer):
+        """抓取一批到期的视频，提交写入并报告给调度器"""
+        for bv_id, video_info, error in self.fetch_videos(bv_ids):
+            now = datetime.now().strftime('%H:%M:%S')
+            if video_info:
+                writer.put(video_info)
+                state = scheduler.record(bv_id, video_info)
+                if state is not None:
+                    print(f"[{now}] {bv_id} 播放 {video_info.get('view', 0):,} | "
+                          f"点赞 {video_info.get('like', 0):,} → "
+                          f"{scheduler.effective_interval(state):.0f} 秒后再次抓取")
+            else:
+                state = scheduler.record_failure(bv_id, retry=error.kind not in FINAL_ERRORS)
+                if state is not None:
+                    print(f"[{now}] {bv_id} ✗ 获取视频信息失败（{error.kind}）: {error}，"
+                          f"{state.due - scheduler.clock():.0f} 秒后重试")
+        
+        # 持久化新增或变化的 aid/cid，并用实际请求数修正预算估算
+        self.db.save_video_meta(self.api.pop_changed_video_meta())
+        counts = self.api.get_request_counts(reset=True)
+        scheduler.observe_requests(sum(counts.values()), len(bv_ids))
+    
     def run_once(self):
         """仅运行一次（用于测试）"""
         self.fetch_and_save()
@@ -210,8 +415,8 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog='''
 示例用法:
-  %(prog)s                     # 使用配置文件中的间隔循环抓取
-  %(prog)s -t 5                # 每5分钟抓取一次，循环运行
+  %(prog)s                     # 按配置文件的调度方式循环抓取（默认自适应间隔）
+  %(prog)s -t 5                # 所有视频每5分钟抓取一次，循环运行
   %(prog)s -n 3                # 连续抓取3次后退出（无时间间隔）
   %(prog)s -t 10 -n 3          # 每10分钟抓取一次，共3次后退出
   %(prog)s --once              # 立即抓取一次后退出
@@ -226,28 +431,28 @@ def main():
     
     args = parser.parse_args()
     
-    monitor = VideoMonitor()
-    
-    # 处理命令行参数
-    if args.once:
-        # 立即执行一次
-        print("📌 单次执行模式")
-        monitor.run_once()
-    elif args.count and not args.interval:
-        # 仅有 -n 参数：连续抓取多次，无时间间隔
-        monitor.run_continuous(args.count)
-    elif args.interval and args.count:
-        # 同时有 -t 和 -n：按间隔抓取指定次数
-        print(f"📊 定时抓取模式: 每 {args.interval} 分钟抓取一次，共抓取 {args.count} 次")
-        monitor.run_with_limit(args.interval, args.count)
-    elif args.interval:
-        # 仅有 -t 参数：按间隔循环抓取
-        print(f"🔄 循环抓取模式: 每 {args.interval} 分钟抓取一次，持续运行")
-        monitor.interval = args.interval
-        monitor.start()
-    else:
-        # 默认模式：使用配置文件的设置
-        monitor.start()
+    with VideoMonitor() as monitor:
+        # 处理命令行参数
+        if args.once:
+            # 立即执行一次
+            print("📌 单次执行模式")
+            monitor.run_once()
+        elif args.count and not args.interval:
+            # 仅有 -n 参数：连续抓取多次，无时间间隔
+            monitor.run_continuous(args.count)
+        elif args.interval and args.count:
+            # 同时有 -t 和 -n：按间隔抓取指定次数
+            print(f"📊 定时抓取模式: 每 {args.interval} 分钟抓取一次，共抓取 {args.count} 次")
+            monitor.run_with_limit(args.interval, args.count)
+        elif args.interval:
+            # 仅有 -t 参数：按间隔循环抓取
+            print(f"🔄 循环抓取模式: 每 {args.interval} 分钟抓取一次，持续运行")
+            monitor.interval = monitor.interval_override = args.interval
+            monitor.schedule_mode = 'fixed'
+            monitor.start()
+        else:
+            # 默认模式：使用配置文件的设置
+            monitor.start()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+"""
+增长速度分析模块
+把累计计数（播放、点赞等）转换为每个采样间隔的增量、按实际间隔时长换算的速度、
+滑动平均速度、加速度和互动比例，基于NumPy向量化计算
+
+采样间隔并不均匀（自适应调度、漏抓、汇总层的桶），所有速度都除以相邻两点之间的实际秒数，
+而不是假定固定间隔。
+"""
+import numpy as np
+
+from database import METRIC_COLUMNS
+from downsample import bucket_aggregate
+
+
+# 累计计数类指标，online 是瞬时值，不计算增量和速度
+COUNTER_METRICS = tuple(metric for metric in METRIC_COLUMNS if metric != 'online')
+
+# 速度的时间单位
+RATE_UNITS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# 滑动平均的最大窗口（采样间隔数）
+MAX_WINDOW = 1000
+
+
+def rate_columns(metrics):
+    """
+    compute_rates 返回的列名（ts 之外）
+    
+    Args:
+        metrics: 参与计算的累计指标
+    """
+    columns = ['interval']
+    for metric in metrics:
+        columns += [metric, f'{metric}_delta', f'{metric}_rate', f'{metric}_rate_ma', f'{metric}_accel']
+    if 'view' in metrics:
+        for metric in metrics:
+            if metric != 'view':
+                columns += [f'{metric}_per_view', f'{metric}_per_view_delta']
+    return columns
+
+
+def _divide(numerator, denominator):
+    """逐项相除，分母为0时为 NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def to_json_list(values, digits=4):
+    """把数组转换为 JSON 列表，浮点数保留 digits 位小数，NaN 转换为 None"""
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    return [None if value != value else value for value in np.round(values, digits).tolist()]
+
+
+def compute_rates(series, metrics, unit='hour', window=6, resolution=None):
+    """
+    计算列式序列每个采样间隔的增长指标
+    
+    每个间隔以结束时的采样表示（第一个采样只作为起点，不单独输出）：
+      interval: 与上一个采样相隔的秒数
+      {指标}: 间隔结束时的累计值
+      {指标}_delta: 间隔内的增量
+      {指标}_rate: 增量 / 间隔秒数，换算为每 unit 的增量
+      {指标}_rate_ma: 最近 window 个间隔的时间加权平均速度（总增量 / 总时长）
+      {指标}_accel: 与上一个间隔相比速度的变化，除以两个间隔中点之间的时长（每 unit²）
+      {指标}_per_view / {指标}_per_view_delta: 与播放量的比例（累计值之比、间隔内增量之比），
+      只在包含 view 时计算
+    
+    Args:
+        series: {'ts': [...], 指标名: [...]}，时间从早到晚
+        metrics: 参与计算的指标，必须是 COUNTER_METRICS 的子集
+        unit: 速度的时间单位，见 RATE_UNITS
+        window: 滑动平均的间隔数
+        resolution: 先按该宽度（秒）的时间桶取桶内最后一个采样，再计算
+    
+    Returns:
+        dict: {'ts': 数组, 列名: 数组}，列名见 rate_columns，NaN 表示无法计算（分母为0）
+    """
+    seconds = RATE_UNITS[unit]
+    ts = np.asarray(series['ts'], dtype=np.int64)
+    columns = {metric: np.asarray(series[metric], dtype=np.int64) for metric in metrics}
+    if resolution and len(ts):
+        ts, columns = bucket_aggregate(ts, columns, int(resolution), 'last')
+    
+    n = max(len(ts) - 1, 0)
+    elapsed = np.diff(ts).astype(np.float64)
+    result = {'ts': ts[1:], 'interval': np.diff(ts)}
+    
+    # 滑动窗口 [lo, i] 内的总增量和总时长用前缀和相减得到
+    hi = np.arange(1, n + 1)
+    lo = np.maximum(hi - window, 0)
+    elapsed_sum = np.r_[0.0, np.cumsum(elapsed)]
+    # 相邻两个间隔中点之间的时长
+    mid_gap = (elapsed[1:] + elapsed[:-1]) / 2
+    
+    deltas = {}
+    for metric in metrics:
+        values = columns[metric]
+        delta = np.diff(values)
+        rate = _divide(delta * float(seconds), elapsed)
+        delta_sum = np.r_[0.0, np.cumsum(delta, dtype=np.float64)]
+        moving = _divide((delta_sum[hi] - delta_sum[lo]) * seconds, elapsed_sum[hi] - elapsed_sum[lo])
+        accel = np.full(n, np.nan)
+        if n > 1:
+            accel[1:] = _divide(np.diff(rate) * seconds, mid_gap)
+        
+        deltas[metric] = delta
+        result[metric] = values[1:]
+        result[f'{metric}_delta'] = delta
+        result[f'{metric}_rate'] = rate
+        result[f'{metric}_rate_ma'] = moving
+        result[f'{metric}_accel'] = accel
+    
+    if 'view' in metrics:
+        for metric in metrics:
+            if metric != 'view':
+                result[f'{metric}_per_view'] = _divide(result[metric].astype(np.float64), result['view'])
+                view_delta = deltas['view'].astype(np.float64)
+                view_delta[view_delta <= 0] = np.nan
+                result[f'{metric}_per_view_delta'] = _divide(deltas[metric].astype(np.float64), view_delta)
+    return result
+
+
+def summarize_rates(rates, metrics, unit='hour'):
+    """
+    整个时间范围的汇总
+    
+    Returns:
+        dict: 每个指标的 {指标}_total（总增量）、{指标}_avg_rate（总增量 / 总时长）、
+              {指标}_peak_rate 和 {指标}_peak_ts（速度最大的间隔）；没有间隔时为空字典
+    """
+    if not len(rates['ts']):
+        return {}
+    span = float(rates['interval'].sum())
+    summary = {'span_seconds': int(span)}
+    for metric in metrics:
+        delta = rates[f'{metric}_delta']
+        rate = rates[f'{metric}_rate']
+        peak = int(np.nanargmax(rate)) if np.isfinite(rate).any() else None
+        summary[f'{metric}_total'] = int(delta.sum())
+        summary[f'{metric}_avg_rate'] = round(float(delta.sum()) * RATE_UNITS[unit] / span, 4) if span else None
+        summary[f'{metric}_peak_rate'] = None if peak is None else round(float(rate[peak]), 4)
+        summary[f'{metric}_peak_ts'] = None if peak is None else int(rates['ts'][peak])
+    return summary
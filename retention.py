@@ -0,0 +1,172 @@
+"""
+分层数据保留
+原始采样写入时由触发器同步汇总到小时表和天表（见 database.ROLLUP_TIERS），
+每一层按各自的保留天数和清理间隔分批删除旧数据并回收空闲页，数据库大小不再随时间无限增长。
+图表按时间范围查询时自动选择能满足点数要求的最粗一层，长时间范围只读取几百行汇总数据。
+"""
+import threading
+import time
+from datetime import datetime
+
+from database import ROLLUP_TIERS, TIERS
+
+
+# 默认保留策略，可通过 config.json 的 "retention" 字段覆盖
+DEFAULT_RETENTION_OPTIONS = {
+    'raw_days': None,               # 原始采样保留天数，None 表示永久保留
+    'hourly_days': 365,             # 小时汇总保留天数
+    'daily_days': None,             # 天汇总保留天数
+    'raw_prune_minutes': 60,        # 各层的清理间隔
+    'hourly_prune_minutes': 360,
+    'daily_prune_minutes': 1440,
+    'chart_points': 500             # 按时间范围查询且没有指定 max_points 时期望的数据点数
+}
+
+# 各层的桶宽度（秒），原始采样为0
+TIER_WIDTHS = dict({'raw': 0}, **{tier: width for tier, (_, width) in ROLLUP_TIERS.items()})
+
+TIER_LABELS = {'raw': '原始采样', 'hourly': '小时汇总', 'daily': '天汇总'}
+
+
+class RetentionPolicy:
+    """
+    各层的保留时间和清理计划
+    
+    监控程序和协调进程调用 start() 在后台线程中按各层的间隔清理旧数据；
+    Web服务只用 choose_tier() 为时间范围查询选择层级。
+    """
+    
+    def __init__(self, db, options=None, clock=time.time):
+        """
+        Args:
+            db: Database 实例
+            options: 保留策略，覆盖 DEFAULT_RETENTION_OPTIONS
+            clock: 时间函数
+        """
+        self.db = db
+        self.options = dict(DEFAULT_RETENTION_OPTIONS)
+        self.options.update(options or {})
+        self.clock = clock
+        # 各层下次清理的时间（monotonic），启动后立即清理一次
+        self._next_prune = dict.fromkeys(TIERS, 0)
+        self.pruned = dict.fromkeys(TIERS, 0)
+        # 已输出过删除提示的层级，每个进程第一次清理某一层之前提示一次
+        self._warned = set()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @classmethod
+    def from_config(cls, db, config):
+        """根据 config.json 的 retention 字段创建"""
+        return cls(db, config.get('retention'))
+    
+    def keep_seconds(self, tier):
+        """某一层的保留时间（秒），永久保留时为 None"""
+        days = self.options[f'{tier}_days']
+        return None if days is None else days * 86400
+    
+    def choose_tier(self, start_ts, end_ts, points=None):
+        """
+        选择时间范围查询读取的层级
+        
+        在数据仍覆盖 start_ts 的层级中，取桶宽度不超过 (end_ts - start_ts) / points 的最粗一层；
+        范围太短、没有这样的汇总层时取其中最细的一层。所有层都已清理掉 start_ts 时，
+        取保留最久的一层。
+        
+        Args:
+            start_ts / end_ts: 时间范围（Unix秒）
+            points: 期望的数据点数，默认 chart_points
+        
+        Returns:
+            str: 层级名，见 TIERS
+        """
+        now = self.clock()
+        end_ts = min(end_ts, now)
+        resolution = (end_ts - start_ts) / max(1, points or self.options['chart_points'])
+        
+        covering = []
+        for tier in TIERS:
+            keep = self.keep_seconds(tier)
+            if keep is None or start_ts >= now - keep:
+                covering.append(tier)
+        if not covering:
+            return max(TIERS, key=self.keep_seconds)
+        
+        fitting = [tier for tier in covering if TIER_WIDTHS[tier] <= resolution]
+        return fitting[-1] if fitting else covering[0]
+    
+    def run_due(self):
+        """
+        清理到了清理时间的层级
+        
+        Returns:
+            dict: {层级: 删除的记录数}
+        """
+        result = {}
+        for tier in TIERS:
+            keep = self.keep_seconds(tier)
+            if keep is None or time.monotonic() < self._next_prune[tier]:
+                continue
+            self._next_prune[tier] = time.monotonic() + self.options[f'{tier}_prune_minutes'] * 60
+            self._warn(tier, keep)
+            
+            try:
+                count = self.db.prune_tier(tier, self.clock() - keep, cancelled=self._stop.is_set)
+            except Exception as e:
+                print(f"清理{TIER_LABELS[tier]}失败: {e}")
+                continue
+            
+            self.pruned[tier] += count
+            result[tier] = count
+            if count:
+                print(f"保留策略: 清理了 {count} 条 {self.options[f'{tier}_days']} 天之前的{TIER_LABELS[tier]}")
+        
+        if any(result.values()):
+            self.compact()
+        return result
+    
+    def _warn(self, tier, keep):
+        """第一次清理某一层之前输出醒目的提示，说明删除的范围和如何关闭"""
+        if tier in self._warned:
+            return
+        self._warned.add(tier)
+        cutoff = datetime.fromtimestamp(self.clock() - keep).strftime('%Y-%m-%d')
+        print(f"⚠ 保留策略: 将删除 {cutoff} 之前的{TIER_LABELS[tier]}（retention.{tier}_days = "
+              f"{self.options[f'{tier}_days']:g}），删除后无法恢复；如需保留请把该项设为 null")
+    
+    def compact(self):
+        """清理后分批回收空闲页，数据库文件随之缩小（需要增量回收模式，见 database.auto_vacuum）"""
+        try:
+            pages = self.db.reclaim_space(cancelled=self._stop.is_set)
+        except Exception as e:
+            print(f"回收空间失败: {e}")
+            return
+        if pages:
+            print(f"保留策略: 回收了 {pages} 个空闲页")
+    
+    def start(self):
+        """启动后台清理线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def close(self):
+        """停止后台清理线程，等待正在进行的清理完成"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_due()
+            self._stop.wait(60)
+    
+    def describe(self):
+        """保留策略的说明"""
+        parts = []
+        for tier in TIERS:
+            days = self.options[f'{tier}_days']
+            parts.append(f"{TIER_LABELS[tier]} {'永久' if days is None else f'{days:g} 天'}")
+        return '数据保留: ' + '，'.join(parts)
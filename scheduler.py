@@ -0,0 +1,350 @@
+"""
+自适应抓取调度
+每个视频有自己的下次抓取时间，存放在按时间排序的堆中。抓取间隔根据播放量、
+点赞数的增长速度调整：增长越快间隔越短，数据不变的视频逐渐降到最低频率。
+所有视频的总请求量不超过全局预算，超出时按比例拉长所有视频的间隔。
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+# 默认调度参数，可通过 config.json 的 "scheduler" 字段覆盖
+DEFAULT_SCHEDULER_OPTIONS = {
+    'mode': 'adaptive',                 # adaptive（每个视频自适应间隔）或 fixed（所有视频按 fetch_interval_minutes 一起抓取）
+    'min_interval_seconds': 60,         # 最短抓取间隔
+    'max_interval_seconds': 3600,       # 最长抓取间隔（超出请求预算时可能被拉长）
+    'request_budget_per_minute': None,  # 每分钟请求数预算，None 表示 requests_per_second × 60
+    'target_view_delta': 100,           # 期望两次抓取之间增长的播放量
+    'target_like_delta': 10,            # 期望两次抓取之间增长的点赞数
+    'smoothing': 0.5,                   # 增长速度的指数平滑系数，越大越快跟随变化
+    'report_seconds': 300               # 输出调度统计的间隔
+}
+
+# 每次抓取一个视频的请求数（视频信息 + 在线人数），有实际统计后按实际值修正
+REQUESTS_PER_FETCH = 2
+
+
+class VideoState:
+    """单个视频的调度状态"""
+    
+    __slots__ = ('bv_id', 'interval', 'rate', 'last_ts', 'last_view', 'last_like',
+                 'due', 'seq', 'fetches', 'failures', 'errors')
+    
+    def __init__(self, bv_id, interval):
+        self.bv_id = bv_id
+        self.interval = interval
+        # 平滑后的增长速度：每秒达到的目标增量的倍数
+        self.rate = None
+        self.last_ts = None
+        self.last_view = None
+        self.last_like = None
+        self.due = None
+        # 堆中条目的序号，不一致说明条目已过期（视频被移除或重新排期）
+        self.seq = None
+        self.fetches = 0
+        self.failures = 0
+        # 连续失败次数，成功后清零
+        self.errors = 0
+
+
+class AdaptiveScheduler:
+    """
+    按视频的增长速度安排抓取时间
+    
+    调用方循环执行：pop_due 取出到期的视频并抓取，再用 record / record_failure
+    报告结果，调度器据此计算该视频的下次抓取时间。
+    """
+    
+    def __init__(self, min_interval=60, max_interval=3600, request_budget_per_minute=None,
+                 target_view_delta=100, target_like_delta=10, smoothing=0.5,
+                 initial_interval=None, clock=time.time):
+        """
+        Args:
+            min_interval / max_interval: 抓取间隔范围（秒）
+            request_budget_per_minute: 每分钟请求数预算，None 表示不限制
+            target_view_delta / target_like_delta: 期望两次抓取之间的增量，达到任一目标的速度决定间隔
+            smoothing: 增长速度的指数平滑系数（0-1）
+            initial_interval: 还没有增长数据的视频使用的间隔，默认 min_interval
+            clock: 时间函数，基准测试中可替换为模拟时钟
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.budget = request_budget_per_minute
+        self.target_view = max(target_view_delta, 1)
+        self.target_like = max(target_like_delta, 1)
+        self.smoothing = smoothing
+        self.initial_interval = self.clamp(initial_interval or min_interval)
+        self.clock = clock
+        self.requests_per_fetch = REQUESTS_PER_FETCH
+        
+        self._videos = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        # 所有视频按各自间隔抓取时的总抓取频率（次/秒），增量维护
+        self._demand = 0.0
+        self.fetched = 0
+        self.failed = 0
+    
+    @classmethod
+    def from_config(cls, config, clock=time.time):
+        """根据 config.json 创建调度器"""
+        options = dict(DEFAULT_SCHEDULER_OPTIONS)
+        options.update(config.get('scheduler') or {})
+        budget = options['request_budget_per_minute']
+        if budget is None and config.get('requests_per_second', 5) > 0:
+            budget = config.get('requests_per_second', 5) * 60
+        return cls(
+            min_interval=options['min_interval_seconds'],
+            max_interval=options['max_interval_seconds'],
+            request_budget_per_minute=budget,
+            target_view_delta=options['target_view_delta'],
+            target_like_delta=options['target_like_delta'],
+            smoothing=options['smoothing'],
+            initial_interval=config.get('fetch_interval_minutes', 10) * 60,
+            clock=clock
+        )
+    
+    def clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+    
+    def budget_scale(self):
+        """
+        超出请求预算时间隔的放大倍数
+        
+        Returns:
+            float: >= 1，1 表示所有视频都能按自己的间隔抓取
+        """
+        if not self.budget:
+            return 1.0
+        capacity = self.budget / 60 / self.requests_per_fetch
+        return max(1.0, self._demand / capacity)
+    
+    def effective_interval(self, state):
+        """考虑请求预算后的实际间隔（秒）"""
+        return state.interval * self.budget_scale()
+    
+    def sync(self, bv_ids, latest=None):
+        """
+        与监控列表同步：新视频立即到期，不在列表中的视频移除
+        
+        Args:
+            bv_ids: 当前监控列表
+            latest: 数据库中各视频的最新数据 {bv_id: dict(ts, view, like)}，用于重启后继续计算增长速度
+        
+        Returns:
+            tuple: (新增数, 移除数)
+        """
+        latest = latest or {}
+        now = self.clock()
+        wanted = set(bv_ids)
+        with self._lock:
+            removed = [bv_id for bv_id in self._videos if bv_id not in wanted]
+            for bv_id in removed:
+                state = self._videos.pop(bv_id)
+                self._demand -= 1.0 / state.interval
+            
+            added = 0
+            for bv_id in bv_ids:
+                if bv_id in self._videos:
+                    continue
+                state = VideoState(bv_id, self.initial_interval)
+                row = latest.get(bv_id)
+                if row:
+                    state.last_ts = row['ts']
+                    state.last_view = row['view']
+                    state.last_like = row['like']
+                self._videos[bv_id] = state
+                self._demand += 1.0 / state.interval
+                self._push(state, now)
+                added += 1
+        return added, len(removed)
+    
+    def _push(self, state, due):
+        state.due = due
+        state.seq = next(self._seq)
+        heapq.heappush(self._heap, (due, state.seq, state.bv_id))
+    
+    def next_due(self):
+        """
+        最早的下次抓取时间
+        
+        Returns:
+            float: 时间戳，没有待抓取的视频时返回 None
+        """
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+    
+    def _drop_stale(self):
+        heap = self._heap
+        while heap:
+            _, seq, bv_id = heap[0]
+            state = self._videos.get(bv_id)
+            if state is not None and state.seq == seq:
+                return
+            heapq.heappop(heap)
+    
+    def pop_due(self, limit=None):
+        """
+        取出已到期的视频，按到期时间排序
+        
+        取出的视频在 record / record_failure 之前不会再次到期。
+        
+        Args:
+            limit: 最多取出的数量
+        
+        Returns:
+            list: BV号列表
+        """
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._heap and (limit is None or len(due) < limit):
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, _, bv_id = heapq.heappop(self._heap)
+                self._videos[bv_id].seq = None
+                due.append(bv_id)
+        return due
+    
+    def record(self, bv_id, video_info):
+        """
+        记录一次成功的抓取，更新增长速度并安排下次抓取
+        
+        Args:
+            bv_id: 视频BV号
+            video_info: 抓取结果（含 view、like）
+        
+        Returns:
+            VideoState: 该视频的调度状态，视频已被移除时返回 None
+        """
+        now = self.clock()
+        view = video_info.get('view', 0)
+        like = video_info.get('like', 0)
+        with self._lock:
+            state = self._videos.get(bv_id)
+            if state is None:
+                return None
+            
+            elapsed = now - state.last_ts if state.last_ts is not None else 0
+            # 计数回退（数据被修正）时不计算增长速度
+            if elapsed > 0 and view >= state.last_view and like >= state.last_like:
+                speed = max((view - state.last_view) / self.target_view,
+                            (like - state.last_like) / self.target_like) / elapsed
+                if state.rate is None:
+                    state.rate = speed
+                else:
+                    state.rate += self.smoothing * (speed - state.rate)
+                
+                interval = self.clamp(1.0 / state.rate if state.rate > 0 else self.max_interval)
+                self._demand += 1.0 / interval - 1.0 / state.interval
+                state.interval = interval
+            
+            state.last_ts = now
+            state.last_view = view
+            state.last_like = like
+            state.fetches += 1
+            state.errors = 0
+            self.fetched += 1
+            self._push(state, now + self.effective_interval(state))
+            return state
+    
+    def record_failure(self, bv_id, retry=True):
+        """
+        记录一次失败的抓取并重新排期
+        
+        Args:
+            bv_id: 视频BV号
+            retry: 是否值得重试。临时错误和限流导致的缺失采样按指数退避（带抖动）提前重新抓取，
+                   从最短间隔开始、不超过正常间隔；视频不存在等错误按最长间隔再次检查
+        
+        Returns:
+            VideoState: 该视频的调度状态，视频已被移除时返回 None
+        """
+        now = self.clock()
+        with self._lock:
+            state = self._videos.get(bv_id)
+            if state is None:
+                return None
+            state.failures += 1
+            state.errors += 1
+            self.failed += 1
+            interval = self.effective_interval(state)
+            if retry:
+                backoff = self.min_interval * 2 ** min(state.errors - 1, 16)
+                delay = min(interval, backoff) * random.uniform(0.5, 1)
+            else:
+                delay = self.max_interval * self.budget_scale()
+            self._push(state, now + delay)
+            return state
+    
+    def observe_requests(self, requests, fetches):
+        """
+        用实际请求数修正每次抓取的平均请求数（缓存命中时少于2次，aid/cid 失效时更多）
+        
+        Args:
+            requests: 一段时间内的请求数
+            fetches: 同一段时间内完成的抓取数
+        """
+        if fetches > 0:
+            with self._lock:
+                self.requests_per_fetch += 0.2 * (requests / fetches - self.requests_per_fetch)
+    
+    def stats(self, top=5):
+        """
+        获取调度统计
+        
+        Returns:
+            dict: 视频数、已到期数、间隔分布、预算占用、最活跃的视频等
+        """
+        now = self.clock()
+        with self._lock:
+            states = list(self._videos.values())
+            scale = self.budget_scale()
+            demand = self._demand * self.requests_per_fetch * 60
+            fetched, failed = self.fetched, self.failed
+        
+        intervals = sorted(state.interval * scale for state in states)
+        hot = sorted((s for s in states if s.rate), key=lambda s: s.rate, reverse=True)[:top]
+        
+        def quantile(q):
+            return round(intervals[min(len(intervals) - 1, int(q * len(intervals)))]) if intervals else None
+        
+        return {
+            'videos': len(states),
+            'due': sum(1 for s in states if s.seq is not None and s.due <= now),
+            'fetched': fetched,
+            'failed': failed,
+            'interval_min': quantile(0),
+            'interval_p50': quantile(0.5),
+            'interval_max': quantile(1),
+            'at_min_interval': sum(1 for s in states if s.interval <= self.min_interval),
+            'at_max_interval': sum(1 for s in states if s.interval >= self.max_interval),
+            'requests_per_minute': round(demand * min(1.0, 1.0 / scale), 1),
+            'wanted_requests_per_minute': round(demand, 1),
+            'request_budget_per_minute': self.budget,
+            'budget_scale': round(scale, 2),
+            'requests_per_fetch': round(self.requests_per_fetch, 2),
+            'hot': [(s.bv_id, round(s.interval * scale)) for s in hot]
+        }
+    
+    def describe(self, stats=None):
+        """把调度统计格式化为一行日志"""
+        s = stats or self.stats()
+        text = (f"调度: {s['videos']} 个视频，已抓取 {s['fetched']} 次（失败 {s['failed']}），"
+                f"间隔 {s['interval_min']}/{s['interval_p50']}/{s['interval_max']} 秒（最短/中位/最长），"
+                f"最短间隔 {s['at_min_interval']} 个、最长间隔 {s['at_max_interval']} 个，"
+                f"请求 {s['requests_per_minute']}/分钟")
+        if s['request_budget_per_minute']:
+            text += f"（预算 {s['request_budget_per_minute']}"
+            if s['budget_scale'] > 1:
+                text += f"，需求 {s['wanted_requests_per_minute']}，间隔已放大 {s['budget_scale']} 倍"
+            text += "）"
+        if s['hot']:
+            text += "\n  最活跃: " + ', '.join(f"{bv_id} {interval}s" for bv_id, interval in s['hot'])
+        return text
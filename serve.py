@@ -0,0 +1,162 @@
+"""
+生产环境启动脚本
+用多进程/多线程服务器运行 Web 服务，参数来自 config.json 的 "server" 字段。
+Linux/macOS 使用 gunicorn（多个工作进程，每个进程多线程），
+Windows 使用 waitress（单进程多线程）。
+推送通道（/api/stream）的长连接由单独的 asyncio 进程处理（stream_server.py），不占用工作线程。
+
+用法:
+  python serve.py
+  python serve.py --workers 4 --threads 16
+  kill -HUP <主进程PID>      # 重新读取 config.json 并平滑重启工作进程
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from database import Database
+
+
+# 默认服务器参数，可通过 config.json 的 "server" 字段覆盖
+DEFAULT_SERVER_OPTIONS = {
+    'host': '0.0.0.0',
+    'workers': 2,                       # 工作进程数（waitress 忽略）
+    'threads': 32,                      # 每个工作进程的线程数
+    'stream_port': 5001,                # 推送通道进程的端口，null 表示由工作进程处理（每个打开的看板页面占用一个线程）
+    'stream_max_connections': 10000,    # 推送通道最大同时连接数
+    'keepalive_seconds': 5,             # 空闲 keep-alive 连接保持的秒数
+    'timeout_seconds': 30,              # 工作进程无响应多少秒后被重启
+    'graceful_timeout_seconds': 30,     # 平滑重启时等待正在处理的请求的秒数
+    'max_requests': 0,                  # 工作进程处理多少个请求后自动重启，0表示不重启
+    'preload': False,                   # 在主进程中加载应用后再 fork，HUP 时不会加载新代码
+    'pidfile': None                     # 主进程PID文件，便于发送 HUP 信号
+}
+
+# 推送通道进程的端口通过环境变量告知工作进程（app.py 据此重定向 /api/stream）
+STREAM_PORT_ENV = 'BILIBILI_STREAM_PORT'
+
+
+def read_config():
+    """读取 config.json（与 app.py 相同，位于当前目录）"""
+    with open('config.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def server_options(config, overrides=None):
+    """
+    合并默认服务器参数、config.json 与命令行参数
+    
+    Returns:
+        dict: 服务器参数（含 port）
+    """
+    options = dict(DEFAULT_SERVER_OPTIONS)
+    options.update(config.get('server') or {})
+    options['port'] = config.get('api_port', 5000)
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return options
+
+
+def gunicorn_settings(options):
+    """把服务器参数转换为 gunicorn 配置项"""
+    return {
+        'bind': f"{options['host']}:{options['port']}",
+        'workers': options['workers'],
+        # gthread：每个进程一个线程池；推送通道的长连接由单独的进程处理，不占用线程池
+        'worker_class': 'gthread',
+        'threads': options['threads'],
+        'keepalive': options['keepalive_seconds'],
+        'timeout': options['timeout_seconds'],
+        'graceful_timeout': options['graceful_timeout_seconds'],
+        'max_requests': options['max_requests'],
+        'max_requests_jitter': options['max_requests'] // 10,
+        'preload_app': options['preload'],
+        'pidfile': options['pidfile']
+    }
+
+
+def start_stream_server(options):
+    """
+    在子进程中启动推送通道服务器（stream_port 为空时不启动）
+    
+    使用独立的解释器而不是 multiprocessing：gunicorn 工作进程由主进程 fork 而来，
+    退出时会执行继承的 multiprocessing 清理函数，把推送通道进程一起终止。
+    
+    Returns:
+        subprocess.Popen: 推送通道进程，未启动时为 None
+    """
+    if not options.get('stream_port'):
+        return None
+    
+    process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stream_server.py'),
+        '--host', options['host'], '--port', str(options['stream_port']),
+        '--max-connections', str(options['stream_max_connections'])
+    ])
+    os.environ[STREAM_PORT_ENV] = str(options['stream_port'])
+    return process
+
+
+def run_gunicorn(overrides):
+    from gunicorn.app.base import BaseApplication
+    
+    class Application(BaseApplication):
+        def load_config(self):
+            # 启动和收到 HUP 时都会调用，因此修改 config.json 后 HUP 即可生效
+            options = server_options(read_config(), overrides)
+            for key, value in gunicorn_settings(options).items():
+                if value is not None:
+                    self.cfg.set(key, value)
+        
+        def load(self):
+            from app import app
+            return app
+    
+    Application().run()
+
+
+def run_waitress(options):
+    from waitress import serve
+    from app import app
+    
+    print(f"waitress 启动在 {options['host']}:{options['port']}，{options['threads']} 个线程")
+    serve(app, host=options['host'], port=options['port'], threads=options['threads'],
+          channel_timeout=max(options['timeout_seconds'], options['keepalive_seconds']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bilibili视频热度监视器 - 生产环境Web服务')
+    parser.add_argument('--host', help='监听地址')
+    parser.add_argument('--port', type=int, help='监听端口，默认为 api_port')
+    parser.add_argument('--workers', type=int, help='工作进程数')
+    parser.add_argument('--threads', type=int, help='每个工作进程的线程数')
+    parser.add_argument('--stream-port', type=int, help='推送通道进程的端口，默认取 config.json')
+    args = parser.parse_args()
+    
+    overrides = {'host': args.host, 'port': args.port, 'workers': args.workers, 'threads': args.threads,
+                 'stream_port': args.stream_port}
+    config = read_config()
+    options = server_options(config, overrides)
+    
+    # 在 fork 工作进程之前完成建表和结构升级，避免多个进程同时升级
+    Database(options=config.get('database')).close()
+    
+    stream = start_stream_server(options)
+    pid = os.getpid()
+    try:
+        if sys.platform == 'win32':
+            run_waitress(options)
+        else:
+            # gunicorn 会解析命令行参数，这里只保留程序名
+            sys.argv = sys.argv[:1]
+            run_gunicorn(overrides)
+    finally:
+        # gunicorn 工作进程（fork 自主进程）退出时也会执行到这里，只由主进程停止推送通道
+        if stream is not None and os.getpid() == pid:
+            stream.terminate()
+            stream.wait()
+
+
+if __name__ == '__main__':
+    main()
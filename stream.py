@@ -0,0 +1,177 @@
+"""
+新数据推送
+监视数据库的 data_version，发现监控进程写入新数据后通过一个共享的读取线程
+读取视频目录，再把新采样分发给所有订阅者（Server-Sent Events）
+"""
+import json
+import os
+import queue
+import threading
+
+from database import SQL_VIDEOS_INFO
+
+
+def format_event(message):
+    """
+    把消息编码为一条 SSE 事件
+    
+    Returns:
+        str: event 为消息类型，data 为 JSON
+    """
+    return f"event: {message['type']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+
+class Broadcaster:
+    """
+    一对多消息分发
+    
+    每个订阅者有一个有界队列，发布时逐个放入。队列已满说明客户端读取过慢，
+    此时断开该订阅者（收到 None），由客户端重连后用增量查询补齐数据，
+    避免单个慢客户端拖慢其他订阅者或占用无限内存。
+    """
+    
+    def __init__(self, queue_size=100):
+        """
+        Args:
+            queue_size: 每个订阅者最多缓存的消息数
+        """
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+    
+    def subscribe(self):
+        """
+        新增一个订阅者
+        
+        Returns:
+            queue.Queue: 消息队列，收到 None 表示已被断开
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        """移除订阅者"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+    
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+    
+    def publish(self, message):
+        """把消息发给所有订阅者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        
+        self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                self._drop(subscriber)
+    
+    def _drop(self, subscriber):
+        self.unsubscribe(subscriber)
+        self.dropped += 1
+        # 清空队列后放入断开标记
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+
+class SampleWatcher:
+    """
+    新采样监视线程
+    
+    用一个专用连接轮询 PRAGMA data_version，其他连接（包括监控进程）提交写入后
+    该值会变化。变化时读取一次视频目录（videos 表），与上次对比得到每个视频
+    新增的最新采样并发布；采样数减少（数据被删除）时发布 reset 消息。
+    无论有多少订阅者，每次数据变化都只查询一次，每条消息也只编码一次，
+    发布的内容为 (bv_id, SSE事件文本)。
+    """
+    
+    def __init__(self, db, broadcaster, interval=0.5):
+        """
+        Args:
+            db: Database 实例
+            broadcaster: Broadcaster 实例
+            interval: 检查 data_version 的间隔（秒）
+        """
+        self.db = db
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self.changes = 0
+        self._catalog = {}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+    
+    def start(self):
+        """
+        启动监视线程（重复调用无影响）
+        
+        线程不会被 fork 继承，多进程服务器的每个工作进程各自启动一个监视线程。
+        """
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """停止监视线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def _read_catalog(self, conn):
+        return {row['bv_id']: dict(row) for row in conn.execute(SQL_VIDEOS_INFO)}
+    
+    def _diff(self, catalog):
+        """对比新旧视频目录，生成消息列表"""
+        messages = []
+        for bv_id, row in catalog.items():
+            old = self._catalog.get(bv_id)
+            if old is None:
+                messages.append(dict(row, type='sample', prev_ts=None))
+            elif row['sample_count'] < old['sample_count'] or row['ts'] < old['ts']:
+                messages.append({'type': 'reset', 'bv_id': bv_id})
+            elif row['ts'] > old['ts']:
+                messages.append(dict(row, type='sample', prev_ts=old['ts']))
+        
+        for bv_id in self._catalog.keys() - catalog.keys():
+            messages.append({'type': 'reset', 'bv_id': bv_id})
+        return messages
+    
+    def _run(self):
+        conn = self.db.get_connection()
+        try:
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            self._catalog = self._read_catalog(conn)
+            
+            while not self._stop.wait(self.interval):
+                try:
+                    current = conn.execute('PRAGMA data_version').fetchone()[0]
+                    if current == version:
+                        continue
+                    version = current
+                    
+                    catalog = self._read_catalog(conn)
+                    messages = self._diff(catalog)
+                    self._catalog = catalog
+                    self.changes += 1
+                    for message in messages:
+                        self.broadcaster.publish((message['bv_id'], format_event(message)))
+                
+                except Exception as e:
+                    print(f"读取新数据失败: {e}")
+        finally:
+            conn.close()
@@ -0,0 +1,229 @@
+"""
+推送通道服务器
+生产环境中 /api/stream 由单独的进程提供：所有 SSE 长连接在一个 asyncio 事件循环中处理，
+每个连接只是一个协程，不占用 Web 工作进程的线程，打开再多的看板页面也不会让其他
+/api/* 请求排队。数据来源与 app.py 相同（SampleWatcher 监视 data_version）。
+
+serve.py 会自动启动该进程（端口为 server.stream_port），工作进程收到的 /api/stream
+请求重定向到这里；使用反向代理时也可以把 /api/stream 直接转发到该端口。
+
+用法:
+  python stream_server.py --port 5001
+"""
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from database import Database
+from stream import Broadcaster, SampleWatcher
+
+
+# 读取请求行和请求头的超时（秒）
+REQUEST_TIMEOUT_SECONDS = 10
+
+# 请求头的最大行数
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+
+class AsyncBroadcaster(Broadcaster):
+    """
+    在事件循环中分发的 Broadcaster
+    
+    订阅者的队列为 asyncio.Queue；publish() 由监视线程调用，转到事件循环中执行，
+    队列已满时同样断开该订阅者。
+    """
+    
+    def __init__(self, loop, queue_size=100):
+        super().__init__(queue_size)
+        self.loop = loop
+    
+    def subscribe(self):
+        subscriber = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+    
+    def publish(self, message):
+        self.loop.call_soon_threadsafe(self._publish, message)
+    
+    def _publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        
+        self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+    
+    def _drop(self, subscriber):
+        self.unsubscribe(subscriber)
+        self.dropped += 1
+        while not subscriber.empty():
+            subscriber.get_nowait()
+        subscriber.put_nowait(None)
+
+
+class StreamServer:
+    """只提供 /api/stream 和 /api/stream/stats 的 HTTP 服务器"""
+    
+    def __init__(self, db, config, max_connections=10000):
+        """
+        Args:
+            db: Database 实例
+            config: config.json 的内容（读取 stream_* 参数）
+            max_connections: 最大同时连接数，超过时返回 503
+        """
+        self.db = db
+        self.config = config
+        self.max_connections = max_connections
+        self.heartbeat = config.get('stream_heartbeat_seconds', 15)
+        self.connections = 0
+        self.broadcaster = None
+        self.watcher = None
+    
+    async def serve(self, host, port):
+        """启动监视线程并处理连接，直到进程退出"""
+        self.broadcaster = AsyncBroadcaster(asyncio.get_running_loop(),
+                                            queue_size=self.config.get('stream_queue_size', 100))
+        self.watcher = SampleWatcher(self.db, self.broadcaster,
+                                     interval=self.config.get('stream_poll_seconds', 0.5))
+        self.watcher.start()
+        
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"推送通道启动在 {host}:{port}，最多 {self.max_connections} 个连接")
+        async with server:
+            await server.serve_forever()
+    
+    async def handle(self, reader, writer):
+        """处理一个连接（每个连接只处理一个请求）"""
+        self.connections += 1
+        try:
+            request = await asyncio.wait_for(self.read_request(reader), REQUEST_TIMEOUT_SECONDS)
+            if request is None:
+                return
+            method, url = request
+            
+            if method != 'GET':
+                await self.send_json(writer, 405, '只支持 GET 请求')
+            elif url.path == '/api/stream':
+                if self.connections > self.max_connections:
+                    await self.send_json(writer, 503, '推送通道连接数已满')
+                else:
+                    await self.stream(writer, parse_qs(url.query))
+            elif url.path == '/api/stream/stats':
+                await self.send_json(writer, 200, 'success', self.stats())
+            else:
+                await self.send_json(writer, 404, '接口不存在')
+        
+        except (ConnectionError, asyncio.TimeoutError, UnicodeDecodeError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+    
+    async def read_request(self, reader):
+        """
+        读取请求行和请求头
+        
+        Returns:
+            tuple: (method, urlsplit 结果)，连接已关闭时返回 None
+        """
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+        for _ in range(MAX_HEADER_LINES):
+            if (await reader.readline()).strip() == b'':
+                break
+        else:
+            raise ValueError('请求头过长')
+        return method, urlsplit(target)
+    
+    def stats(self):
+        return {
+            'subscribers': self.broadcaster.subscriber_count,
+            'changes': self.watcher.changes,
+            'published': self.broadcaster.published,
+            'dropped': self.broadcaster.dropped,
+            'connections': self.connections
+        }
+    
+    async def send_json(self, writer, status, message, data=None):
+        body = json.dumps({
+            'code': 0 if status == 200 else -1,
+            'message': message,
+            'data': data
+        }, ensure_ascii=False).encode('utf-8')
+        writer.write(self.headers(status, 'application/json', len(body)) + body)
+        await writer.drain()
+    
+    def headers(self, status, content_type, length=None):
+        lines = [
+            f'HTTP/1.1 {status} {STATUS_TEXT[status]}',
+            f'Content-Type: {content_type}; charset=utf-8',
+            'Cache-Control: no-cache',
+            # 看板页面与推送通道端口不同，需要允许跨域
+            'Access-Control-Allow-Origin: *',
+            'Connection: close'
+        ]
+        if length is not None:
+            lines.append(f'Content-Length: {length}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    
+    async def stream(self, writer, params):
+        """推送新采样，事件格式与 app.py 的 /api/stream 相同"""
+        bv_ids = {bv.strip() for value in params.get('bv_ids', []) for bv in value.split(',') if bv.strip()}
+        subscriber = self.broadcaster.subscribe()
+        try:
+            writer.write(self.headers(200, 'text/event-stream') + b'retry: 3000\n\n')
+            await writer.drain()
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # 心跳，防止代理断开空闲连接，也用于发现已断开的客户端
+                    writer.write(b': keepalive\n\n')
+                    await writer.drain()
+                    continue
+                
+                # 读取过慢被断开，客户端会自动重连
+                if message is None:
+                    break
+                bv_id, event = message
+                if bv_ids and bv_id not in bv_ids:
+                    continue
+                writer.write(event.encode('utf-8'))
+                await writer.drain()
+        finally:
+            self.broadcaster.unsubscribe(subscriber)
+
+
+def run_stream_server(host, port, max_connections=10000):
+    """读取当前目录的 config.json 并运行推送通道服务器"""
+    with open('config.json', 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    db = Database(options=config.get('database'))
+    try:
+        asyncio.run(StreamServer(db, config, max_connections).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bilibili视频热度监视器 - 推送通道服务器')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5001, help='监听端口')
+    parser.add_argument('--max-connections', type=int, default=10000, help='最大同时连接数')
+    args = parser.parse_args()
+    run_stream_server(args.host, args.port, args.max_connections)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+监控列表与运行时设置
+监控列表和抓取间隔保存在数据库的 watchlist / settings 表中，每次修改版本号加1。
+监控程序只需比较版本号就能发现变化，不用每轮重新读取、解析 monitor.list，
+Web端和监控程序同时修改时由数据库事务保证不会读到写了一半的列表。
+
+monitor.list 作为数据库的镜像保留（先写临时文件再原子替换），第一行记录版本号。
+手动编辑的 monitor.list 在下次检查时导入数据库；版本号落后于数据库的旧镜像会被重新生成。
+"""
+import os
+import re
+import threading
+
+
+# 可以在运行时通过设置页修改的配置项，保存在 settings 表中，覆盖 config.json 中的值
+RUNTIME_SETTINGS = ('fetch_interval_minutes',)
+
+LIST_HEADER = '''# Bilibili视频监控列表
+# 每行一个BV号，# 开头的行为注释
+# 示例：
+# BV1xx411c7XZ
+'''
+
+VERSION_PATTERN = re.compile(r'^# version: (\d+)\s*$')
+
+
+def read_monitor_list(list_file):
+    """从 monitor.list 文件读取BV号列表，文件不存在时创建带说明的空列表"""
+    if not os.path.exists(list_file):
+        # 如果文件不存在，创建默认文件
+        with open(list_file, 'w', encoding='utf-8') as f:
+            f.write(LIST_HEADER)
+        return []
+    
+    bv_list = []
+    with open(list_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            bv = line.strip()
+            if bv and not bv.startswith('#'):  # 忽略空行和注释
+                bv_list.append(bv)
+    
+    return bv_list
+
+
+def read_list_version(list_file):
+    """
+    读取 monitor.list 镜像的版本号
+    
+    Returns:
+        int: 第一行记录的版本号，手动创建的文件没有版本号时返回 None
+    """
+    with open(list_file, 'r', encoding='utf-8') as f:
+        match = VERSION_PATTERN.match(f.readline())
+    return int(match.group(1)) if match else None
+
+
+def write_monitor_list(list_file, bv_ids, version):
+    """原子写入 monitor.list：先写同目录下的临时文件，再替换原文件"""
+    tmp_file = f'{list_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(f'# version: {version}\n')
+        f.write(LIST_HEADER)
+        f.write('\n')
+        for bv in bv_ids:
+            f.write(bv + '\n')
+    os.replace(tmp_file, list_file)
+
+
+class Watchlist:
+    """
+    数据库中的监控列表和运行时设置
+    
+    refresh() 只查询一次版本号（并检查 monitor.list 的修改时间），没有变化时不读取列表。
+    """
+    
+    def __init__(self, db, list_file='monitor.list'):
+        """
+        Args:
+            db: Database 实例
+            list_file: monitor.list 镜像文件路径
+        """
+        self.db = db
+        self.list_file = list_file
+        self.version = None
+        self.bv_ids = []
+        self.settings = {}
+        # 上次检查时 monitor.list 的修改时间
+        self._mtime = None
+        # Web服务的多个线程共用一个实例
+        self._lock = threading.RLock()
+    
+    def _stat(self):
+        try:
+            return os.stat(self.list_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def import_file(self):
+        """
+        monitor.list 被修改后导入数据库
+        
+        手动编辑的文件（没有版本号，或版本号与数据库一致）替换数据库中的列表；
+        版本号落后的文件是旧镜像，用数据库中的列表重新生成。
+        
+        Returns:
+            bool: 是否导入了新的列表
+        """
+        mtime = self._stat()
+        if mtime is not None and mtime == self._mtime:
+            return False
+        
+        version, bv_ids, _ = self.db.get_watchlist()
+        if mtime is None:
+            # 文件不存在：数据库中已有列表时生成镜像，否则创建带说明的空列表
+            if version:
+                self.write_mirror(bv_ids, version)
+            else:
+                read_monitor_list(self.list_file)
+                self._mtime = self._stat()
+            return False
+        
+        self._mtime = mtime
+        file_version = read_list_version(self.list_file)
+        if file_version is not None and file_version < version:
+            print(f"monitor.list 是旧版本（v{file_version}，数据库为 v{version}），已按数据库重新生成")
+            self.write_mirror(bv_ids, version)
+            return False
+        
+        new_version = self.db.save_watchlist(read_monitor_list(self.list_file))
+        if new_version == version:
+            return False
+        print(f"已从 monitor.list 导入监控列表（v{new_version}）")
+        # 重新生成镜像以记录新的版本号
+        self.write_mirror(self.db.get_watchlist()[1], new_version)
+        return True
+    
+    def write_mirror(self, bv_ids, version):
+        """生成 monitor.list 镜像，并记录修改时间避免再次导入"""
+        try:
+            write_monitor_list(self.list_file, bv_ids, version)
+        except OSError as e:
+            print(f"写入 {self.list_file} 失败: {e}")
+            return
+        self._mtime = self._stat()
+    
+    def refresh(self):
+        """
+        检查监控列表和设置是否变化，有变化时重新读取
+        
+        Returns:
+            bool: 是否有变化（第一次调用时为 True）
+        """
+        with self._lock:
+            self.import_file()
+            if self.version is not None and self.db.get_settings_version() == self.version:
+                return False
+            self.version, self.bv_ids, self.settings = self.db.get_watchlist()
+            return True
+    
+    def update(self, bv_ids=None, settings=None):
+        """
+        修改监控列表和/或运行时设置，并更新 monitor.list 镜像
+        
+        Args:
+            bv_ids: 新的监控列表，None 表示不修改
+            settings: 要修改的设置，只接受 RUNTIME_SETTINGS 中的项
+        
+        Returns:
+            int: 修改后的版本号
+        """
+        unknown = set(settings or {}) - set(RUNTIME_SETTINGS)
+        if unknown:
+            raise ValueError(f"不支持运行时修改的设置: {', '.join(sorted(unknown))}")
+        
+        if bv_ids is not None:
+            bv_ids = [bv.strip() for bv in bv_ids if bv and bv.strip()]
+        with self._lock:
+            # 先导入尚未导入的手动修改，避免被镜像覆盖
+            self.import_file()
+            self.db.save_watchlist(bv_ids, settings)
+            version, bv_ids, _ = self.db.get_watchlist()
+            self.write_mirror(bv_ids, version)
+            return version